@@ -13,17 +13,21 @@ import numpy as np
 
 from dados import (
     load_data, fmt, get_os_periodo, enriquecer_com_relatorio,
-    get_meses_disponiveis, periodo_do_mes,
+    get_meses_disponiveis, periodo_do_mes, HASH_DATASET, versao_dataset,
+    pagina_instrumentada,
 )
+from desempenho import cache_medido
 
 
 # ============================================
 # PROCESSAMENTO
 # ============================================
 
-@st.cache_data
-def calcular_kpis_parque(contratos, relatorio, negativado):
+@cache_medido(versao=versao_dataset, hash_funcs=HASH_DATASET)
+def calcular_kpis_parque(data):
     """KPIs do parque total usando CONTRATOS + RELATORIO."""
+    contratos, relatorio, negativado = data['contratos'], data['relatorio'], data['negativado']
+
     # CONTRATOS = parque total (com e sem NF)
     ativos = contratos[contratos['status_contrato'] == 'Ativo']
     total_rede = len(ativos)
@@ -58,55 +62,66 @@ def calcular_kpis_parque(contratos, relatorio, negativado):
     }
 
 
-@st.cache_data
-def gerar_resumo_nf(relatorio, config):
-    """Tabela resumo por NF+Modelo (baseada no RELATORIO)."""
+@cache_medido(versao=versao_dataset, hash_funcs=HASH_DATASET)
+def gerar_resumo_nf(data):
+    """Tabela resumo por NF+Modelo (baseada no RELATORIO).
+
+    Uma única agregação: contagem por (NF, DESCRICAO) cruzada com
+    LOCAL_EQUIPAMENTO × STATUS_EQUIPAMENTO.
+    """
+    relatorio, config = data['relatorio'], data['config']
+    if relatorio.empty:
+        return pd.DataFrame()
+
     obs_map = dict(zip(config['MODELO'], config['OBSOLETO?']))
-    combinacoes = relatorio[['NF', 'DESCRICAO']].drop_duplicates()
-
-    rows = []
-    for _, row in combinacoes.iterrows():
-        nf, modelo = row['NF'], row['DESCRICAO']
-        df_nf = relatorio[(relatorio['NF'] == nf) & (relatorio['DESCRICAO'] == modelo)]
-
-        comprados = len(df_nf)
-        ativados_novos = len(df_nf[
-            (df_nf['LOCAL_EQUIPAMENTO'] == 'INSTALADO') &
-            (df_nf['STATUS_EQUIPAMENTO'] == 'NOVO')
-        ])
-        ativados_reutil = len(df_nf[
-            (df_nf['LOCAL_EQUIPAMENTO'] == 'INSTALADO') &
-            (df_nf['STATUS_EQUIPAMENTO'] == 'REUTILIZADO')
-        ])
-        em_estoque = len(df_nf[df_nf['LOCAL_EQUIPAMENTO'] == 'EM ESTOQUE'])
-        em_rma = len(df_nf[df_nf['LOCAL_EQUIPAMENTO'] == 'RMA'])
-        com_tecnico = len(df_nf[df_nf['LOCAL_EQUIPAMENTO'] == 'COM TÉCNICO'])
-
-        rows.append({
-            'NF': nf,
-            'MODELO': modelo,
-            'DATA': df_nf['DATA NF'].min(),
-            'COMPRADOS': comprados,
-            'ATIVADOS_NOVOS': ativados_novos,
-            'TAXA_ATIVACAO': ativados_novos / comprados if comprados > 0 else 0,
-            'ATIVADOS_REUTIL': ativados_reutil,
-            'EM_ESTOQUE': em_estoque,
-            'PERC_ESTOQUE': em_estoque / comprados if comprados > 0 else 0,
-            'EM_RMA': em_rma,
-            'PERC_RMA': em_rma / comprados if comprados > 0 else 0,
-            'COM_TECNICO': com_tecnico,
-            'OBSOLETO': obs_map.get(modelo, 'Nao'),
-        })
-
-    df = pd.DataFrame(rows)
-    if len(df) > 0:
-        df = df.sort_values('DATA', ascending=False)
-    return df
-
-
-@st.cache_data
-def gerar_evolucao_mensal(os_df, relatorio):
+    chaves = ['NF', 'DESCRICAO']
+
+    # Ordem das combinações = primeira ocorrência no RELATORIO
+    # (observed: DESCRICAO/LOCAL/STATUS são category, só combinações presentes)
+    grupos = relatorio.groupby(chaves, dropna=False, sort=False, observed=True)
+    df = grupos['DATA NF'].agg(DATA='min', COMPRADOS='size')
+
+    # Crosstab (NF, DESCRICAO) × (LOCAL_EQUIPAMENTO, STATUS_EQUIPAMENTO)
+    contagem = (
+        relatorio
+        .groupby(chaves + ['LOCAL_EQUIPAMENTO', 'STATUS_EQUIPAMENTO'],
+                 dropna=False, sort=False, observed=True)
+        .size()
+        .unstack(['LOCAL_EQUIPAMENTO', 'STATUS_EQUIPAMENTO'], fill_value=0)
+        .reindex(df.index, fill_value=0)
+    )
+
+    def qtd(local, status=None):
+        cols = [
+            c for c in contagem.columns
+            if c[0] == local and (status is None or c[1] == status)
+        ]
+        return contagem[cols].sum(axis=1)
+
+    comprados = df['COMPRADOS']
+    df['ATIVADOS_NOVOS'] = qtd('INSTALADO', 'NOVO')
+    df['TAXA_ATIVACAO'] = (df['ATIVADOS_NOVOS'] / comprados).fillna(0)
+    df['ATIVADOS_REUTIL'] = qtd('INSTALADO', 'REUTILIZADO')
+    df['EM_ESTOQUE'] = qtd('EM ESTOQUE')
+    df['PERC_ESTOQUE'] = (df['EM_ESTOQUE'] / comprados).fillna(0)
+    df['EM_RMA'] = qtd('RMA')
+    df['PERC_RMA'] = (df['EM_RMA'] / comprados).fillna(0)
+    df['COM_TECNICO'] = qtd('COM TÉCNICO')
+
+    df = df.reset_index().rename(columns={'DESCRICAO': 'MODELO'})
+    df['OBSOLETO'] = df['MODELO'].map(lambda m: obs_map.get(m, 'Nao'))
+    df = df[[
+        'NF', 'MODELO', 'DATA', 'COMPRADOS', 'ATIVADOS_NOVOS', 'TAXA_ATIVACAO',
+        'ATIVADOS_REUTIL', 'EM_ESTOQUE', 'PERC_ESTOQUE', 'EM_RMA', 'PERC_RMA',
+        'COM_TECNICO', 'OBSOLETO',
+    ]]
+    return df.sort_values('DATA', ascending=False)
+
+
+@cache_medido(versao=versao_dataset, hash_funcs=HASH_DATASET)
+def gerar_evolucao_mensal(data):
     """Dados de evolução mensal (instalações por mês via OS)."""
+    os_df = data['os']
     os_inst = os_df[
         os_df['ASSUNTO PADRONIZADO'].str.contains('INSTALAC', case=False, na=False)
     ].copy()
@@ -213,6 +228,7 @@ def chart_sankey(df_resumo, nf):
 # INTERFACE
 # ============================================
 
+@pagina_instrumentada('Visão Geral')
 def main():
     st.set_page_config(
         page_title="Visao Geral", page_icon="📊",
@@ -227,13 +243,9 @@ def main():
         data = load_data()
 
     relatorio = data['relatorio']
-    contratos = data['contratos']
-    os_df = data['os']
-    config = data['config']
-    negativado = data['negativado']
 
-    df_resumo = gerar_resumo_nf(relatorio, config)
-    kpis = calcular_kpis_parque(contratos, relatorio, negativado)
+    df_resumo = gerar_resumo_nf(data)
+    kpis = calcular_kpis_parque(data)
 
     # ========================================
     # SIDEBAR — FILTROS
@@ -340,7 +352,7 @@ def main():
     with col1:
         st.plotly_chart(chart_distribuicao(relatorio), use_container_width=True)
     with col2:
-        evolucao = gerar_evolucao_mensal(os_df, relatorio)
+        evolucao = gerar_evolucao_mensal(data)
         st.plotly_chart(chart_evolucao(evolucao), use_container_width=True)
 
     # ========================================
@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+ARMAZÉM — Base SQLite como sistema de registro
+
+Alternativa à planilha NFxPRODUTO como fonte dos dados: um arquivo SQLite
+ao lado dela (mesmo nome, extensão .sqlite) com uma tabela por aba (OS,
+NOTAS, RELATORIO, CONTRATOS, config e as opcionais) e a ordem das linhas
+preservada (rowid).
+
+- Dashboard e ingestão usam a base quando ela existe (fonte_dados);
+  sem ela, tudo segue lendo e regravando a planilha.
+- A ingestão grava OS novas e RELATORIO numa única transação, sem
+  regravar o arquivo inteiro: do RELATORIO, só as linhas que mudaram.
+- Índice em OS.id_patrimonio (INDICES): a ingestão incremental lê só as
+  OS dos patrimônios tocados (ler_por_chave). O ID da OS não precisa de
+  índice no SQLite: a deduplicação usa o índice ordenado de indice_os.py.
+- A leitura aceita projeção de colunas por tabela (ex.: só os IDs de OS
+  para o índice da ingestão) e reaproveita o cache colunar do planilha.py
+  (Parquet) enquanto a base não muda.
+- A planilha continua disponível para o financeiro via exportação.
+
+Tipos: as colunas guardam o tipo pandas de origem na tabela _colunas
+(datas como texto ISO, restauradas na leitura). Colunas de texto não têm
+afinidade no SQLite, então valores mistos (número e texto) voltam como
+vieram da planilha.
+
+Uso:
+    python armazem.py importar [planilha.xlsx] [--forcar]   (cria a base;
+        --forcar substitui uma base existente)
+    python armazem.py exportar <saida.xlsx> [--forcar]      (gera a planilha
+        a partir da base; --forcar sobrescreve um arquivo existente)
+
+Não depende de streamlit: usado por dados.py e atualizar_mes.py.
+"""
+
+import contextlib
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from planilha import (
+    ABAS_OBRIGATORIAS, ABAS_OPCIONAIS, assinatura_arquivo, gravar_cache,
+    gravar_planilha, ler_abas, ler_cache,
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FILE = os.path.join(BASE_DIR, 'NFxPRODUTO__1_.xlsx')
+
+EXTENSAO = '.sqlite'
+
+# Linhas por executemany na gravação
+BLOCO_INSERCAO = 50_000
+
+# Colunas indexadas por tabela (consultas por chave da ingestão)
+INDICES = {
+    'OS': ['id_patrimonio'],
+}
+
+_TIPOS_SQL = {'int': 'INTEGER', 'float': 'REAL', 'bool': 'INTEGER', 'datetime': 'TEXT', 'texto': ''}
+
+
+def caminho_base(planilha):
+    """Base SQLite correspondente à planilha (mesma pasta e nome)."""
+    return os.path.splitext(planilha)[0] + EXTENSAO
+
+
+def fonte_dados(planilha):
+    """Caminho a ler: a base SQLite se existir, senão a própria planilha."""
+    base = caminho_base(planilha)
+    return base if os.path.exists(base) else planilha
+
+
+def eh_base(caminho):
+    return caminho.endswith(EXTENSAO)
+
+
+# ============================================================
+# CONEXÃO E TIPOS
+# ============================================================
+
+@contextlib.contextmanager
+def conectar(caminho):
+    """Conexão em modo autocommit (transações explícitas via transacao)."""
+    con = sqlite3.connect(caminho, isolation_level=None)
+    try:
+        yield con
+    finally:
+        con.close()
+
+
+@contextlib.contextmanager
+def transacao(con):
+    """BEGIN IMMEDIATE ... COMMIT; ROLLBACK em qualquer erro."""
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        yield con
+    except BaseException:
+        con.execute('ROLLBACK')
+        raise
+    con.execute('COMMIT')
+
+
+def _q(nome):
+    """Identificador SQL entre aspas (nomes de coluna com espaço e acento)."""
+    return '"' + str(nome).replace('"', '""') + '"'
+
+
+def _tipo_coluna(serie):
+    if pd.api.types.is_bool_dtype(serie.dtype):
+        return 'bool'
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        return 'int'
+    if pd.api.types.is_float_dtype(serie.dtype):
+        return 'float'
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        return 'datetime'
+    return 'texto'
+
+
+def _valores_sql(df, tipos):
+    """Linhas do DataFrame como tuplas para o sqlite3 (NaN/NaT/'' → NULL).
+
+    Datas viram texto ISO; em colunas de texto, só os valores de data
+    (células de data numa coluna mista) são convertidos.
+    """
+    colunas = {}
+    for coluna, tipo in zip(df.columns, tipos):
+        serie = df[coluna]
+        if serie.dtype == object:
+            # Texto vazio vira célula vazia, como na planilha
+            serie = serie.mask(serie.eq(''))
+        if tipo == 'datetime' or pd.api.types.is_datetime64_any_dtype(serie.dtype):
+            serie = pd.to_datetime(serie, errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
+        elif serie.dtype == object and pd.api.types.infer_dtype(serie, skipna=True) in (
+            'datetime', 'datetime64', 'date', 'mixed',
+        ):
+            serie = serie.map(
+                lambda v: v.isoformat(sep=' ') if isinstance(v, datetime)
+                else v.isoformat() if isinstance(v, date) else v
+            )
+        colunas[coluna] = serie
+
+    convertido = pd.DataFrame(colunas, index=df.index)
+    for inicio in range(0, len(convertido), BLOCO_INSERCAO):
+        parte = convertido.iloc[inicio:inicio + BLOCO_INSERCAO].astype(object)
+        yield parte.where(parte.notna(), None).to_numpy().tolist()
+
+
+def _esquema(con, tabela):
+    """[(coluna, tipo)] da tabela, na ordem original; None se não existir."""
+    linhas = con.execute(
+        'SELECT coluna, tipo FROM _colunas WHERE tabela = ? ORDER BY posicao', (tabela,)
+    ).fetchall()
+    return linhas or None
+
+
+def _criar_metadados(con):
+    con.execute(
+        'CREATE TABLE IF NOT EXISTS _colunas ('
+        'tabela TEXT NOT NULL, posicao INTEGER NOT NULL, coluna TEXT NOT NULL, '
+        'tipo TEXT NOT NULL, PRIMARY KEY (tabela, posicao))'
+    )
+
+
+# ============================================================
+# ESCRITA
+# ============================================================
+
+def _inserir(con, tabela, df, esquema):
+    """Insere as linhas de df (alinhadas pelas colunas do esquema)."""
+    colunas = [coluna for coluna, _ in esquema]
+    tipos = [tipo for _, tipo in esquema]
+    df = df.copy(deep=False)
+    df.columns = [str(c) for c in df.columns]
+    df = df.reindex(columns=colunas)
+    sql = (
+        f'INSERT INTO {_q(tabela)} ({", ".join(map(_q, colunas))}) '
+        f'VALUES ({", ".join("?" * len(colunas))})'
+    )
+    for bloco in _valores_sql(df, tipos):
+        con.executemany(sql, bloco)
+
+
+def _criar_indices(con, tabela):
+    """Cria (se faltarem) os índices de INDICES da tabela.
+
+    Bases importadas antes dos índices os ganham na próxima ingestão.
+    """
+    colunas = {coluna for coluna, _ in _esquema(con, tabela) or []}
+    for coluna in INDICES.get(tabela, []):
+        if coluna in colunas:
+            con.execute(
+                f'CREATE INDEX IF NOT EXISTS {_q(f"ix_{tabela}_{coluna}")} '
+                f'ON {_q(tabela)} ({_q(coluna)})'
+            )
+
+
+def _atualizar_linhas(con, tabela, df, atual):
+    """UPDATE, por rowid, só das linhas de df diferentes de `atual`.
+
+    `atual` é a tabela como foi lida (mesmas linhas, em ordem de rowid).
+    Retorna as linhas gravadas, ou None se a atualização não equivale a
+    recriar a tabela (outro número de linhas, outras colunas ou outro
+    tipo inferido): aí quem chamou recria.
+    """
+    esquema = _esquema(con, tabela)
+    if esquema is None or atual is None:
+        return None
+    colunas = [coluna for coluna, _ in esquema]
+    tipos = [tipo for _, tipo in esquema]
+    if (
+        [str(c) for c in df.columns] != colunas
+        or [str(c) for c in atual.columns] != colunas
+        or [_tipo_coluna(df[c]) for c in df.columns] != tipos
+    ):
+        return None
+    rowids = np.array(
+        [linha[0] for linha in con.execute(f'SELECT rowid FROM {_q(tabela)} ORDER BY rowid')],
+        dtype=np.int64,
+    )
+    if not len(df) == len(atual) == len(rowids):
+        return None
+
+    # Texto vazio é gravado como NULL (_valores_sql) e volta como NaN
+    novo = df.astype(object).mask(df.eq('')).to_numpy()
+    antigo = atual.astype(object).to_numpy()
+    with np.errstate(invalid='ignore'):
+        iguais = (novo == antigo) | (pd.isna(novo) & pd.isna(antigo))
+    alteradas = ~iguais.all(axis=1)
+
+    alterado = df[alteradas].copy(deep=False)
+    alterado.columns = colunas
+    alterado['__rowid'] = rowids[alteradas]
+    sql = (
+        f'UPDATE {_q(tabela)} SET {", ".join(f"{_q(c)} = ?" for c in colunas)} '
+        f'WHERE rowid = ?'
+    )
+    for bloco in _valores_sql(alterado, tipos + ['int']):
+        con.executemany(sql, bloco)
+    return int(alteradas.sum())
+
+
+def _recriar_tabela(con, tabela, df):
+    """Substitui a tabela pelo conteúdo de df (esquema a partir dos dtypes).
+
+    Os índices de INDICES são criados depois das inserções.
+    """
+    esquema = [(str(c), _tipo_coluna(df[c])) for c in df.columns]
+    con.execute(f'DROP TABLE IF EXISTS {_q(tabela)}')
+    con.execute('DELETE FROM _colunas WHERE tabela = ?', (tabela,))
+    definicao = ', '.join(f'{_q(c)} {_TIPOS_SQL[t]}'.strip() for c, t in esquema)
+    con.execute(f'CREATE TABLE {_q(tabela)} ({definicao})')
+    con.executemany(
+        'INSERT INTO _colunas (tabela, posicao, coluna, tipo) VALUES (?, ?, ?, ?)',
+        [(tabela, i, c, t) for i, (c, t) in enumerate(esquema)],
+    )
+    _inserir(con, tabela, df, esquema)
+    _criar_indices(con, tabela)
+
+
+def importar_planilha(planilha, base=None):
+    """Cria (ou substitui) a base a partir das abas da planilha.
+
+    Grava num arquivo temporário e troca de forma atômica: a base atual
+    segue válida até a importação terminar.
+    """
+    base = base or caminho_base(planilha)
+    abas, _ = ler_abas(planilha)
+
+    tmp = f"{base}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    with conectar(tmp) as con:
+        with transacao(con):
+            _criar_metadados(con)
+            for nome, df in abas.items():
+                if len(df.columns):
+                    _recriar_tabela(con, nome, df)
+    os.replace(tmp, base)
+    return {nome: len(df) for nome, df in abas.items()}
+
+
+def gravar_ingestao(base, novos, relatorio, relatorio_atual=None):
+    """OS novas ao fim da tabela OS e RELATORIO substituído, numa transação.
+
+    `relatorio` None: só as OS (como salvar_planilha sem RELATORIO).
+
+    As OS novas seguem o esquema atual da tabela OS. Com `relatorio_atual`
+    (o RELATORIO lido da base), só as linhas que mudaram são atualizadas;
+    sem ele, ou se linhas, colunas ou tipos mudaram, o RELATORIO é
+    recriado. Base sem tabela OS (não criada por importar_planilha)
+    levanta ValueError sem gravar nada.
+
+    Returns:
+        dict {tabela: (linhas gravadas, segundos)}
+    """
+    estatisticas = {}
+    with conectar(base) as con:
+        with transacao(con):
+            _criar_metadados(con)
+            esquema = _esquema(con, 'OS')
+            if esquema is None:
+                raise ValueError(
+                    f"Tabela OS não encontrada em {base}: "
+                    f"crie a base com 'python armazem.py importar'"
+                )
+            inicio = time.perf_counter()
+            _criar_indices(con, 'OS')
+            _inserir(con, 'OS', novos, esquema)
+            estatisticas['OS'] = (len(novos), time.perf_counter() - inicio)
+
+            if relatorio is None:
+                return estatisticas
+            # Tipos a partir do conteúdo (o recálculo incremental vem como
+            # object), como numa releitura da planilha regravada
+            inicio = time.perf_counter()
+            relatorio = relatorio.infer_objects()
+            gravadas = _atualizar_linhas(con, 'RELATORIO', relatorio, relatorio_atual)
+            if gravadas is None:
+                _recriar_tabela(con, 'RELATORIO', relatorio)
+                gravadas = len(relatorio)
+            estatisticas['RELATORIO'] = (gravadas, time.perf_counter() - inicio)
+    return estatisticas
+
+
+# ============================================================
+# LEITURA
+# ============================================================
+
+def _ler_tabela(con, tabela, colunas=None, sem_cabecalho=False, onde=''):
+    esquema = _esquema(con, tabela)
+    if esquema is None:
+        return pd.DataFrame()
+    tipos = dict(esquema)
+    nomes = [c for c, _ in esquema if colunas is None or c in colunas]
+
+    df = pd.read_sql_query(
+        f'SELECT {", ".join(map(_q, nomes))} FROM {_q(tabela)} {onde} ORDER BY rowid', con,
+    )
+    for coluna in nomes:
+        df[coluna] = _restaurar_tipo(df[coluna], tipos[coluna])
+    if sem_cabecalho:
+        # Aba lida com header=None: colunas posicionais, como no read_excel
+        df.columns = [int(c) for c in df.columns]
+    return df
+
+
+def _restaurar_tipo(serie, tipo):
+    """Coluna lida do SQLite com o tipo registrado na importação.
+
+    Linhas acrescentadas depois podem trazer valores de outro tipo (texto
+    numa coluna numérica, data que não é data): nesse caso a coluna fica
+    mista, como ficaria na leitura da planilha.
+    """
+    if serie.dtype == object:
+        # NULL volta como None; na leitura do Excel vazio é NaN
+        serie = serie.where(serie.notna(), np.nan)
+        if tipo != 'datetime' and len(serie) and serie.isna().all():
+            # Coluna toda vazia: float64, como no read_excel (em object,
+            # o cache Parquet a devolveria com None)
+            return serie.astype('float64')
+
+    if tipo == 'datetime':
+        datas = pd.to_datetime(serie, errors='coerce', format='ISO8601')
+        falhas = datas.isna() & serie.notna()
+        return serie.where(falhas, datas) if falhas.any() else datas
+    if tipo in ('int', 'float') and serie.dtype == object:
+        numeros = pd.to_numeric(serie, errors='coerce')
+        return serie if (numeros.isna() & serie.notna()).any() else numeros
+    if tipo == 'float':
+        return serie.astype('float64')
+    if tipo == 'bool' and not serie.hasnans:
+        return serie.astype(bool)
+    return serie
+
+
+def ler_tabelas(base, nomes=None, colunas=None):
+    """Lê as tabelas da base (todas as abas conhecidas ou só as de `nomes`).
+
+    Args:
+        colunas: {aba: [colunas]} para ler só parte de uma tabela
+
+    Retorna (abas, tempos), no formato de planilha.ler_abas. Abas opcionais
+    ausentes vêm vazias; obrigatórias ausentes levantam ValueError.
+    """
+    conhecidas = {**ABAS_OBRIGATORIAS, **ABAS_OPCIONAIS}
+    nomes = list(conhecidas) if nomes is None else nomes
+    colunas = colunas or {}
+
+    abas, tempos = {}, {}
+    with conectar(base) as con:
+        existentes = {
+            linha[0] for linha in con.execute('SELECT DISTINCT tabela FROM _colunas')
+        }
+        faltando = [n for n in ABAS_OBRIGATORIAS if n in nomes and n not in existentes]
+        if faltando:
+            raise ValueError(f"Tabelas obrigatórias não encontradas: {', '.join(faltando)}")
+
+        for nome in nomes:
+            inicio = time.perf_counter()
+            abas[nome] = _ler_tabela(
+                con, nome, colunas.get(nome),
+                sem_cabecalho=conhecidas.get(nome, {}).get('header', 0) is None,
+            )
+            tempos[nome] = time.perf_counter() - inicio
+    return abas, tempos
+
+
+def ler_por_chave(base, tabela, coluna, chaves):
+    """Linhas da tabela cuja `coluna` está em `chaves`, em ordem de rowid.
+
+    `chaves`: inteiros (chave_id). Com o índice da coluna (INDICES), lê
+    só essas linhas. Valores guardados como texto (que a chave_id pode
+    normalizar para uma das chaves) vêm todos: ficam depois dos números
+    no índice e quem chamou filtra de novo pela chave_id.
+    """
+    t, c = _q(tabela), _q(coluna)
+    with conectar(base) as con:
+        con.execute('CREATE TEMP TABLE _chaves (chave INTEGER PRIMARY KEY)')
+        con.executemany('INSERT OR IGNORE INTO _chaves VALUES (?)', ((int(k),) for k in chaves))
+        # rowid das duas buscas no índice (com OR o SQLite varre a tabela)
+        return _ler_tabela(con, tabela, onde=(
+            f'WHERE rowid IN (SELECT rowid FROM {t} WHERE {c} IN (SELECT chave FROM _chaves) '
+            f"UNION ALL SELECT rowid FROM {t} WHERE {c} >= '')"
+        ))
+
+
+def total_linhas(base, tabela):
+    """Número de linhas da tabela (sem lê-las)."""
+    with conectar(base) as con:
+        return con.execute(f'SELECT count(*) FROM {_q(tabela)}').fetchone()[0]
+
+
+def ler_dados(caminho, nomes=None, colunas=None):
+    """Lê as abas da fonte: base SQLite ou planilha (planilha.ler_abas).
+
+    Args:
+        colunas: {aba: [colunas]} para ler só parte das abas (na base,
+            SELECT só dessas colunas; na planilha, usecols)
+
+    Na base, a leitura usa o mesmo cache colunar da planilha, invalidado
+    quando o arquivo da base muda; só uma leitura completa sem projeção
+    o atualiza.
+
+    Retorna (abas, leitura) no formato de planilha.ler_abas, com origem
+    'sqlite', 'cache' ou 'excel'.
+    """
+    if not eh_base(caminho):
+        return ler_abas(caminho, nomes=nomes, colunas=colunas)
+
+    inicio = time.perf_counter()
+    completa = nomes is None and not colunas
+    resultado = ler_cache(caminho, nomes, colunas)
+    if resultado is not None:
+        abas, tempos = resultado
+        origem = 'cache'
+    else:
+        assinatura = assinatura_arquivo(caminho) if completa else None
+        abas, tempos = ler_tabelas(caminho, nomes, colunas)
+        if completa:
+            gravar_cache(caminho, abas, assinatura)
+        origem = 'sqlite'
+    return abas, {
+        'origem': origem,
+        'tempos': tempos,
+        'total': time.perf_counter() - inicio,
+    }
+
+
+# ============================================================
+# EXPORTAÇÃO
+# ============================================================
+
+def exportar_planilha(base, destino):
+    """Gera a planilha (.xlsx) com todas as tabelas da base, em streaming."""
+    abas, _ = ler_tabelas(base)
+    gravar_planilha(destino, {nome: df for nome, df in abas.items() if len(df.columns)})
+    return {nome: len(df) for nome, df in abas.items()}
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    forcar = '--forcar' in sys.argv[1:]
+    if (
+        not args or args[0] not in ('importar', 'exportar')
+        or (args[0] == 'exportar' and len(args) < 2)
+    ):
+        print("Uso: python armazem.py importar [planilha.xlsx] [--forcar]")
+        print("     python armazem.py exportar <saida.xlsx> [--forcar]")
+        sys.exit(1)
+
+    comando = args[0]
+    if comando == 'importar':
+        planilha = args[1] if len(args) > 1 else DATA_FILE
+        destino = caminho_base(planilha)
+    else:
+        base = caminho_base(DATA_FILE)
+        if not os.path.exists(base):
+            print(f"ERRO: base não encontrada: {base}")
+            sys.exit(1)
+        destino = args[1]
+    if os.path.exists(destino) and not forcar:
+        print(f"ERRO: {destino} já existe. Use --forcar para substituir.")
+        sys.exit(1)
+
+    inicio = time.perf_counter()
+    if comando == 'importar':
+        linhas = importar_planilha(planilha, destino)
+        print(f"Base criada: {destino}")
+    else:
+        linhas = exportar_planilha(base, destino)
+        print(f"Planilha exportada: {destino}")
+
+    for nome, n in linhas.items():
+        print(f"  {nome:>14}: {n} linhas")
+    print(f"  Tempo: {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,23 +6,56 @@ Automatiza: validação → integração de OS → recálculo do RELATORIO
 Uso:
     python atualizar_mes.py OS_FEVEREIRO.xlsm
     python atualizar_mes.py OS_MARCO.xlsx
+    python atualizar_mes.py OS_MARCO.csv
+    python atualizar_mes.py OS_JAN.xlsx OS_FEV.xlsx "OS_2025_*.csv"   (lote)
+    python atualizar_mes.py OS_MARCO.xlsx --completo   (recalcula todo o RELATORIO)
 
 O que faz:
-    1. Lê o arquivo de OS do mês
+    1. Lê o(s) arquivo(s) de OS (CSV em blocos, com esquema explícito;
+       em lote, um processo por arquivo)
     2. Valida colunas e formatos
     3. Padroniza ASSUNTO usando config (DE→PARA)
-    4. Remove duplicados (OS já existentes na base)
-    5. Integra novas OS na aba OS da planilha
-    6. Recalcula a aba RELATORIO (replica XLOOKUPs)
+    4. Remove duplicados (OS já existentes na base, pelo índice de OS
+       em indice_os.py, sem ler a aba OS)
+    5. Recalcula a aba RELATORIO (replica XLOOKUPs), só para os
+       patrimônios das OS novas quando o RELATORIO atual está alinhado
+    6. Integra novas OS na aba OS e grava o RELATORIO
     7. Gera relatório de integração
+
+A base é lida uma vez, só quando há OS novas (cache colunar quando
+disponível), e salva uma vez,
+também em lote: os arquivos são juntados e deduplicados em memória, com
+uma única integração e um único recálculo do RELATORIO.
+O CSV do mês é lido em blocos de TAMANHO_BLOCO_CSV linhas, cada um
+deduplicado contra a base ao ser lido: só as OS novas ficam em memória,
+qualquer que seja o tamanho da exportação do ERP.
+Com a base SQLite (armazem.py) ao lado da planilha, ela é a fonte: no
+recálculo incremental só as OS dos patrimônios tocados são lidas (índice
+de id_patrimonio), e as OS novas e as linhas do RELATORIO que mudaram são
+gravadas numa transação, sem regravar a planilha.
 """
 
+import contextlib
+import glob
+import io
 import sys
 import os
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
 import pandas as pd
-import openpyxl
 from datetime import datetime
 
+from chaves import SEM_CHAVE, chave_id, texto_id
+from desempenho import ARQUIVO_EXECUCOES, execucao, medido, medir
+from armazem import (
+    eh_base, fonte_dados, gravar_ingestao, ler_dados, ler_por_chave, total_linhas,
+)
+from indice_os import COLUNA_ID, atualizar_indice, carregar_indice, chaves_os, contem
+from planilha import reescrever_planilha
+
 
 # Caminho do arquivo base (na raiz do projeto)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -37,6 +70,56 @@ COLUNAS_OS = [
     'ASSUNTO PADRONIZADO'
 ]
 
+# Colunas da aba RELATORIO, na ordem em que são gravadas
+COLUNAS_RELATORIO = [
+    'NF', 'DATA NF', 'PRODUTO ID', 'MAC', 'SERIE', 'PATRIMONIO', 'DESCRICAO',
+    'ID CLIENTE', 'ASSUNTO OS', 'DATA ÚLTIMA OS', 'STATUS COMODATO',
+    'ALMOXARIFADO', 'STATUS_EQUIPAMENTO', 'LOCAL_EQUIPAMENTO',
+]
+
+# Esquema explícito do CSV do mês: IDs inteiros (vazios permitidos), texto
+# e datas como texto, sem inferência por bloco. As datas são convertidas
+# depois da leitura com os formatos de DATAS_CSV e as colunas de
+# NUMEROS_CSV como a leitura da planilha as tiparia; colunas fora do
+# esquema são inferidas.
+ESQUEMA_CSV = {
+    'ID _Ordem de Serviço': 'Int64',
+    'ID_cliente': 'Int64',
+    'id_produto': 'Int64',
+    'id_patrimonio': 'Int64',
+    'Descrição Assunto': str,
+    'Razão': str,
+    'Almoxarifado': str,
+    'almox.descricao': str,
+    'almox_descricao': str,
+    'Almox.descricao': str,
+    'descricao_produto': str,
+    'numero_patrimonial': str,
+    'numero_serie': str,
+    'status_comodato': str,
+    'ASSUNTO PADRONIZADO': str,
+    'data_abertura_OS': str,
+    'data_fechamento_OS': str,
+}
+# Formatos aceitos nas datas do CSV, tentados em ordem: dia primeiro
+# (exportação do sistema, com ou sem hora) e ISO (CSV gerado pelo pandas).
+# Valor preenchido fora desses formatos interrompe a leitura.
+FORMATOS_DATA_CSV = (
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d',
+)
+DATAS_CSV = {
+    'data_abertura_OS': FORMATOS_DATA_CSV,
+    'data_fechamento_OS': FORMATOS_DATA_CSV,
+}
+# Lidas como texto (tipo estável entre blocos) e depois convertidas:
+# inteiros viram números, como as células numéricas da planilha, para as
+# linhas do CSV serem gravadas iguais às lidas de um .xlsx
+NUMEROS_CSV = ('numero_patrimonial', 'numero_serie')
+
+# Linhas por bloco na leitura do CSV (memória: um bloco + as OS novas)
+TAMANHO_BLOCO_CSV = 100_000
+
 # Mapeamento de colunas alternativas (caso arquivo venha com nomes diferentes)
 COLUNAS_MAP = {
     'almox.descricao': 'Almoxarifado',
@@ -49,6 +132,25 @@ def log(msg):
     print(f"  {msg}")
 
 
+def expandir_arquivos(argumentos):
+    """Arquivos da linha de comando, com padrões glob expandidos.
+
+    Mantém a ordem dos argumentos (cada padrão em ordem alfabética): em
+    OS repetidas entre arquivos, vale a do primeiro.
+    """
+    arquivos = []
+    for argumento in argumentos:
+        if any(c in argumento for c in '*?['):
+            encontrados = sorted(glob.glob(argumento))
+            if not encontrados:
+                print(f"ERRO: Nenhum arquivo para o padrão: {argumento}")
+                sys.exit(1)
+            arquivos.extend(encontrados)
+        else:
+            arquivos.append(argumento)
+    return list(dict.fromkeys(arquivos))
+
+
 def validar_arquivo(filepath):
     """Valida se o arquivo existe e é legível."""
     if not os.path.exists(filepath):
@@ -63,12 +165,10 @@ def validar_arquivo(filepath):
     return ext
 
 
-def ler_os_novo(filepath, ext):
-    """Lê o arquivo de OS do mês."""
-    if ext == '.csv':
-        df = pd.read_csv(filepath)
-    else:
-        df = pd.read_excel(filepath)
+@medido()
+def ler_os_novo(filepath):
+    """Lê o arquivo de OS do mês (planilha; CSV vai por ler_os_csv)."""
+    df = pd.read_excel(filepath)
 
     log(f"Arquivo lido: {len(df)} linhas, {len(df.columns)} colunas")
     log(f"Colunas: {list(df.columns)}")
@@ -95,6 +195,7 @@ PADRONIZACAO_ASSUNTO = {
 }
 
 
+@medido()
 def padronizar_colunas(df_novo, config):
     """Renomeia colunas alternativas e gera ASSUNTO PADRONIZADO."""
     # Renomear colunas conhecidas
@@ -135,243 +236,554 @@ def validar_colunas_obrigatorias(df_novo):
         sys.exit(1)
 
 
-def integrar_os(df_novo, df_base):
-    """Remove duplicados e integra novas OS."""
+def converter_datas_csv(serie, formatos):
+    """Datas do CSV (texto) em datetime64, só com os `formatos` dados.
+
+    Vazios viram NaT; valor preenchido fora de todos os formatos levanta
+    ValueError com exemplos (como um ID não inteiro nas colunas Int64).
+    """
+    texto = serie.str.strip()
+    texto = texto.mask(texto.eq(''))
+    datas = pd.to_datetime(texto, format=formatos[0], errors='coerce')
+    for formato in formatos[1:]:
+        faltando = datas.isna() & texto.notna()
+        if not faltando.any():
+            break
+        datas[faltando] = pd.to_datetime(texto[faltando], format=formato, errors='coerce')
+
+    invalidas = texto[datas.isna() & texto.notna()]
+    if len(invalidas):
+        exemplos = ', '.join(repr(v) for v in invalidas.unique()[:3])
+        raise ValueError(
+            f"{len(invalidas)} data(s) fora do formato dd/mm/aaaa em "
+            f"'{serie.name}' (ex.: {exemplos})"
+        )
+    return datas
+
+
+def converter_numeros_csv(serie):
+    """Inteiros escritos como texto em números, como o read_excel os traria.
+
+    Só vira número o texto que é exatamente o inteiro ('1', '-7'); com
+    zero à esquerda, espaço ou letras continua texto ('007' não perde o
+    zero). Coluna toda numérica fica int64 (float64 com vazios), como a
+    coluna numérica da planilha; mista fica object com int e str.
+    """
+    texto = serie.dropna()
+    inteiros = texto.str.fullmatch(r'-?(0|[1-9][0-9]{0,17})')
+    if not inteiros.any():
+        return serie
+    if inteiros.all():
+        return pd.to_numeric(serie)
+    numeros = serie.astype(object)
+    numeros[inteiros[inteiros].index] = texto[inteiros].map(int)
+    return numeros
+
+
+@medido()
+def ler_os_csv(filepath, chaves_base, tamanho=TAMANHO_BLOCO_CSV):
+    """Lê o CSV do mês em blocos, mantendo só as OS que não estão na base.
+
+    Cada bloco é lido com ESQUEMA_CSV e deduplicado pelo ID da OS contra
+    `chaves_base` (chaves_os) e contra os blocos anteriores, como o
+    integrar_os faria com o arquivo inteiro. A memória fica limitada a um
+    bloco mais as OS novas, que o recálculo do RELATORIO precisa de
+    qualquer forma.
+    """
+    cabecalho = pd.read_csv(filepath, nrows=0)
+    validar_colunas_obrigatorias(cabecalho)
+
+    vistas = np.empty(0, dtype=np.int64)
+    blocos, lidas, internos, existentes, n_blocos = [], 0, 0, 0, 0
+    try:
+        leitor = pd.read_csv(filepath, dtype=ESQUEMA_CSV, chunksize=tamanho)
+        for bloco in leitor:
+            lidas += len(bloco)
+            chaves = chave_id(bloco['ID _Ordem de Serviço']).to_numpy()
+
+            # Repetidas no próprio arquivo: neste bloco ou em um anterior
+            repetida = pd.Series(chaves).duplicated().to_numpy() | contem(vistas, chaves)
+            na_base = ~repetida & contem(chaves_base, chaves)
+            internos += int(repetida.sum())
+            existentes += int(na_base.sum())
+            vistas = np.union1d(vistas, chaves[~repetida])
+
+            novas = bloco[~repetida & ~na_base]
+            blocos.append(novas.assign(**{
+                coluna: converter_datas_csv(novas[coluna], formatos)
+                for coluna, formatos in DATAS_CSV.items() if coluna in novas.columns
+            }))
+            n_blocos += 1
+    except (ValueError, TypeError) as e:
+        print(f"ERRO: CSV fora do esquema esperado (bloco {n_blocos + 1}): {e}")
+        sys.exit(1)
+
+    novos = pd.concat(blocos, ignore_index=True) if blocos else cabecalho
+    # Inteiros anuláveis → tipos numpy, como na leitura da planilha
+    for coluna, tipo in ESQUEMA_CSV.items():
+        if tipo == 'Int64' and coluna in novos.columns:
+            novos[coluna] = novos[coluna].astype('float64' if novos[coluna].hasnans else 'int64')
+    for coluna in NUMEROS_CSV:
+        if coluna in novos.columns:
+            novos[coluna] = converter_numeros_csv(novos[coluna])
+
+    log(f"Arquivo lido em {n_blocos} bloco(s) de até {tamanho}: {lidas} linhas, {len(cabecalho.columns)} colunas")
+    log(f"Colunas: {list(cabecalho.columns)}")
+    if internos > 0:
+        log(f"Duplicados internos removidos: {internos}")
+    if existentes > 0:
+        log(f"OS já existentes na base (ignorados): {existentes}")
+    return novos
+
+
+def ler_arquivo_mes(filepath, config, chaves_base):
+    """Lê, padroniza e valida um arquivo de OS (executa no processo do lote).
+
+    Retorna (DataFrame, log do arquivo); DataFrame None se o arquivo foi
+    recusado (o log traz o ERRO).
+    """
+    saida = io.StringIO()
+    with contextlib.redirect_stdout(saida):
+        try:
+            if os.path.splitext(filepath)[1].lower() == '.csv':
+                df = ler_os_csv(filepath, chaves_base)
+            else:
+                df = ler_os_novo(filepath)
+            df = padronizar_colunas(df, config)
+            validar_colunas_obrigatorias(df)
+        except SystemExit:
+            return None, saida.getvalue()
+    return df, saida.getvalue()
+
+
+@medido()
+def ler_arquivos_mes(arquivos, config, chaves_base):
+    """Lê os arquivos de OS, em paralelo quando há mais de um.
+
+    Cada arquivo vai para um processo (leitura de Excel/CSV é CPU e não
+    libera o GIL); o resultado é juntado na ordem dos arquivos, para o
+    integrar_os deduplicar o lote inteiro de uma vez.
+    """
+    if len(arquivos) == 1:
+        resultados = [ler_arquivo_mes(arquivos[0], config, chaves_base)]
+    else:
+        processos = min(len(arquivos), os.cpu_count() or 1)
+        log(f"{len(arquivos)} arquivos em {processos} processo(s)")
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            resultados = list(executor.map(
+                ler_arquivo_mes, arquivos, repeat(config), repeat(chaves_base),
+            ))
+
+    lidos = []
+    for filepath, (df, saida) in zip(arquivos, resultados):
+        if len(arquivos) > 1:
+            log(f"{os.path.basename(filepath)}:")
+            saida = textwrap.indent(saida, '  ')
+        print(saida, end='')
+        if df is None:
+            sys.exit(1)
+        lidos.append(df)
+    return pd.concat(lidos, ignore_index=True) if len(lidos) > 1 else lidos[0]
+
+
+@medido()
+def deduplicar_os(df_novo, chaves_base):
+    """OS do arquivo novo que ainda não estão na base, nas colunas da aba OS.
+
+    O ID da OS é comparado como chave int64 (chaves.chave_id), então
+    123, 123.0 e '123' são a mesma OS. `chaves_base`: chaves ordenadas
+    da base (índice de OS ou chaves_os), sem ler a aba OS.
+    """
     # Remover duplicados no próprio arquivo novo
-    dupl_interno = df_novo.duplicated(subset=['ID _Ordem de Serviço'], keep='first').sum()
+    chaves = chave_id(df_novo['ID _Ordem de Serviço'])
+    repetida = chaves.duplicated(keep='first').to_numpy()
+    dupl_interno = int(repetida.sum())
     if dupl_interno > 0:
-        df_novo = df_novo.drop_duplicates(subset=['ID _Ordem de Serviço'], keep='first')
+        df_novo = df_novo[~repetida]
         log(f"Duplicados internos removidos: {dupl_interno}")
 
     # Verificar quais já existem na base
-    ids_base = set(df_base['ID _Ordem de Serviço'].dropna().astype(str))
-    ids_novo = df_novo['ID _Ordem de Serviço'].astype(str)
-    ja_existem = ids_novo.isin(ids_base)
+    ja_existem = contem(chaves_base, chaves.to_numpy()[~repetida])
 
     novos = df_novo[~ja_existem]
     existentes = ja_existem.sum()
 
-    log(f"OS já existentes na base (ignorados): {existentes}")
+    # CSV já chega sem elas (ler_os_csv registra a contagem na leitura)
+    if existentes > 0:
+        log(f"OS já existentes na base (ignorados): {existentes}")
     log(f"OS novas para integrar: {len(novos)}")
 
     if len(novos) == 0:
         log("Nenhuma OS nova para integrar.")
-        return df_base, 0
 
     # Garantir mesmas colunas
-    for col in COLUNAS_OS:
-        if col not in novos.columns:
-            novos[col] = None
+    return novos.reindex(columns=COLUNAS_OS)
 
-    novos = novos[COLUNAS_OS]
-    df_integrado = pd.concat([df_base, novos], ignore_index=True)
 
-    return df_integrado, len(novos)
+def integrar_os(df_novo, df_base, chaves_base=None):
+    """Remove duplicados e integra novas OS (retorna OS integrada e novas)."""
+    if chaves_base is None:
+        chaves_base = chaves_os(df_base)
+    novos = deduplicar_os(df_novo, chaves_base)
+    if len(novos) == 0:
+        return df_base, novos
+    return pd.concat([df_base, novos], ignore_index=True), novos
 
 
-def recalcular_relatorio(data_file):
-    """Recalcula a aba RELATORIO replicando XLOOKUPs do Google Sheets.
+# Almoxarifados que indicam equipamento em estoque (LOCAL_EQUIPAMENTO)
+ALMOX_ESTOQUE = ['ALMOX', 'PRINCIPAL', 'DISTRIBUIC', 'CONFERIDO']
+
 
-    Para cada patrimônio na aba NOTAS, busca a última OS na aba OS.
+def classificar_local(status, almox):
+    """LOCAL_EQUIPAMENTO a partir de STATUS COMODATO e ALMOXARIFADO.
+
+    Regras, na ordem de prioridade:
+        RMA           almoxarifado contém 'RMA'
+        INSTALADO     status contém 'Emprestado'
+        DESCONTINUADO almoxarifado contém 'DESCONTINUADO'
+        EM ESTOQUE    almoxarifado contém ALMOX/PRINCIPAL/DISTRIBUIC/CONFERIDO
+        COM TÉCNICO   demais casos (inclusive 'Sem Uso' fora do estoque)
+
+    Almoxarifado comparado em maiúsculas. Vetorizado (máscaras do .str e
+    np.select); as máscaras são avaliadas só nos valores distintos de cada
+    coluna e expandidas pelos códigos do factorize. Recebe e devolve
+    Series alinhadas.
     """
-    log("Recalculando RELATORIO...")
+    cod_status, status_unicos = pd.factorize(status.astype(str))
+    cod_almox, almox_unicos = pd.factorize(almox.astype(str).str.upper())
+    status_unicos = pd.Series(status_unicos, dtype=object)
+    almox_unicos = pd.Series(almox_unicos, dtype=object)
+
+    def mascara(unicos, codigos, padrao, regex=False):
+        return unicos.str.contains(padrao, regex=regex).to_numpy(dtype=bool)[codigos]
+
+    condicoes = [
+        mascara(almox_unicos, cod_almox, 'RMA'),
+        mascara(status_unicos, cod_status, 'Emprestado'),
+        mascara(almox_unicos, cod_almox, 'DESCONTINUADO'),
+        mascara(almox_unicos, cod_almox, '|'.join(ALMOX_ESTOQUE), regex=True),
+    ]
+    escolhas = ['RMA', 'INSTALADO', 'DESCONTINUADO', 'EM ESTOQUE']
+    local = np.select(condicoes, escolhas, default='COM TÉCNICO')
+    return pd.Series(local, index=status.index, dtype=object)
+
+
+def _relatorio_alinhado(relatorio_atual, notas):
+    """True se o RELATORIO gravado corresponde linha a linha à NOTAS atual.
+
+    Só nesse caso dá para recalcular apenas os patrimônios tocados; se a
+    NOTAS mudou (linhas novas/removidas) o recálculo tem que ser completo.
+    """
+    if relatorio_atual is None or relatorio_atual.empty:
+        return False
+    if 'id_patrimonio' not in notas.columns:
+        return False
+    if list(relatorio_atual.columns) != COLUNAS_RELATORIO:
+        return False
+    if len(relatorio_atual) != len(notas):
+        return False
+    chaves = chave_id(relatorio_atual['PATRIMONIO']).to_numpy()
+    return bool((chaves == chave_id(notas['id_patrimonio']).to_numpy()).all())
 
-    notas = pd.read_excel(data_file, sheet_name='NOTAS')
-    os_df = pd.read_excel(data_file, sheet_name='OS')
-    config = pd.read_excel(data_file, sheet_name='config')
 
-    # Converter datas
-    os_df['data_fechamento_OS'] = pd.to_datetime(os_df['data_fechamento_OS'], errors='coerce')
+def _patrimonios_tocados(patrimonios):
+    """Chaves (chave_id) únicas dos id_patrimonio das OS novas."""
+    return chave_id(pd.Series(patrimonios).dropna()).unique()
 
-    # Limpar patrimônios
-    os_df = os_df.dropna(subset=['id_patrimonio'])
-    os_df['id_patrimonio'] = os_df['id_patrimonio'].astype(str).str.replace(r'\.0$', '', regex=True)
 
-    notas_pat = notas.copy()
-    if 'id_patrimonio' in notas_pat.columns:
-        notas_pat['PATRIMONIO_STR'] = notas_pat['id_patrimonio'].astype(str).str.replace(r'\.0$', '', regex=True)
-    else:
-        print("ERRO: Coluna 'id_patrimonio' não encontrada na aba NOTAS.")
-        return
-
-    # Última OS por patrimônio
-    os_sorted = os_df.sort_values('data_fechamento_OS')
-    ultima_os = os_sorted.groupby('id_patrimonio').last().reset_index()
-
-    # Mapeamento status_comodato → LOCAL_EQUIPAMENTO
-    local_map = {
-        'Emprestado': 'INSTALADO',
-        'Sem Uso': 'EM ESTOQUE',
-    }
-
-    # Mapeamento almoxarifado → LOCAL_EQUIPAMENTO (para refinar)
-    def inferir_local(row):
-        status = str(row.get('STATUS COMODATO', ''))
-        almox = str(row.get('ALMOXARIFADO', ''))
-
-        if 'RMA' in almox.upper():
-            return 'RMA'
-        if 'Emprestado' in status:
-            return 'INSTALADO'
-        if 'Descontinuado' in almox or 'DESCONTINUADO' in almox.upper():
-            return 'DESCONTINUADO'
-        if any(x in almox.upper() for x in ['ALMOX', 'PRINCIPAL', 'DISTRIBUIC', 'CONFERIDO']):
-            return 'EM ESTOQUE'
-        if status == 'Sem Uso':
-            return 'COM TÉCNICO'
-        return 'COM TÉCNICO'
+def _colunas_notas(notas_pat):
+    """Colunas do RELATORIO copiadas da NOTAS (índice de `notas_pat`).
 
-    # CICLO
-    os_sorted_ciclo = os_df.sort_values(['id_patrimonio', 'data_fechamento_OS'])
-    os_sorted_ciclo['CICLO'] = os_sorted_ciclo.groupby('id_patrimonio').cumcount() + 1
-    ultimo_ciclo = os_sorted_ciclo.groupby('id_patrimonio')['CICLO'].last().reset_index()
-    ultimo_ciclo.columns = ['id_patrimonio', 'ULTIMO_CICLO']
-
-    # Construir RELATORIO
-    rel = notas_pat.copy()
-    rel = rel.rename(columns={
-        'id_patrimonio': 'PATRIMONIO_ORIG',
+    Cópia vetorizada, sem depender das OS: no modo incremental é refeita
+    para todas as linhas, e edições na NOTAS chegam ao RELATORIO mesmo em
+    patrimônios sem OS nova.
+    """
+    notas = notas_pat.rename(columns={
         'Número NF': 'NF',
         'Data NF': 'DATA NF',
         'Descrição': 'DESCRICAO',
         'Nº Série': 'SERIE',
     })
+    rel = pd.DataFrame(index=notas.index)
+    rel['NF'] = notas['NF']
+    rel['DATA NF'] = notas['DATA NF']
+    rel['PRODUTO ID'] = notas['id_produto'] if 'id_produto' in notas.columns else None
+    rel['MAC'] = notas['MAC']
+    rel['SERIE'] = notas['SERIE']
+    rel['PATRIMONIO'] = notas['PATRIMONIO_STR']
+    rel['DESCRICAO'] = notas['DESCRICAO']
+    rel['ID CLIENTE'] = notas['ID_cliente'] if 'ID_cliente' in notas.columns else None
+    return rel
+
+
+def _colunas_os(notas_pat, os_df):
+    """Colunas do RELATORIO calculadas das OS (índice de `notas_pat`).
+
+    `os_df` precisa conter todas as OS dos patrimônios dessas linhas (já
+    limpa, com datas convertidas e chave PAT_ID).
+    """
+    os_df = os_df[os_df['PAT_ID'] != SEM_CHAVE]
 
-    # Merge com última OS
-    rel = rel.merge(
-        ultima_os[['id_patrimonio', 'data_fechamento_OS', 'ASSUNTO PADRONIZADO',
-                    'status_comodato', 'Almoxarifado']],
-        left_on='PATRIMONIO_STR', right_on='id_patrimonio', how='left'
-    )
+    # Última OS por patrimônio (ordenação estável: empates de data mantêm
+    # a ordem da base, independente de quantas OS entram no cálculo)
+    os_sorted = os_df.sort_values('data_fechamento_OS', kind='stable')
+    ultima_os = os_sorted.groupby('PAT_ID').last().reset_index()
 
-    # Merge com CICLO
-    rel = rel.merge(ultimo_ciclo, left_on='PATRIMONIO_STR', right_on='id_patrimonio', how='left')
+    # CICLO
+    ultimo_ciclo = os_df.groupby('PAT_ID').size().rename('ULTIMO_CICLO')
 
-    # Montar colunas finais
-    rel_final = pd.DataFrame()
-    rel_final['NF'] = rel['NF']
-    rel_final['DATA NF'] = rel['DATA NF']
-    rel_final['PRODUTO ID'] = rel.get('id_produto', None) if 'id_produto' in rel.columns else None
-    rel_final['MAC'] = rel['MAC']
-    rel_final['SERIE'] = rel['SERIE']
-    rel_final['PATRIMONIO'] = rel['PATRIMONIO_STR']
-    rel_final['DESCRICAO'] = rel['DESCRICAO']
-    rel_final['ID CLIENTE'] = rel.get('ID_cliente', None) if 'ID_cliente' in rel.columns else None
+    # Merge com última OS e CICLO (left: uma linha por linha da NOTAS)
+    rel = notas_pat[['PAT_ID']].merge(
+        ultima_os[['PAT_ID', 'data_fechamento_OS', 'ASSUNTO PADRONIZADO',
+                   'status_comodato', 'Almoxarifado']],
+        on='PAT_ID', how='left'
+    )
+    rel = rel.merge(ultimo_ciclo, left_on='PAT_ID', right_index=True, how='left')
 
+    rel_os = pd.DataFrame(index=rel.index)
     # ASSUNTO OS (padronizado da última OS, ou SEM OS)
-    rel_final['ASSUNTO OS'] = rel['ASSUNTO PADRONIZADO'].fillna('SEM OS')
+    rel_os['ASSUNTO OS'] = rel['ASSUNTO PADRONIZADO'].fillna('SEM OS')
     # Aplicar padronização canônica
-    rel_final['ASSUNTO OS'] = rel_final['ASSUNTO OS'].replace(PADRONIZACAO_ASSUNTO)
+    rel_os['ASSUNTO OS'] = rel_os['ASSUNTO OS'].replace(PADRONIZACAO_ASSUNTO)
 
-    rel_final['DATA ÚLTIMA OS'] = rel['data_fechamento_OS']
-    rel_final['STATUS COMODATO'] = rel['status_comodato'].fillna('Sem Uso')
-    rel_final['ALMOXARIFADO'] = rel['Almoxarifado'].fillna('')
+    rel_os['DATA ÚLTIMA OS'] = rel['data_fechamento_OS']
+    rel_os['STATUS COMODATO'] = rel['status_comodato'].fillna('Sem Uso')
+    rel_os['ALMOXARIFADO'] = rel['Almoxarifado'].fillna('')
 
     # STATUS_EQUIPAMENTO
-    rel_final['STATUS_EQUIPAMENTO'] = rel['ULTIMO_CICLO'].apply(
+    rel_os['STATUS_EQUIPAMENTO'] = rel['ULTIMO_CICLO'].apply(
         lambda x: 'REUTILIZADO' if pd.notna(x) and x > 1 else 'NOVO'
     )
 
     # LOCAL_EQUIPAMENTO
-    rel_final['LOCAL_EQUIPAMENTO'] = rel_final.apply(inferir_local, axis=1)
+    rel_os['LOCAL_EQUIPAMENTO'] = classificar_local(
+        rel_os['STATUS COMODATO'], rel_os['ALMOXARIFADO']
+    )
 
-    # Salvar no Excel (preservar outras abas)
-    wb = openpyxl.load_workbook(data_file)
+    rel_os.index = notas_pat.index
+    return rel_os
 
-    # Remover aba RELATORIO existente
-    if 'RELATORIO' in wb.sheetnames:
-        del wb['RELATORIO']
 
-    ws = wb.create_sheet('RELATORIO', 3)  # posição 3 (após NOTAS, OS)
+def _montar_relatorio(notas_pat, os_df):
+    """Linhas do RELATORIO para as linhas de NOTAS recebidas.
 
-    # Escrever headers
-    headers = list(rel_final.columns)
-    for col_idx, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col_idx, value=header)
+    Colunas da NOTAS seguidas das calculadas das OS (COLUNAS_RELATORIO).
+    O índice do resultado é o de `notas_pat`, para permitir o patch por linha.
+    """
+    return pd.concat([_colunas_notas(notas_pat), _colunas_os(notas_pat, os_df)], axis=1)
 
-    # Escrever dados
-    for row_idx, row_data in enumerate(rel_final.values, 2):
-        for col_idx, value in enumerate(row_data, 1):
-            if pd.isna(value):
-                ws.cell(row=row_idx, column=col_idx, value=None)
-            else:
-                ws.cell(row=row_idx, column=col_idx, value=value)
 
-    wb.save(data_file)
-    log(f"RELATORIO recalculado: {len(rel_final)} linhas")
+@medido()
+def recalcular_relatorio(notas, os_df, relatorio_atual=None, patrimonios=None):
+    """Recalcula a aba RELATORIO replicando XLOOKUPs do Google Sheets.
+
+    Para cada patrimônio na aba NOTAS, busca a última OS na OS integrada.
+    Trabalha sobre os DataFrames já em memória; retorna o RELATORIO
+    (ou None se a NOTAS não tiver id_patrimonio).
+
+    Modo incremental: com `patrimonios` (id_patrimonio das OS novas) e o
+    RELATORIO atual alinhado à NOTAS, as colunas calculadas das OS só são
+    recalculadas nas linhas desses patrimônios; nas demais ficam como
+    estão. As colunas da NOTAS são copiadas de novo em todas as linhas.
+    """
+    log("Recalculando RELATORIO...")
+
+    notas_pat = notas.copy()
+    if 'id_patrimonio' in notas_pat.columns:
+        notas_pat['PATRIMONIO_STR'] = texto_id(notas_pat['id_patrimonio'])
+        notas_pat['PAT_ID'] = chave_id(notas_pat['id_patrimonio'])
+    else:
+        print("ERRO: Coluna 'id_patrimonio' não encontrada na aba NOTAS.")
+        return None
+
+    # Limpar patrimônios (sem cópia da base: quem chamou não é alterado)
+    os_df = os_df.dropna(subset=['id_patrimonio'])
+    os_ids = chave_id(os_df['id_patrimonio'])
+
+    incremental = patrimonios is not None and _relatorio_alinhado(relatorio_atual, notas_pat)
+    if incremental:
+        tocados = _patrimonios_tocados(patrimonios)
+        linhas = notas_pat['PAT_ID'].isin(tocados)
+        os_tocadas = os_ids.isin(tocados)
+        os_df = os_df[os_tocadas]
+        os_ids = os_ids[os_tocadas]
+    elif patrimonios is not None:
+        log("RELATORIO atual não corresponde à NOTAS; recálculo completo")
+
+    os_df = os_df.assign(
+        PAT_ID=os_ids,
+        data_fechamento_OS=pd.to_datetime(os_df['data_fechamento_OS'], errors='coerce'),
+    )
+    if not incremental:
+        rel_final = _montar_relatorio(notas_pat, os_df)
+        log(f"RELATORIO recalculado: {len(rel_final)} linhas")
+        return rel_final.reset_index(drop=True)
+
+    rel_final = relatorio_atual.astype(object)
+    rel_final.index = notas_pat.index
+    # Colunas da NOTAS em todas as linhas (cópia vetorizada: edições na
+    # NOTAS entram mesmo sem OS nova); PATRIMONIO volta como o texto da NOTAS
+    notas_rel = _colunas_notas(notas_pat)
+    rel_final[list(notas_rel.columns)] = notas_rel.astype(object)
+    # Colunas das OS só nas linhas dos patrimônios tocados
+    parcial = _colunas_os(notas_pat[linhas], os_df)
+    rel_final.loc[linhas.to_numpy(), list(parcial.columns)] = parcial.astype(object)
+    log(f"RELATORIO incremental: {len(parcial)} de {len(rel_final)} linhas com OS recalculadas "
+        f"({len(tocados)} patrimônios nas OS novas)")
+    return rel_final.reset_index(drop=True)
+
+
+def _taxa(linhas, segundos):
+    return f"{linhas / segundos:,.0f} linhas/s" if segundos > 0 else "-"
+
+
+@medido()
+def salvar_planilha(data_file, novos, rel_final):
+    """Grava as OS novas após a última linha da aba OS e o RELATORIO.
+
+    Reescrita em streaming (planilha.reescrever_planilha): só OS e
+    RELATORIO são regravadas; as linhas existentes da OS e as demais abas
+    (com formatação) são copiadas como estão, e só o delta do mês é
+    convertido do DataFrame.
+    """
+    inicio = time.perf_counter()
+    substituir = {'RELATORIO': rel_final} if rel_final is not None else {}
+    anexar = {'OS': novos}
+    estatisticas = reescrever_planilha(data_file, substituir=substituir, anexar=anexar)
+
+    # Taxas separadas: a passagem pelas linhas existentes (cópia byte a
+    # byte ou descarte) não converte nada e distorceria a da escrita
+    for aba, e in estatisticas.items():
+        if aba in anexar:
+            existentes = f"{e['copiadas']} linhas existentes copiadas em {e['copia']:.2f}s"
+        else:
+            existentes = f"conteúdo anterior descartado em {e['copia']:.2f}s"
+        log(f"{aba}: {existentes}; {e['escritas']} linhas escritas em "
+            f"{e['escrita']:.2f}s ({_taxa(e['escritas'], e['escrita'])})")
+    log(f"Planilha gravada em {time.perf_counter() - inicio:.1f}s")
+
+
+@medido()
+def salvar_base(base, novos, rel_final, relatorio_atual=None):
+    """Grava as OS novas e o RELATORIO na base SQLite, numa transação.
+
+    Só as linhas novas são inseridas e, do RELATORIO, só as linhas que
+    mudaram em relação a `relatorio_atual`; a planilha para o financeiro
+    sai de `python armazem.py exportar`.
+    """
+    inicio = time.perf_counter()
+    estatisticas = gravar_ingestao(base, novos, rel_final, relatorio_atual)
+
+    for tabela, (linhas, duracao) in estatisticas.items():
+        log(f"{tabela}: {linhas} linhas gravadas em {duracao:.2f}s")
+    # Taxa do total gravado sobre o tempo total (inclui o COMMIT)
+    total = sum(linhas for linhas, _ in estatisticas.values())
+    duracao = time.perf_counter() - inicio
+    log(f"Base gravada em {duracao:.1f}s ({_taxa(total, duracao)})")
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Uso: python atualizar_mes.py <arquivo_os_do_mes>")
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    completo = '--completo' in sys.argv[1:]
+    if not args:
+        print("Uso: python atualizar_mes.py <arquivo_os_do_mes> [<arquivo> ... | \"padrão*\"] [--completo]")
         print("Exemplo: python atualizar_mes.py OS_FEVEREIRO.xlsm")
         sys.exit(1)
 
-    filepath = sys.argv[1]
+    arquivos = expandir_arquivos(args)
     print(f"\n{'='*60}")
     print(f"  INGESTÃO MENSAL DE OS")
-    print(f"  Arquivo: {filepath}")
-    print(f"  Base: {DATA_FILE}")
+    for filepath in arquivos:
+        print(f"  Arquivo: {filepath}")
+    fonte = fonte_dados(DATA_FILE)
+    print(f"  Base: {fonte}")
     print(f"  Data: {datetime.now():%d/%m/%Y %H:%M:%S}")
     print(f"{'='*60}\n")
 
-    # 1. Validar arquivo
-    print("[1/6] Validando arquivo...")
-    ext = validar_arquivo(filepath)
-
-    # 2. Ler arquivo novo
-    print("[2/6] Lendo arquivo de OS...")
-    df_novo = ler_os_novo(filepath, ext)
-
-    # 3. Carregar config e padronizar
-    print("[3/6] Padronizando colunas...")
-    config = pd.read_excel(DATA_FILE, sheet_name='config')
-    df_novo = padronizar_colunas(df_novo, config)
-    validar_colunas_obrigatorias(df_novo)
-
-    # 4. Carregar base atual e integrar
+    # 1. Validar arquivo(s)
+    print("[1/6] Validando arquivo(s)...")
+    for filepath in arquivos:
+        validar_arquivo(filepath)
+
+    # 2. Config e índice de OS (a aba OS só é lida se o índice estiver
+    #    desatualizado)
+    print("[2/6] Lendo config e índice de OS...")
+    with medir('ler_dados'):
+        abas, leitura = ler_dados(fonte, nomes=['config'])
+    with medir('carregar_indice'):
+        chaves_base, reconstruido = carregar_indice(
+            fonte,
+            lambda: ler_dados(fonte, nomes=['OS'], colunas={'OS': [COLUNA_ID]})[0]['OS'],
+        )
+    log(f"Índice de OS {'reconstruído' if reconstruido else 'lido'}: {len(chaves_base)} OS na base")
+
+    # 3. Ler e padronizar os arquivos (CSV já deduplicado contra a base)
+    print("[3/6] Lendo e padronizando arquivo(s) de OS...")
+    df_novo = ler_arquivos_mes(arquivos, abas['config'], chaves_base)
+
+    # 4. Deduplicar contra o índice; a base só é lida se houver OS novas
     print("[4/6] Integrando com base existente...")
-    df_base = pd.read_excel(DATA_FILE, sheet_name='OS')
-    log(f"Base atual: {len(df_base)} linhas")
-
-    df_integrado, qtd_novas = integrar_os(df_novo, df_base)
+    novos = deduplicar_os(df_novo, chaves_base)
+    qtd_novas = len(novos)
 
     if qtd_novas > 0:
-        # 5. Salvar OS integrada
-        print("[5/6] Salvando OS integrada...")
-        wb = openpyxl.load_workbook(DATA_FILE)
-        ws = wb['OS']
-
-        # Limpar conteúdo existente (exceto header)
-        for row in ws.iter_rows(min_row=2, max_row=ws.max_row):
-            for cell in row:
-                cell.value = None
-
-        # Escrever dados integrados
-        for row_idx, row_data in enumerate(df_integrado.values, 2):
-            for col_idx, value in enumerate(row_data, 1):
-                if pd.isna(value):
-                    ws.cell(row=row_idx, column=col_idx, value=None)
-                else:
-                    ws.cell(row=row_idx, column=col_idx, value=value)
-
-        wb.save(DATA_FILE)
-        log(f"OS salva: {len(df_integrado)} linhas (base anterior: {len(df_base)})")
-
-        # 6. Recalcular RELATORIO
-        print("[6/6] Recalculando RELATORIO...")
-        recalcular_relatorio(DATA_FILE)
+        # Na base SQLite, com o RELATORIO alinhado à NOTAS, a aba OS não é
+        # lida inteira: o recálculo incremental só usa as OS dos
+        # patrimônios tocados, lidas pelo índice de id_patrimonio
+        seletiva = eh_base(fonte) and not completo
+        nomes = ['NOTAS', 'RELATORIO'] if seletiva else ['OS', 'NOTAS', 'RELATORIO']
+        with medir('ler_dados'):
+            abas, leitura = ler_dados(fonte, nomes=nomes)
+        log(f"Base lida ({leitura['origem']}) em {leitura['total']:.1f}s")
+        seletiva = seletiva and _relatorio_alinhado(abas['RELATORIO'], abas['NOTAS'])
+        if seletiva:
+            total_base = total_linhas(fonte, 'OS')
+            with medir('ler_por_chave'):
+                df_base = ler_por_chave(
+                    fonte, 'OS', 'id_patrimonio', _patrimonios_tocados(novos['id_patrimonio']),
+                )
+            log(f"Base atual: {total_base} linhas; {len(df_base)} lidas "
+                f"(OS dos patrimônios tocados)")
+        else:
+            if 'OS' not in abas:
+                with medir('ler_dados'):
+                    abas['OS'] = ler_dados(fonte, nomes=['OS'])[0]['OS']
+            df_base = abas['OS']
+            total_base = len(df_base)
+            log(f"Base atual: {total_base} linhas")
+        df_integrado = pd.concat([df_base, novos], ignore_index=True)
+
+        # 5. Recalcular RELATORIO a partir da OS integrada em memória
+        print("[5/6] Recalculando RELATORIO...")
+        rel_final = recalcular_relatorio(
+            abas['NOTAS'], df_integrado,
+            relatorio_atual=None if completo else abas['RELATORIO'],
+            patrimonios=None if completo else novos['id_patrimonio'],
+        )
+
+        # 6. Salvar em streaming: OS novas ao fim da aba OS + RELATORIO novo
+        print("[6/6] Salvando planilha...")
+        if eh_base(fonte):
+            salvar_base(fonte, novos, rel_final, abas['RELATORIO'])
+        else:
+            salvar_planilha(DATA_FILE, novos, rel_final)
+        atualizar_indice(fonte, chaves_base, novos)
+        log(f"OS salva: {total_base + qtd_novas} linhas (base anterior: {total_base})")
+        final = f"{total_base + qtd_novas} linhas"
     else:
-        print("[5/6] Nada para salvar.")
-        print("[6/6] RELATORIO não precisa de recálculo.")
+        print("[5/6] RELATORIO não precisa de recálculo.")
+        print("[6/6] Nada para salvar.")
+        final = "sem alterações"
 
     # Relatório final
     print(f"\n{'='*60}")
     print(f"  INTEGRAÇÃO CONCLUÍDA")
     print(f"  OS novas integradas: {qtd_novas}")
-    print(f"  Base final: {len(df_integrado)} linhas")
+    print(f"  Base final: {final}")
     print(f"{'='*60}\n")
 
 
 if __name__ == '__main__':
-    main()
+    # Etapas medidas vão para a página Desempenho (outro processo)
+    with execucao('atualizar_mes', arquivo=ARQUIVO_EXECUCOES):
+        main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK — classificar_local (LOCAL_EQUIPAMENTO do RELATORIO)
+
+Compara o classificador vetorizado (máscaras .str + np.select) com a
+implementação anterior (inferir_local, apply linha a linha), que fica
+aqui como referência. Antes de medir, confere a paridade em todas as
+combinações de STATUS COMODATO × ALMOXARIFADO da lista abaixo (inclusive
+vazio, NaN, None, números e minúsculas); depois, em cada tamanho, sobre
+linhas sorteadas dessas combinações.
+
+Uso:
+    python benchmarks/bench_classificar_local.py
+    python benchmarks/bench_classificar_local.py --linhas 10000 100000
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atualizar_mes import classificar_local  # noqa: E402
+
+STATUS = [
+    'Emprestado', 'Sem Uso', 'emprestado', 'EMPRESTADO', 'Devolvido', 'Emprestado (antigo)',
+    '', ' ', 'nan', np.nan, None, 0, 12.5,
+]
+ALMOXARIFADOS = [
+    'RMA X', 'rma', 'ALMOX PRINCIPAL', 'Principal', 'DISTRIBUICAO', 'conferido',
+    'Descontinuado', 'DESCONTINUADO RMA', 'TEC', 'TECNICO JOAO', '', ' ', 'None',
+    np.nan, None, 5.0, 7,
+]
+
+# Acima disso a referência demora minutos
+MAX_LINHAS_REFERENCIA = 200_000
+
+
+def inferir_local(row):
+    """Implementação anterior (linha a linha, via apply)."""
+    status = str(row.get('STATUS COMODATO', ''))
+    almox = str(row.get('ALMOXARIFADO', ''))
+
+    if 'RMA' in almox.upper():
+        return 'RMA'
+    if 'Emprestado' in status:
+        return 'INSTALADO'
+    if 'Descontinuado' in almox or 'DESCONTINUADO' in almox.upper():
+        return 'DESCONTINUADO'
+    if any(x in almox.upper() for x in ['ALMOX', 'PRINCIPAL', 'DISTRIBUIC', 'CONFERIDO']):
+        return 'EM ESTOQUE'
+    if status == 'Sem Uso':
+        return 'COM TÉCNICO'
+    return 'COM TÉCNICO'
+
+
+def referencia(df):
+    return df.apply(inferir_local, axis=1) if len(df) else pd.Series([], dtype=object)
+
+
+def vetorizado(df):
+    return classificar_local(df['STATUS COMODATO'], df['ALMOXARIFADO'])
+
+
+def combinacoes():
+    """Uma linha por par status × almoxarifado (colunas object, como no RELATORIO)."""
+    pares = list(itertools.product(STATUS, ALMOXARIFADOS))
+    return pd.DataFrame({
+        'STATUS COMODATO': pd.Series([s for s, _ in pares], dtype=object),
+        'ALMOXARIFADO': pd.Series([a for _, a in pares], dtype=object),
+    })
+
+
+def sorteadas(n, seed=0):
+    base = combinacoes()
+    rng = np.random.default_rng(seed)
+    return base.iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+
+
+def conferir(df):
+    pd.testing.assert_series_equal(
+        vetorizado(df), referencia(df), check_names=False, check_dtype=False,
+    )
+
+
+def cronometrar(func, *args, repeticoes=3):
+    """Menor tempo (s) entre as repetições."""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func(*args)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    conferir(combinacoes())
+    print(f"Paridade: {len(STATUS) * len(ALMOXARIFADOS)} combinações idênticas")
+
+    print(f"{'linhas':>9} {'vetorizado (s)':>15} {'referencia (s)':>15} {'ganho':>8}")
+    for n in args.linhas:
+        df = sorteadas(n)
+        t_vet = cronometrar(vetorizado, df)
+        if n <= MAX_LINHAS_REFERENCIA:
+            conferir(df)
+            t_ref = cronometrar(referencia, df, repeticoes=1)
+            ref_txt, ganho_txt = f"{t_ref:15.4f}", f"{t_ref / t_vet:7.0f}x"
+        else:
+            ref_txt, ganho_txt = f"{'-':>15}", f"{'-':>8}"
+        print(f"{n:>9} {t_vet:15.4f} {ref_txt} {ganho_txt}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK — recalcular_relatorio incremental × completo
+
+Sobre abas sintéticas em memória (planilha_sintetica.gerar_abas, sem
+Excel), integra um mês de OS e confere que o RELATORIO incremental (só
+os patrimônios das OS novas) é igual ao recálculo completo:
+
+- com a NOTAS como está;
+- com campos da NOTAS editados (NF, data, descrição, MAC, série) em
+  patrimônios com e sem OS nova: as colunas copiadas da NOTAS precisam
+  chegar ao RELATORIO também no modo incremental.
+
+Depois mede os dois modos em cada tamanho.
+
+Uso:
+    python benchmarks/bench_relatorio_incremental.py
+    python benchmarks/bench_relatorio_incremental.py --linhas 10000 100000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import atualizar_mes  # noqa: E402
+from planilha_sintetica import gerar_abas, gerar_os_mes  # noqa: E402
+
+
+def recalcular(*args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return atualizar_mes.recalcular_relatorio(*args)
+
+
+def preparar(n_os, seed=0):
+    """NOTAS, OS integrada, RELATORIO antes do mês e OS novas."""
+    abas = gerar_abas(n_os, seed)
+    arquivo_mes = gerar_os_mes(max(100, n_os // 24), abas['OS'], seed + 1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_novo = atualizar_mes.padronizar_colunas(arquivo_mes, abas['config'])
+        df_integrado, novos = atualizar_mes.integrar_os(df_novo, abas['OS'])
+    return abas['NOTAS'], df_integrado, abas['RELATORIO'], novos
+
+
+def editar_notas(notas, seed=2):
+    """Cópia da NOTAS com campos editados em 1% das linhas (mínimo 5)."""
+    rng = np.random.default_rng(seed)
+    editada = notas.copy()
+    linhas = rng.choice(len(notas), max(5, len(notas) // 100), replace=False)
+    editada.loc[linhas, 'Número NF'] = 999_999
+    editada.loc[linhas, 'Data NF'] = pd.Timestamp('2030-01-01')
+    editada.loc[linhas, 'Descrição'] = 'MODELO EDITADO'
+    editada.loc[linhas, 'MAC'] = 'AA:BB:CC:DD:EE:FF'
+    editada.loc[linhas, 'Nº Série'] = 'SERIE EDITADA'
+    return editada
+
+
+def conferir(notas, df_integrado, relatorio_atual, novos):
+    """Incremental igual ao completo (valores; o incremental vem como object)."""
+    incremental = recalcular(notas, df_integrado, relatorio_atual, novos['id_patrimonio'])
+    completo = recalcular(notas, df_integrado)
+    pd.testing.assert_frame_equal(
+        incremental.astype(object), completo.astype(object), check_dtype=False,
+    )
+
+
+def cronometrar(func, *args, repeticoes=3):
+    """Menor tempo (s) entre as repetições."""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func(*args)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10_000, 100_000],
+                        help='linhas de OS da base sintética')
+    args = parser.parse_args()
+
+    notas, df_integrado, relatorio, novos = preparar(3_000)
+    conferir(notas, df_integrado, relatorio, novos)
+    conferir(editar_notas(notas), df_integrado, relatorio, novos)
+    print("Paridade: incremental igual ao completo (NOTAS original e editada)")
+
+    print(f"{'OS':>9} {'novas':>7} {'completo (s)':>13} {'incremental (s)':>16}")
+    for n in args.linhas:
+        notas, df_integrado, relatorio, novos = preparar(n)
+        t_completo = cronometrar(recalcular, notas, df_integrado)
+        t_incremental = cronometrar(
+            recalcular, notas, df_integrado, relatorio, novos['id_patrimonio'],
+        )
+        print(f"{n:>9} {len(novos):>7} {t_completo:13.4f} {t_incremental:16.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK — gerar_resumo_nf (Visão Geral)
+
+Compara a agregação vetorizada com a implementação anterior (iterrows +
+filtros booleanos por par NF×modelo) variando o número de NFs.
+
+Uso:
+    python benchmarks/bench_resumo_nf.py
+    python benchmarks/bench_resumo_nf.py --nfs 10 100 1000 --por-nf 200
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Fora do `streamlit run` o cache avisa a cada função que não há runtime
+import streamlit.logger  # noqa: E402
+streamlit.logger.set_log_level(logging.ERROR)
+
+from Visao_Geral import gerar_resumo_nf  # noqa: E402
+
+MODELOS = ['ONT ZTE F6600P', 'ONU ZTE F670L', 'ROTEADOR ZTE H3601 MESH', 'ONU HUAWEI HG8145']
+LOCAIS = ['INSTALADO', 'EM ESTOQUE', 'RMA', 'COM TÉCNICO', 'DESCONTINUADO']
+
+# Acima disso a referência demora minutos
+MAX_PARES_REFERENCIA = 2000
+
+
+def relatorio_sintetico(n_nfs, por_nf, seed=0):
+    """RELATORIO com n_nfs notas, por_nf equipamentos cada, 1-2 modelos por NF."""
+    rng = np.random.default_rng(seed)
+    n = n_nfs * por_nf
+    nfs = np.repeat(np.arange(1, n_nfs + 1), por_nf)
+    modelo_idx = (nfs + rng.integers(0, 2, n)) % len(MODELOS)
+    datas = pd.Timestamp('2023-01-01') + pd.to_timedelta(nfs % 700, unit='D')
+    return pd.DataFrame({
+        'NF': nfs.astype(str),
+        'DATA NF': datas,
+        'PATRIMONIO': np.arange(n).astype(str),
+        'DESCRICAO': np.array(MODELOS)[modelo_idx],
+        'LOCAL_EQUIPAMENTO': rng.choice(LOCAIS, n),
+        'STATUS_EQUIPAMENTO': rng.choice(['NOVO', 'REUTILIZADO'], n, p=[0.8, 0.2]),
+    })
+
+
+def config_sintetico():
+    return pd.DataFrame({'MODELO': MODELOS, 'OBSOLETO?': ['Não', 'Não', 'Não', 'Sim']})
+
+
+def resumo_nf_referencia(relatorio, config):
+    """Implementação anterior (um filtro do RELATORIO inteiro por par NF×modelo)."""
+    obs_map = dict(zip(config['MODELO'], config['OBSOLETO?']))
+    combinacoes = relatorio[['NF', 'DESCRICAO']].drop_duplicates()
+
+    rows = []
+    for _, row in combinacoes.iterrows():
+        nf, modelo = row['NF'], row['DESCRICAO']
+        df_nf = relatorio[(relatorio['NF'] == nf) & (relatorio['DESCRICAO'] == modelo)]
+        comprados = len(df_nf)
+        ativados_novos = len(df_nf[
+            (df_nf['LOCAL_EQUIPAMENTO'] == 'INSTALADO') & (df_nf['STATUS_EQUIPAMENTO'] == 'NOVO')
+        ])
+        ativados_reutil = len(df_nf[
+            (df_nf['LOCAL_EQUIPAMENTO'] == 'INSTALADO') & (df_nf['STATUS_EQUIPAMENTO'] == 'REUTILIZADO')
+        ])
+        em_estoque = len(df_nf[df_nf['LOCAL_EQUIPAMENTO'] == 'EM ESTOQUE'])
+        em_rma = len(df_nf[df_nf['LOCAL_EQUIPAMENTO'] == 'RMA'])
+        com_tecnico = len(df_nf[df_nf['LOCAL_EQUIPAMENTO'] == 'COM TÉCNICO'])
+        rows.append({
+            'NF': nf, 'MODELO': modelo, 'DATA': df_nf['DATA NF'].min(),
+            'COMPRADOS': comprados,
+            'ATIVADOS_NOVOS': ativados_novos,
+            'TAXA_ATIVACAO': ativados_novos / comprados if comprados > 0 else 0,
+            'ATIVADOS_REUTIL': ativados_reutil,
+            'EM_ESTOQUE': em_estoque,
+            'PERC_ESTOQUE': em_estoque / comprados if comprados > 0 else 0,
+            'EM_RMA': em_rma,
+            'PERC_RMA': em_rma / comprados if comprados > 0 else 0,
+            'COM_TECNICO': com_tecnico,
+            'OBSOLETO': obs_map.get(modelo, 'Nao'),
+        })
+    df = pd.DataFrame(rows)
+    if len(df) > 0:
+        df = df.sort_values('DATA', ascending=False)
+    return df
+
+
+def cronometrar(func, *args, repeticoes=3):
+    """Menor tempo (s) entre as repetições."""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func(*args)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--nfs', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--por-nf', type=int, default=100, help='equipamentos por NF')
+    args = parser.parse_args()
+
+    config = config_sintetico()
+    # Sem cache do streamlit: mede o cálculo em si
+    vetorizado = gerar_resumo_nf.__wrapped__
+
+    print(f"{'NFs':>7} {'linhas':>9} {'pares':>7} {'vetorizado (s)':>15} {'referencia (s)':>15} {'ganho':>8}")
+    for n_nfs in args.nfs:
+        rel = relatorio_sintetico(n_nfs, args.por_nf)
+        t_vet, resumo = cronometrar(vetorizado, {'relatorio': rel, 'config': config})
+        pares = len(resumo)
+
+        if pares <= MAX_PARES_REFERENCIA:
+            t_ref, ref = cronometrar(resumo_nf_referencia, rel, config, repeticoes=1)
+            pd.testing.assert_frame_equal(
+                resumo.sort_index(), ref.sort_index(), check_dtype=False,
+            )
+            ref_txt, ganho_txt = f"{t_ref:15.4f}", f"{t_ref / t_vet:7.0f}x"
+        else:
+            ref_txt, ganho_txt = f"{'-':>15}", f"{'-':>8}"
+
+        print(f"{n_nfs:>7} {len(rel):>9} {pares:>7} {t_vet:15.4f} {ref_txt} {ganho_txt}")
+
+
+if __name__ == '__main__':
+    main()
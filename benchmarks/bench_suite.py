@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK — Suíte do carregamento, das páginas e da ingestão mensal
+
+Para cada tamanho (linhas de OS) gera uma planilha sintética realista
+(planilha_sintetica.py) e mede:
+
+- load_data (excel): construir_dataset sem cache colunar (planilha nova)
+- load_data (cache): construir_dataset com o cache colunar já gravado
+- importar_planilha e load_data (sqlite): base SQLite (armazem.py) sem cache
+- gerar_resumo_nf, calcular_ativacoes, calcular_integridade (sem cache do streamlit)
+- recalcular_relatorio completo e incremental (OS do mês já integrada)
+- atualizar_mes: execução completa do script sobre uma cópia da planilha
+  e, com (sqlite), sobre uma cópia da base
+
+Os resultados vão para um JSON (ambiente, commit e tempos por etapa) para
+comparar execuções ao longo do tempo; com --comparar, imprime a razão
+contra um JSON anterior.
+
+Gerar e ler o .xlsx (openpyxl) escala linearmente e domina o tempo: num
+núcleo, ~1 min para gerar e ~1 min para ler 100k OS, e o atualizar_mes
+(leitura + regravação) ~3 min. Com 1M, contar mais de meia hora por etapa
+de Excel; use --tamanhos para rodadas rápidas.
+
+Uso:
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --tamanhos 10000 100000 --repeticoes 5
+    python benchmarks/bench_suite.py --comparar benchmarks/resultados/anterior.json
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+# Fora do `streamlit run` o cache avisa a cada função que não há runtime
+import streamlit  # noqa: E402
+import streamlit.logger  # noqa: E402
+streamlit.logger.set_log_level(logging.ERROR)
+
+import atualizar_mes  # noqa: E402
+from armazem import caminho_base, importar_planilha  # noqa: E402
+from dados import construir_dataset, get_meses_disponiveis  # noqa: E402
+from planilha import dir_cache, ler_abas  # noqa: E402
+from planilha_sintetica import gerar_planilha  # noqa: E402
+from Visao_Geral import gerar_resumo_nf  # noqa: E402
+
+TAMANHOS = [10_000, 100_000, 1_000_000]
+PASTA_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+
+
+def _carregar_pagina(relativo, nome):
+    """Importa uma página do streamlit (nome de arquivo não é identificador)."""
+    spec = importlib.util.spec_from_file_location(nome, os.path.join(RAIZ, relativo))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def cronometrar(func, *args, repeticoes=1):
+    """Tempos (s) de cada repetição e o resultado da última."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func(*args)
+        tempos.append(time.perf_counter() - inicio)
+    return tempos, resultado
+
+
+def _silencioso(func):
+    """Executa func sem o log em stdout (recalcular_relatorio, atualizar_mes)."""
+    def executar(*args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func(*args)
+    return executar
+
+
+def _rodar_atualizar_mes(planilha, arquivo_mes):
+    """atualizar_mes.main() sobre `planilha` (em vez de DATA_FILE)."""
+    data_file, argv = atualizar_mes.DATA_FILE, sys.argv
+    atualizar_mes.DATA_FILE = planilha
+    sys.argv = ['atualizar_mes.py', arquivo_mes]
+    try:
+        atualizar_mes.main()
+    finally:
+        atualizar_mes.DATA_FILE, sys.argv = data_file, argv
+
+
+def _preparar_ingestao(planilha, arquivo_mes):
+    """Entradas do recalcular_relatorio como na ingestão (passos 2-4)."""
+    abas, _ = ler_abas(planilha, nomes=['config', 'OS', 'NOTAS', 'RELATORIO'])
+    df_novo = pd.read_excel(arquivo_mes)
+    df_novo = atualizar_mes.padronizar_colunas(df_novo, abas['config'])
+    df_integrado, novos = atualizar_mes.integrar_os(df_novo, abas['OS'])
+    return abas, df_integrado, novos
+
+
+def medir_tamanho(n_os, pasta, repeticoes, paginas):
+    """Mede todas as etapas para uma planilha com n_os linhas de OS."""
+    planilha = os.path.join(pasta, f'sintetica_{n_os}.xlsx')
+    arquivo_mes = os.path.join(pasta, f'os_mes_{n_os}.xlsx')
+    medidas = []
+
+    def registrar(etapa, tempos, **extra):
+        medidas.append({
+            'n_os': n_os,
+            'etapa': etapa,
+            'segundos': min(tempos),
+            'tempos': tempos,
+            **extra,
+        })
+        print(f"{n_os:>9} {etapa:<34} {min(tempos):10.4f}s", flush=True)
+
+    tempos, linhas = cronometrar(gerar_planilha, planilha, n_os, 0, arquivo_mes)
+    registrar('gerar_planilha', tempos, linhas=linhas,
+              bytes=os.path.getsize(planilha))
+
+    # load_data: primeira leitura (Excel) e com o cache colunar
+    shutil.rmtree(dir_cache(planilha), ignore_errors=True)
+    tempos, data = cronometrar(construir_dataset, planilha)
+    registrar('load_data (excel)', tempos)
+    tempos, data = cronometrar(construir_dataset, planilha, repeticoes=repeticoes)
+    registrar('load_data (cache)', tempos)
+
+    # Base SQLite importada da planilha (leitura sem o cache colunar)
+    base = os.path.join(pasta, f'sintetica_{n_os}.sqlite')
+    tempos, _ = cronometrar(importar_planilha, planilha, base)
+    registrar('importar_planilha', tempos, bytes=os.path.getsize(base))
+    shutil.rmtree(dir_cache(base), ignore_errors=True)
+    tempos, _ = cronometrar(construir_dataset, base)
+    registrar('load_data (sqlite)', tempos)
+
+    # Páginas: funções sem o cache do streamlit (mede o cálculo)
+    tempos, _ = cronometrar(gerar_resumo_nf.__wrapped__, data, repeticoes=repeticoes)
+    registrar('gerar_resumo_nf', tempos)
+
+    mes = get_meses_disponiveis(data['os'])[-1]
+    tempos, _ = cronometrar(
+        paginas['mensal'].calcular_ativacoes, data['cubo_ativacoes'],
+        data['totais_nf_modelo'], mes, 'Todos', 'Todos', repeticoes=repeticoes,
+    )
+    registrar('calcular_ativacoes', tempos)
+
+    tempos, _ = cronometrar(
+        paginas['auditoria'].calcular_integridade.__wrapped__, data, repeticoes=repeticoes,
+    )
+    registrar('calcular_integridade', tempos)
+    del data
+
+    # recalcular_relatorio com a OS do mês já integrada
+    abas, df_integrado, novos = _silencioso(_preparar_ingestao)(planilha, arquivo_mes)
+    recalcular = _silencioso(atualizar_mes.recalcular_relatorio)
+    tempos, _ = cronometrar(recalcular, abas['NOTAS'], df_integrado, repeticoes=repeticoes)
+    registrar('recalcular_relatorio (completo)', tempos)
+    tempos, _ = cronometrar(
+        recalcular, abas['NOTAS'], df_integrado, abas['RELATORIO'],
+        novos['id_patrimonio'], repeticoes=repeticoes,
+    )
+    registrar('recalcular_relatorio (incremental)', tempos, os_novas=len(novos))
+    del abas, df_integrado, novos
+
+    # atualizar_mes completo sobre uma cópia (sem cache colunar)
+    copia = os.path.join(pasta, f'copia_{n_os}.xlsx')
+    shutil.copy(planilha, copia)
+    tempos, _ = cronometrar(_silencioso(_rodar_atualizar_mes), copia, arquivo_mes)
+    registrar('atualizar_mes', tempos)
+
+    # Mesma ingestão com a base ao lado da cópia (fonte_dados escolhe a base)
+    shutil.copy(planilha, copia)
+    shutil.copy(base, caminho_base(copia))
+    tempos, _ = cronometrar(_silencioso(_rodar_atualizar_mes), copia, arquivo_mes)
+    registrar('atualizar_mes (sqlite)', tempos)
+
+    return medidas
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ambiente():
+    """Metadados da execução (para comparar resultados entre máquinas)."""
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'openpyxl': openpyxl.__version__,
+        'streamlit': streamlit.__version__,
+    }
+
+
+def comparar(atual, anterior):
+    """Imprime a razão atual/anterior por (n_os, etapa)."""
+    base = {(m['n_os'], m['etapa']): m['segundos'] for m in anterior['resultados']}
+    print(f"\nComparação com {anterior['ambiente'].get('commit')} ({anterior['ambiente'].get('data')})")
+    print(f"{'OS':>9} {'etapa':<34} {'anterior':>10} {'atual':>10} {'razão':>7}")
+    comparadas = 0
+    for m in atual['resultados']:
+        antes = base.get((m['n_os'], m['etapa']))
+        if antes is None:
+            continue
+        comparadas += 1
+        razao = m['segundos'] / antes if antes > 0 else float('inf')
+        print(f"{m['n_os']:>9} {m['etapa']:<34} {antes:10.4f} {m['segundos']:10.4f} {razao:6.2f}x")
+    if not comparadas:
+        print("  (nenhum tamanho/etapa em comum)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS,
+                        help='linhas de OS das planilhas geradas')
+    parser.add_argument('--repeticoes', type=int, default=3,
+                        help='repetições das etapas rápidas (vale o menor tempo)')
+    parser.add_argument('--saida', help='JSON de resultados (padrão: benchmarks/resultados/<data>.json)')
+    parser.add_argument('--pasta', help='pasta das planilhas geradas (padrão: temporária, removida ao fim)')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior')
+    args = parser.parse_args()
+
+    paginas = {
+        'mensal': _carregar_pagina('pages/1_Analise_Mensal.py', 'analise_mensal'),
+        'auditoria': _carregar_pagina('pages/2_Auditoria.py', 'auditoria'),
+    }
+
+    resultado = {'ambiente': ambiente(), 'resultados': []}
+    with contextlib.ExitStack() as pilha:
+        pasta = args.pasta or pilha.enter_context(tempfile.TemporaryDirectory(prefix='bench_'))
+        os.makedirs(pasta, exist_ok=True)
+        print(f"{'OS':>9} {'etapa':<34} {'tempo':>11}")
+        for n_os in args.tamanhos:
+            resultado['resultados'].extend(medir_tamanho(n_os, pasta, args.repeticoes, paginas))
+
+    saida = args.saida or os.path.join(
+        PASTA_RESULTADOS, f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=1)
+    print(f"\nResultados: {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
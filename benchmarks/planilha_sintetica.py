@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+PLANILHA SINTÉTICA — Gerador de planilhas realistas para benchmarks
+
+Gera uma planilha no layout de NFxPRODUTO (NOTAS, OS, RELATORIO,
+CONTRATOS, config, NEGATIVADO e BASE_CRUZADA) com N linhas de OS e as
+demais abas em proporção a N, e um arquivo de OS do mês no layout de
+entrada do atualizar_mes.py.
+
+Proporções (aproximadas, a partir de N linhas de OS):
+- NOTAS/RELATORIO: N/3 patrimônios, ~250 por NF
+- CONTRATOS: patrimônios da NOTAS + 25% sem NF
+- OS: 3% sem patrimônio, 1% de IDs repetidos, 12% de patrimônios fora da NOTAS
+- BASE_CRUZADA: 5% dos contratos
+
+O RELATORIO é calculado com recalcular_relatorio (consistente com a OS).
+A escrita usa o openpyxl em modo write_only (planilha.gravar_planilha),
+com memória limitada; o tempo cresce linearmente (~1 min por 100k OS).
+
+Uso:
+    python benchmarks/planilha_sintetica.py saida.xlsx 100000
+    python benchmarks/planilha_sintetica.py saida.xlsx 100000 --mes OS_MES.xlsx
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atualizar_mes import COLUNAS_OS, recalcular_relatorio  # noqa: E402
+from planilha import gravar_planilha  # noqa: E402
+
+MODELOS = [
+    'ONT ZTE F6600P', 'ONU ZTE F670L', 'ROTEADOR ZTE H3601 MESH',
+    'ONU HUAWEI HG8145', 'ROTEADOR TP-LINK C6', 'ONU NOKIA G-1425G-A',
+]
+MODELOS_OBSOLETOS = ['ONU HUAWEI HG8145', 'ONU VELHA']
+
+# Descrição Assunto → ASSUNTO PADRONIZADO (também vira DE/PARA da config)
+ASSUNTOS = {
+    'INSTALACAO INTERNET': 'INSTALACAO',
+    'MANUTENÇÃO TÉCNICA': 'MANUTENCAO',
+    'Instalação Repetidor Wirelles': 'MESH',
+    'UPGRADE - EQUIPAMENTO': 'UPGRADE',
+    'RETIRADA ORDEM DE COLETA': 'RETIRADA COLETA',
+    'MUDANÇA DE ENDEREÇO': 'MUDANCA ENDEREÇO',
+    'Emitir Taxa': '****',
+}
+PESOS_ASSUNTO = [0.35, 0.25, 0.08, 0.07, 0.15, 0.05, 0.05]
+
+ALMOXARIFADOS = [
+    'ALMOX PRINCIPAL', 'ALMOX DISTRIBUICAO', 'CONFERIDO', 'RMA FORNECEDOR',
+    'Descontinuado', 'TECNICO JOAO', 'TECNICO MARIA', None,
+]
+STATUS_COMODATO = ['Emprestado', 'Sem Uso', 'Devolvido']
+
+INICIO_OS = pd.Timestamp('2023-01-01')
+DIAS_OS = 730
+ID_PATRIMONIO_BASE = 100_000
+
+
+def _tamanhos(n_os):
+    n_pat = max(100, n_os // 3)
+    return {
+        'patrimonios': n_pat,
+        'nfs': max(5, n_pat // 250),
+        'sem_nf': n_pat // 4,
+        'clientes': max(50, n_pat),
+    }
+
+
+def gerar_abas(n_os, seed=0):
+    """Abas sintéticas (dict {aba: DataFrame}) com n_os linhas de OS."""
+    rng = np.random.default_rng(seed)
+    t = _tamanhos(n_os)
+    n_pat = t['patrimonios']
+
+    # --- NOTAS: patrimônios comprados, agrupados por NF ---
+    pats = np.arange(ID_PATRIMONIO_BASE, ID_PATRIMONIO_BASE + n_pat)
+    nf_ids = np.arange(1000, 1000 + t['nfs'])
+    nf_modelo = np.array(MODELOS)[rng.integers(0, len(MODELOS), t['nfs'])]
+    nf_data = INICIO_OS - pd.Timedelta(days=90) + pd.to_timedelta(
+        np.sort(rng.integers(0, DIAS_OS, t['nfs'])), unit='D'
+    )
+    nf_pat = np.sort(rng.integers(0, t['nfs'], n_pat))
+    notas = pd.DataFrame({
+        'Número NF': nf_ids[nf_pat],
+        'Data NF': nf_data[nf_pat],
+        'Descrição': nf_modelo[nf_pat],
+        'Nº Série': [f'ZTEG{p:08X}' for p in pats],
+        'MAC': [f'A4:{p >> 16 & 0xFF:02X}:{p >> 8 & 0xFF:02X}:{p & 0xFF:02X}' for p in pats],
+        'id_patrimonio': pats,
+    })
+
+    # --- OS: eventos ao longo de DIAS_OS, ordem de exportação (por ID) ---
+    sem_nf = np.arange(900_000, 900_000 + t['sem_nf'])
+    pat_os = np.where(
+        rng.random(n_os) < 0.88,
+        rng.choice(pats, n_os),
+        rng.choice(sem_nf, n_os) if len(sem_nf) else rng.choice(pats, n_os),
+    ).astype('float64')
+    pat_os[rng.random(n_os) < 0.03] = np.nan
+
+    fechamento = INICIO_OS + pd.to_timedelta(
+        np.sort(rng.integers(0, DIAS_OS * 24 * 60, n_os)), unit='min'
+    )
+    ids = np.arange(1, n_os + 1)
+    repetidos = rng.random(n_os) < 0.01
+    ids[repetidos] = rng.integers(1, n_os + 1, int(repetidos.sum()))
+
+    descricao = rng.choice(list(ASSUNTOS), n_os, p=PESOS_ASSUNTO)
+    os_df = pd.DataFrame({
+        'ID _Ordem de Serviço': ids,
+        'data_abertura_OS': fechamento - pd.to_timedelta(rng.integers(1, 96, n_os), unit='h'),
+        'data_fechamento_OS': fechamento,
+        'Descrição Assunto': descricao,
+        'ID_cliente': rng.integers(1, t['clientes'], n_os),
+        'Razão': 'CLIENTE SINTETICO',
+        'Almoxarifado': rng.choice(ALMOXARIFADOS, n_os),
+        'id_produto': rng.integers(1, 40, n_os),
+        'descricao_produto': rng.choice(MODELOS, n_os),
+        'id_patrimonio': pat_os,
+        'numero_patrimonial': pat_os,
+        'numero_serie': 'S',
+        'status_comodato': rng.choice(STATUS_COMODATO, n_os, p=[0.6, 0.3, 0.1]),
+        'ASSUNTO PADRONIZADO': pd.Series(descricao).map(ASSUNTOS).to_numpy(),
+    })[COLUNAS_OS]
+
+    # --- RELATORIO: calculado como na ingestão (silencioso) ---
+    with contextlib.redirect_stdout(io.StringIO()):
+        relatorio = recalcular_relatorio(notas, os_df)
+
+    # --- CONTRATOS: parque da rede (com e sem NF) ---
+    pats_contrato = np.concatenate([pats, sem_nf])
+    n_contratos = len(pats_contrato)
+    contratos = pd.DataFrame({
+        'id_patrimonio': pats_contrato,
+        'Descrição eqpto': rng.choice(MODELOS + ['ONU VELHA'], n_contratos),
+        'status_contrato': rng.choice(['Ativo', 'Negativado', 'Cancelado'], n_contratos, p=[0.85, 0.05, 0.10]),
+        'ID_cliente': rng.integers(1, t['clientes'], n_contratos),
+    })
+
+    # --- config: obsolescência e DE/PARA de assuntos ---
+    modelos_config = MODELOS + ['ONU VELHA']
+    config = pd.concat([
+        pd.DataFrame({
+            'MODELO': modelos_config,
+            'OBSOLETO?': ['Sim' if m in MODELOS_OBSOLETOS else 'Não' for m in modelos_config],
+        }),
+        pd.DataFrame({'DE': list(ASSUNTOS), 'PARA': list(ASSUNTOS.values())}),
+    ], axis=1)
+
+    # --- NEGATIVADO e BASE_CRUZADA (sem header, primeira linha vazia) ---
+    negativado = pd.DataFrame({
+        'id_cliente': rng.choice(contratos['ID_cliente'], max(1, n_contratos // 50)),
+        'nome': 'CLIENTE SINTETICO',
+    })
+    amostra = rng.choice(n_contratos, max(2, n_contratos // 20), replace=False)
+    bc = contratos.iloc[amostra]
+    base_cruzada = pd.DataFrame({
+        0: bc['id_patrimonio'].to_numpy(),
+        1: 'S',
+        2: bc['Descrição eqpto'].to_numpy(),
+        3: bc['ID_cliente'].to_numpy(),
+        4: bc['status_contrato'].to_numpy(),
+        5: rng.choice(['online', 'offline'], len(bc)),
+        6: INICIO_OS + pd.to_timedelta(rng.integers(0, DIAS_OS, len(bc)), unit='D'),
+        7: rng.choice(['SIM', 'NÃO'], len(bc)),
+        8: rng.integers(1, 5, len(bc)),
+        9: rng.choice(['ATIVO', 'OCIOSO'], len(bc)),
+    })
+
+    return {
+        'NOTAS': notas,
+        'OS': os_df,
+        'RELATORIO': relatorio,
+        'CONTRATOS': contratos,
+        'config': config,
+        'NEGATIVADO': negativado,
+        'BASE_CRUZADA': base_cruzada,
+    }
+
+
+def gerar_os_mes(n, base_os, seed=1):
+    """OS de um mês após a base, no layout do arquivo de entrada.
+
+    10% dos IDs já existem na base (descartados pela ingestão); sem
+    ASSUNTO PADRONIZADO e com 'almox.descricao', como vem do sistema.
+    """
+    rng = np.random.default_rng(seed)
+    ids_base = base_os['ID _Ordem de Serviço'].to_numpy()
+    n_repetidos = min(n // 10, len(ids_base))
+    ids = np.concatenate([
+        rng.choice(ids_base, n_repetidos),
+        np.arange(1, n - n_repetidos + 1) + int(ids_base.max()),
+    ])
+    inicio = INICIO_OS + pd.Timedelta(days=DIAS_OS + 1)
+    fechamento = inicio + pd.to_timedelta(rng.integers(0, 29 * 24 * 60, n), unit='min')
+    pats = base_os['id_patrimonio'].dropna().to_numpy()
+    return pd.DataFrame({
+        'ID _Ordem de Serviço': ids,
+        'data_abertura_OS': fechamento - pd.Timedelta(days=1),
+        'data_fechamento_OS': fechamento,
+        'Descrição Assunto': rng.choice(list(ASSUNTOS), n, p=PESOS_ASSUNTO),
+        'ID_cliente': rng.integers(1, 10_000, n),
+        'Razão': 'CLIENTE SINTETICO',
+        'almox.descricao': rng.choice(ALMOXARIFADOS, n),
+        'id_produto': rng.integers(1, 40, n),
+        'descricao_produto': rng.choice(MODELOS, n),
+        'id_patrimonio': rng.choice(pats, n),
+        'numero_patrimonial': 1,
+        'numero_serie': 'S',
+        'status_comodato': rng.choice(STATUS_COMODATO, n),
+    })
+
+
+def gravar_xlsx(caminho, abas):
+    """Grava as abas em streaming; BASE_CRUZADA sem header e com a primeira
+    linha vazia, como na planilha real."""
+    if 'BASE_CRUZADA' in abas:
+        bc = abas['BASE_CRUZADA'].astype(object)
+        vazia = pd.DataFrame([[None] * len(bc.columns)], columns=bc.columns, dtype=object)
+        abas = {**abas, 'BASE_CRUZADA': pd.concat([vazia, bc], ignore_index=True)}
+    gravar_planilha(caminho, abas)
+
+
+def gerar_planilha(caminho, n_os, seed=0, caminho_mes=None, n_mes=None):
+    """Gera a planilha base (e, opcionalmente, o arquivo de OS do mês).
+
+    Retorna {aba: linhas} da planilha gerada.
+    """
+    abas = gerar_abas(n_os, seed)
+    gravar_xlsx(caminho, abas)
+    if caminho_mes:
+        n_mes = n_mes or max(100, n_os // 24)
+        gravar_xlsx(caminho_mes, {'OS': gerar_os_mes(n_mes, abas['OS'], seed + 1)})
+    return {nome: len(df) for nome, df in abas.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('saida', help='planilha .xlsx a gerar')
+    parser.add_argument('n_os', type=int, help='linhas na aba OS')
+    parser.add_argument('--mes', help='também gera um arquivo de OS do mês')
+    parser.add_argument('--n-mes', type=int, help='linhas do arquivo do mês (padrão: n_os/24)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    linhas = gerar_planilha(args.saida, args.n_os, args.seed, args.mes, args.n_mes)
+    for nome, n in linhas.items():
+        print(f"{nome:>13}: {n:>9} linhas")
+
+
+if __name__ == '__main__':
+    main()
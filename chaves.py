@@ -0,0 +1,87 @@
+"""
+CHAVES DE ID — normalização única de patrimônio, NF e cliente
+
+Os IDs chegam da planilha como número (float quando a coluna tem vazios),
+texto ou misturados ('123', 123, 123.0, '123.0'). Duas visões:
+
+- chave_id: int64 para joins, isin e diferenças de conjunto
+- texto_id: string limpa, só para exibição e busca digitada
+
+Usado pela dashboard (dados.py) e pela ingestão (atualizar_mes.py); não
+depende de streamlit.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Chave de ID vazio (NaN, None, '', 'nan'); nunca casa em joins
+SEM_CHAVE = -1
+
+_VAZIOS = ['', 'nan', 'None', 'NaN', '<NA>']
+
+
+def texto_id(valores):
+    """ID como texto: sem espaços, sem '\\,' e sem o sufixo '.0' de float.
+
+    Aceita Series ou valor único (texto digitado na busca).
+    """
+    if isinstance(valores, pd.Series):
+        return (
+            valores.astype(str).str.strip()
+            .str.replace(r'\\,', '', regex=True)
+            .str.replace(r'\.0$', '', regex=True)
+        )
+    texto = str(valores).strip().replace('\\,', '')
+    return re.sub(r'\.0$', '', texto)
+
+
+def chave_id(valores):
+    """ID como chave int64 (Series alinhada à entrada).
+
+    - inteiros (ou floats inteiros, ou texto numérico): o próprio número
+    - vazios: SEM_CHAVE
+    - texto não numérico: hash estável do texto normalizado, sempre
+      negativo e diferente de SEM_CHAVE (o mesmo texto dá a mesma chave
+      em qualquer aba)
+
+    Colunas numéricas não passam por string.
+    """
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(valores, dtype=object)
+
+    if pd.api.types.is_integer_dtype(serie.dtype) and not serie.hasnans:
+        return serie.astype(np.int64)
+
+    chaves = np.full(len(serie), SEM_CHAVE, dtype=np.int64)
+    if pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype):
+        numeros = serie.astype('float64').to_numpy()
+        restantes = None
+    else:
+        texto = texto_id(serie)
+        vazio = serie.isna().to_numpy() | texto.isin(_VAZIOS).to_numpy()
+        numeros = pd.to_numeric(texto, errors='coerce').to_numpy(dtype='float64')
+        restantes = texto
+
+    with np.errstate(invalid='ignore'):
+        inteiro = np.isfinite(numeros) & (numeros == np.floor(numeros)) & (np.abs(numeros) < 2 ** 63)
+    chaves[inteiro] = numeros[inteiro].astype(np.int64)
+
+    # Texto não numérico (e números não inteiros): hash do texto
+    if restantes is None:
+        outros = ~inteiro & ~np.isnan(numeros)
+        if outros.any():
+            restantes = texto_id(serie[outros])
+            chaves[outros] = _hash_negativo(restantes)
+    else:
+        outros = ~inteiro & ~vazio
+        if outros.any():
+            chaves[outros] = _hash_negativo(restantes[outros])
+
+    return pd.Series(chaves, index=serie.index)
+
+
+def _hash_negativo(texto):
+    """Hash estável (pandas) do texto em int64 negativo, abaixo de SEM_CHAVE."""
+    h = pd.util.hash_array(texto.to_numpy(dtype=object))
+    return -(h >> np.uint64(2)).astype(np.int64) - 2
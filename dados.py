@@ -11,7 +11,20 @@ Regras de fonte:
 
 import streamlit as st
 import pandas as pd
+import numpy as np
+import functools
 import os
+import threading
+import uuid
+from types import MappingProxyType
+
+import desempenho
+from chaves import SEM_CHAVE, chave_id, texto_id
+from armazem import fonte_dados, ler_dados
+
+# Copy-on-write: frames derivados (filtros, fatias, cópias rasas) nunca
+# escrevem nos buffers do Dataset compartilhado entre as sessões
+pd.set_option('mode.copy_on_write', True)
 
 # Caminho do arquivo de dados (na raiz do projeto)
 DATA_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -48,60 +61,313 @@ MAPEAMENTO_DE_PARA = {
 }
 
 
+class Dataset(dict):
+    """Dados do load_data (dict de DataFrames) com um token de versão.
+
+    O token muda a cada carga da planilha. Funções @st.cache_data que
+    recebem o Dataset declaram hash_funcs=HASH_DATASET: a chave de cache
+    é o token (custo O(1)), não o conteúdo dos DataFrames.
+
+    Somente leitura: uma instância é compartilhada por todas as sessões
+    (st.cache_resource). Não aceita atribuição de chaves; [], get, items
+    e values devolvem DataFrames e Series como cópias rasas: adicionar
+    colunas não afeta as outras sessões e, com copy-on-write, alterar
+    valores copia só a coluna alterada. Dicts aninhados (cubo_ativacoes,
+    indice_busca, obs_map, _limpeza...) viram MappingProxyType, sem
+    atribuição; os DataFrames e arrays dentro deles não são copiados e
+    não devem ser alterados no lugar.
+    """
+
+    def __init__(self, dados, versao):
+        super().__init__({chave: _congelar(valor) for chave, valor in dados.items()})
+        self.versao = versao
+
+    def __getitem__(self, chave):
+        return _copia_rasa(super().__getitem__(chave))
+
+    def get(self, chave, padrao=None):
+        return _copia_rasa(super().get(chave, padrao))
+
+    def values(self):
+        return [_copia_rasa(valor) for valor in super().values()]
+
+    def items(self):
+        return [(chave, _copia_rasa(valor)) for chave, valor in super().items()]
+
+    def _somente_leitura(self, *args, **kwargs):
+        raise TypeError("Dataset é somente leitura (compartilhado entre sessões)")
+
+    __setitem__ = __delitem__ = _somente_leitura
+    update = pop = popitem = clear = setdefault = _somente_leitura
+
+    def __reduce__(self):
+        dados = {chave: _descongelar(valor) for chave, valor in dict.items(self)}
+        return (Dataset, (dados, self.versao))
+
+
+def _congelar(valor):
+    """Dicts (e os dicts dentro deles) como MappingProxyType, sem copiar."""
+    if not isinstance(valor, dict):
+        return valor
+    for chave, item in valor.items():
+        if isinstance(item, dict):
+            valor[chave] = _congelar(item)
+    return MappingProxyType(valor)
+
+
+def _descongelar(valor):
+    """Inverso de _congelar, para serializar (MappingProxyType não é picklable)."""
+    if isinstance(valor, MappingProxyType):
+        return {chave: _descongelar(item) for chave, item in valor.items()}
+    return valor
+
+
+def _copia_rasa(valor):
+    """Cópia rasa (sem copiar dados) de DataFrame/Series; demais valores como estão."""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return valor.copy(deep=False)
+    return valor
+
+
+# Para @st.cache_data(hash_funcs=HASH_DATASET)
+HASH_DATASET = {Dataset: lambda dataset: dataset.versao}
+
+
+def versao_dataset(data, *args, **kwargs):
+    """Versão do Dataset (primeiro argumento), para cache_medido(versao=...).
+
+    Com ela, a troca de versão limpa o cache da função e as entradas da
+    versão anterior não seguram os frames dela na memória.
+    """
+    return data.versao
+
+
+def _versao_planilha(caminho):
+    """Token da carga: mtime da planilha + sufixo aleatório (única por carga)."""
+    return f"{os.stat(caminho).st_mtime_ns:x}-{uuid.uuid4().hex[:8]}"
+
+
+# A página Desempenho (pages/9_Desempenho.py) fica fora do menu lateral;
+# acesso pela URL /Desempenho
+_CSS_OCULTAR_DESEMPENHO = """
+<style>
+[data-testid="stSidebarNav"] li:has(a[href$="/Desempenho"]) { display: none; }
+</style>
+"""
+
+
+def pagina_instrumentada(nome):
+    """Decorator do main() das páginas: mede o rerun como uma execução.
+
+    As chamadas medidas durante o rerun (load_data e cálculos em cache)
+    ficam agrupadas sob `nome` na página Desempenho, que também é
+    escondida do menu aqui.
+    """
+    def decorar(main):
+        @functools.wraps(main)
+        def executar():
+            st.markdown(_CSS_OCULTAR_DESEMPENHO, unsafe_allow_html=True)
+            with desempenho.execucao(nome):
+                return main()
+        return executar
+    return decorar
+
+
 def fmt(numero):
     """Formata número inteiro com ponto como separador de milhares"""
     return f"{int(numero):,}".replace(",", ".")
 
 
-@st.cache_data
+@desempenho.medido()
 def load_data():
-    """Carrega e processa todos os dados da planilha Excel.
+    """Dataset atual da planilha (dict com DataFrames prontos + token de versão).
 
-    Retorna dict com DataFrames prontos para uso.
+    Uma única instância por processo, mantida pelo Recarregador: as
+    sessões leem o mesmo Dataset, sem desserializar cópias a cada rerun.
+    Quando a planilha muda, a versão nova é montada em segundo plano e
+    trocada quando fica pronta; até lá as sessões recebem a anterior.
     Inclui validações e mensagens de erro claras.
     """
-    if not os.path.exists(DATA_FILE):
-        st.error(f"Arquivo de dados não encontrado: {DATA_FILE}")
+    fonte = fonte_dados(DATA_FILE)
+    if not os.path.exists(fonte):
+        st.error(f"Arquivo de dados não encontrado: {fonte}")
         st.stop()
 
+    recarregador = _recarregador(fonte)
+    if recarregador.parado:  # vigia parado pela troca de fonte: cria outro
+        _recarregador.clear(fonte)
+        recarregador = _recarregador(fonte)
+    desempenho.marcar_cache(hit=recarregador.carregado)
     try:
-        # --- Carregar abas ---
-        notas = pd.read_excel(DATA_FILE, sheet_name='NOTAS')
-        os_df = pd.read_excel(DATA_FILE, sheet_name='OS')
-        relatorio = pd.read_excel(DATA_FILE, sheet_name='RELATORIO')
-        contratos = pd.read_excel(DATA_FILE, sheet_name='CONTRATOS')
-        config = pd.read_excel(DATA_FILE, sheet_name='config')
-
-        # Abas opcionais (podem não existir ou estar vazias)
-        try:
-            obsoletos = pd.read_excel(DATA_FILE, sheet_name='OBSOLETOS')
-        except Exception:
-            obsoletos = pd.DataFrame()
+        dataset = recarregador.atual()
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
 
-        try:
-            reaproveitados = pd.read_excel(DATA_FILE, sheet_name='REAPROVEITADOS')
-        except Exception:
-            reaproveitados = pd.DataFrame()
+    if recarregador.erro:
+        st.warning(
+            f"A planilha mudou, mas a nova versão não pôde ser carregada "
+            f"({recarregador.erro}). Exibindo a versão anterior."
+        )
+    return dataset
 
-        try:
-            negativado = pd.read_excel(DATA_FILE, sheet_name='NEGATIVADO')
-        except Exception:
-            negativado = pd.DataFrame()
 
+# Intervalo (s) entre verificações da planilha pelo Recarregador
+INTERVALO_VERIFICACAO = 5.0
+
+
+class Recarregador:
+    """Mantém o Dataset atual e recarrega quando a planilha muda.
+
+    Uma thread de fundo compara (tamanho, mtime) do arquivo a cada
+    INTERVALO_VERIFICACAO segundos. Quando mudam e ficam estáveis por uma
+    verificação (arquivo terminou de ser gravado), monta o Dataset novo
+    na própria thread e troca a referência de forma atômica. Enquanto
+    isso, atual() continua devolvendo a versão anterior (stale-while-
+    revalidate). Falha na recarga mantém a versão anterior e fica em
+    `erro` até a próxima carga bem-sucedida.
+
+    parar() encerra a thread (evento de parada): chamado quando o recurso
+    é substituído, para não ficarem vigias antigos reconstruindo Datasets.
+    """
+
+    def __init__(self, caminho, construir, intervalo=INTERVALO_VERIFICACAO):
+        self.caminho = caminho
+        self.erro = None
+        self._construir = construir
+        self._intervalo = intervalo
+        self._lock = threading.Lock()
+        self._atual = None
+        self._assinatura = None
+        self._thread = None
+        self._parar = threading.Event()
+
+    @property
+    def carregado(self):
+        """True depois da primeira carga (atual() não bloqueia mais)."""
+        return self._atual is not None
+
+    @property
+    def parado(self):
+        """True depois de parar(): a thread não vigia mais a fonte."""
+        return self._parar.is_set()
+
+    def parar(self):
+        """Encerra a thread de vigia (na próxima verificação ou recarga)."""
+        self._parar.set()
+
+    def atual(self):
+        """Dataset atual; a primeira chamada carrega de forma síncrona."""
+        if self._atual is None:
+            with self._lock:
+                if self._atual is None:
+                    assinatura = _assinatura_rapida(self.caminho)
+                    self._atual = self._construir(self.caminho)
+                    self._assinatura = assinatura
+            self._iniciar()
+        return self._atual
+
+    def _iniciar(self):
+        if self._thread is None and not self.parado:
+            self._thread = threading.Thread(
+                target=self._vigiar, name='recarregador-planilha', daemon=True
+            )
+            self._thread.start()
+
+    def _vigiar(self):
+        anterior = None
+        while not self._parar.wait(self._intervalo):
+            try:
+                assinatura = _assinatura_rapida(self.caminho)
+            except OSError:
+                continue  # arquivo sendo substituído
+            if assinatura == self._assinatura:
+                anterior = None
+                continue
+            if assinatura != anterior:
+                anterior = assinatura  # esperar ficar estável
+                continue
+            self._recarregar(assinatura)
+            anterior = None
+
+    def _recarregar(self, assinatura):
         try:
-            base_cruzada_raw = pd.read_excel(DATA_FILE, sheet_name='BASE_CRUZADA', header=None)
-            base_cruzada = _processar_base_cruzada(base_cruzada_raw)
-        except Exception:
-            base_cruzada = pd.DataFrame()
+            novo = self._construir(self.caminho)
+        except Exception as e:  # planilha inválida: segue com a versão anterior
+            self.erro = str(e)
+            self._assinatura = assinatura
+            return
+        if self.parado:  # substituído durante a carga: descarta
+            return
+        with self._lock:
+            self._atual = novo
+            self._assinatura = assinatura
+            self.erro = None
+
+
+def _assinatura_rapida(caminho):
+    """(tamanho, mtime) do arquivo: barato, verificado a cada intervalo."""
+    estado = os.stat(caminho)
+    return estado.st_size, estado.st_mtime_ns
+
+
+# Vigias ativos no processo, por fonte (no máximo um: a fonte atual)
+_vigias = {}
+_vigias_lock = threading.Lock()
+
+
+def _registrar_vigia(recarregador):
+    """Registra o vigia novo e para os anteriores.
+
+    Cobre o mesmo caminho (cache limpo) e a troca de fonte (planilha ↔
+    base SQLite): só a fonte atual continua sendo vigiada.
+    """
+    with _vigias_lock:
+        for antigo in _vigias.values():
+            antigo.parar()
+        _vigias.clear()
+        _vigias[recarregador.caminho] = recarregador
+    return recarregador
+
+
+@st.cache_resource(on_release=Recarregador.parar)
+def _recarregador(caminho):
+    """Um Recarregador por processo e fonte (compartilhado pelas sessões).
+
+    Ao sair do cache (Clear cache, recurso substituído), a thread é parada.
+    """
+    return _registrar_vigia(Recarregador(caminho, construir_dataset))
+
+
+@desempenho.medido()
+def construir_dataset(caminho):
+    """Lê e processa a planilha; devolve um Dataset novo.
+
+    Sem chamadas ao streamlit (roda também na thread do Recarregador):
+    problemas na planilha viram ValueError com mensagem para o usuário.
+    """
+    try:
+        # --- Carregar abas (cache colunar; Excel só quando a planilha muda) ---
+        abas, _leitura = ler_dados(caminho)
+        notas = abas['NOTAS']
+        os_df = abas['OS']
+        relatorio = abas['RELATORIO']
+        contratos = abas['CONTRATOS']
+        config = abas['config']
+
+        # Abas opcionais (vazias quando não existem na planilha)
+        obsoletos = abas['OBSOLETOS']
+        reaproveitados = abas['REAPROVEITADOS']
+        negativado = abas['NEGATIVADO']
+        retirada = abas['RETIRADA']
 
         try:
-            retirada = pd.read_excel(DATA_FILE, sheet_name='RETIRADA')
+            base_cruzada = _processar_base_cruzada(abas['BASE_CRUZADA'])
         except Exception:
-            retirada = pd.DataFrame()
+            base_cruzada = pd.DataFrame()
 
     except Exception as e:
-        st.error(f"Erro ao carregar planilha: {e}")
-        st.stop()
+        raise ValueError(f"Erro ao carregar planilha: {e}") from e
 
     # --- Validações de colunas obrigatórias ---
     _validar_colunas(os_df, 'OS', [
@@ -119,14 +385,12 @@ def load_data():
     os_df['data_abertura_OS'] = pd.to_datetime(os_df['data_abertura_OS'], errors='coerce')
     os_df['data_fechamento_OS'] = pd.to_datetime(os_df['data_fechamento_OS'], errors='coerce')
 
-    # --- Normalizar IDs para string ---
+    # --- Normalizar IDs: chave int64 (PAT_ID) para cruzamentos, texto para exibição ---
+    if 'PATRIMONIO' in relatorio.columns:
+        relatorio['PAT_ID'] = chave_id(relatorio['PATRIMONIO'])
     for c in ['NF', 'PATRIMONIO', 'PRODUTO ID']:
         if c in relatorio.columns:
-            relatorio[c] = (
-                relatorio[c].astype(str).fillna('')
-                .str.replace(r'\\,', '', regex=True)
-                .str.replace(r'\.0$', '', regex=True)
-            )
+            relatorio[c] = texto_id(relatorio[c])
 
     # Limpar OS sem patrimônio (guardar contagem antes de remover)
     _os_total_bruto = len(os_df)
@@ -134,11 +398,8 @@ def load_data():
     if 'id_patrimonio' in os_df.columns:
         _os_sem_patrimonio = int(os_df['id_patrimonio'].isna().sum())
         os_df = os_df.dropna(subset=['id_patrimonio'])
-        os_df['id_patrimonio'] = (
-            os_df['id_patrimonio'].astype(str)
-            .str.replace(r'\\,', '', regex=True)
-            .str.replace(r'\.0$', '', regex=True)
-        )
+        os_df['PAT_ID'] = chave_id(os_df['id_patrimonio'])
+        os_df['id_patrimonio'] = texto_id(os_df['id_patrimonio'])
 
     # Remover OS duplicadas (mesmo ID de OS, manter primeira ocorrência)
     _os_duplicadas = int(os_df.duplicated(subset=['ID _Ordem de Serviço'], keep='first').sum())
@@ -151,20 +412,32 @@ def load_data():
 
     # --- Calcular CICLO na aba OS ---
     # CICLO = contagem cumulativa de OS por patrimônio (ordem cronológica)
-    os_df = os_df.sort_values(['id_patrimonio', 'data_fechamento_OS'])
-    os_df['CICLO'] = os_df.groupby('id_patrimonio').cumcount() + 1
+    os_df = os_df.sort_values(['PAT_ID', 'data_fechamento_OS'])
+    os_df['CICLO'] = os_df.groupby('PAT_ID').cumcount() + 1
 
     # --- STATUS_EQUIPAMENTO no RELATORIO (baseado no último CICLO) ---
     if 'PATRIMONIO' in relatorio.columns and 'id_patrimonio' in os_df.columns:
-        ultimo_ciclo = os_df.groupby('id_patrimonio')['CICLO'].last().reset_index()
-        ultimo_ciclo.columns = ['PATRIMONIO', 'ULTIMO_CICLO']
-        relatorio = relatorio.merge(ultimo_ciclo, on='PATRIMONIO', how='left')
+        ultimo_ciclo = os_df.groupby('PAT_ID')['CICLO'].last()
+        ultimo_ciclo = ultimo_ciclo.drop(SEM_CHAVE, errors='ignore').rename('ULTIMO_CICLO')
+        relatorio = relatorio.merge(ultimo_ciclo, left_on='PAT_ID', right_index=True, how='left')
         relatorio['STATUS_EQUIPAMENTO'] = relatorio['ULTIMO_CICLO'].apply(
             lambda x: 'REUTILIZADO' if pd.notna(x) and x > 1 else 'NOVO'
         )
     else:
         relatorio['STATUS_EQUIPAMENTO'] = 'NOVO'
 
+    # --- Índice temporal: OS ordenada por data de fechamento ---
+    # (depois do CICLO/ULTIMO_CICLO, que dependem da ordem por patrimônio)
+    os_df = ordenar_por_fechamento(os_df)
+    # Ordem conferida uma vez por versão; get_os_periodo recebe o resultado
+    _os_ordenada = _em_ordem_de_fechamento(os_df['data_fechamento_OS'].to_numpy())
+
+    # Total comprado por NF+modelo (denominador das taxas de ativação)
+    totais_nf_modelo = calcular_totais_nf_modelo(relatorio)
+
+    # Cubo de ativações por mês (consultas da Análise Mensal sem varrer a OS)
+    cubo_ativacoes = montar_cubo_ativacoes(os_df, relatorio)
+
     # --- Mapeamento de obsolescência ---
     obs_map = dict(zip(config['MODELO'], config['OBSOLETO?']))
 
@@ -180,10 +453,8 @@ def load_data():
     # Aplicar em CONTRATOS
     if 'Descrição eqpto' in contratos.columns:
         contratos['OBSOLETO'] = contratos['Descrição eqpto'].map(obs_map).fillna('Não')
-        contratos['id_patrimonio_str'] = (
-            contratos['id_patrimonio'].astype(str)
-            .str.replace(r'\.0$', '', regex=True)
-        )
+        contratos['PAT_ID'] = chave_id(contratos['id_patrimonio'])
+        contratos['id_patrimonio_str'] = texto_id(contratos['id_patrimonio'])
 
     # Aplicar em BASE_CRUZADA
     if not base_cruzada.empty and 'modelo' in base_cruzada.columns:
@@ -199,10 +470,26 @@ def load_data():
     # Mapeamento DE→PARA para padronização de assuntos
     assunto_map = dict(zip(config['DE'].dropna(), config['PARA'].dropna()))
 
-    return {
+    # Índice de busca da Auditoria (patrimônio / NF / cliente → linhas)
+    indice_busca = montar_indice_busca(
+        relatorio, os_df, contratos, base_cruzada, notas, negativado
+    )
+
+    # Dimensões de baixa cardinalidade como category (memória e filtros ==)
+    _memoria = {}
+    for nome, df in [('NOTAS', notas), ('OS', os_df), ('RELATORIO', relatorio),
+                     ('CONTRATOS', contratos), ('config', config),
+                     ('OBSOLETOS', obsoletos), ('REAPROVEITADOS', reaproveitados),
+                     ('NEGATIVADO', negativado), ('BASE_CRUZADA', base_cruzada),
+                     ('RETIRADA', retirada)]:
+        _memoria[nome] = converter_categoricas(df, COLUNAS_CATEGORICAS.get(nome, []))
+
+    return Dataset({
         'notas': notas,
         'os': os_df,
         'relatorio': relatorio,
+        'totais_nf_modelo': totais_nf_modelo,
+        'cubo_ativacoes': cubo_ativacoes,
         'contratos': contratos,
         'config': config,
         'obsoletos': obsoletos,
@@ -212,13 +499,50 @@ def load_data():
         'retirada': retirada,
         'obs_map': obs_map,
         'assunto_map': assunto_map,
+        'indice_busca': indice_busca,
         # Metadados de limpeza (para Auditoria)
         '_limpeza': {
             'os_total_bruto': _os_total_bruto,
             'os_sem_patrimonio': _os_sem_patrimonio,
             'os_duplicadas': _os_duplicadas,
         },
-    }
+        # OS em ordem de fechamento, conferida na carga (busca binária)
+        '_os_ordenada': _os_ordenada,
+        # Tempos de leitura por aba (origem: cache colunar ou Excel)
+        '_leitura': _leitura,
+        # Memória por aba (bytes) antes/depois da conversão para category
+        '_memoria': _memoria,
+    }, versao=_versao_planilha(caminho))
+
+
+# Colunas de baixa cardinalidade convertidas para category no load_data,
+# por aba. Categorias = valores distintos ordenados (mesma ordem a cada carga).
+COLUNAS_CATEGORICAS = {
+    'OS': ['ASSUNTO PADRONIZADO', 'descricao_produto', 'Almoxarifado'],
+    'RELATORIO': ['DESCRICAO', 'LOCAL_EQUIPAMENTO', 'STATUS_EQUIPAMENTO'],
+    'CONTRATOS': ['status_contrato', 'OBSOLETO'],
+    'BASE_CRUZADA': ['status_contrato', 'OBSOLETO'],
+}
+
+
+def converter_categoricas(df, colunas):
+    """Converte as colunas (as que existirem) para category, no lugar.
+
+    Returns:
+        dict {'antes': bytes, 'depois': bytes} com a memória do DataFrame
+    """
+    colunas = [c for c in colunas if c in df.columns and df[c].dtype == object]
+    antes = int(df.memory_usage(deep=True).sum())
+    if not colunas:
+        return {'antes': antes, 'depois': antes}
+
+    # Só as colunas convertidas mudam: mede só elas depois da conversão
+    antes_cols = int(df[colunas].memory_usage(deep=True, index=False).sum())
+    for c in colunas:
+        df[c] = df[c].astype('category')
+    depois_cols = int(df[colunas].memory_usage(deep=True, index=False).sum())
+
+    return {'antes': antes, 'depois': antes - antes_cols + depois_cols}
 
 
 def _processar_base_cruzada(raw_df):
@@ -235,48 +559,106 @@ def _processar_base_cruzada(raw_df):
     # Remover primeira linha (NaN)
     df = df.iloc[1:].reset_index(drop=True)
     df['data_mov'] = pd.to_datetime(df['data_mov'], errors='coerce')
-    df['id_patrimonio_str'] = (
-        df['id_patrimonio'].astype(str)
-        .str.replace(r'\.0$', '', regex=True)
-    )
+    df['PAT_ID'] = chave_id(df['id_patrimonio'])
+    df['id_patrimonio_str'] = texto_id(df['id_patrimonio'])
     return df
 
 
+def calcular_totais_nf_modelo(relatorio):
+    """Quantidade de equipamentos comprados por (NF, DESCRICAO) no RELATORIO.
+
+    Series indexada por (NF, DESCRICAO), calculada uma vez no load_data.
+    Os filtros de modelo/NF das páginas só removem pares inteiros, então
+    o total de um par é o mesmo no RELATORIO filtrado.
+    """
+    return (
+        relatorio.groupby(['NF', 'DESCRICAO']).size()
+        .rename('Comprados (Total NF)')
+    )
+
+
 def _validar_colunas(df, nome_aba, colunas_obrigatorias):
-    """Valida se as colunas obrigatórias existem no DataFrame."""
+    """Valida se as colunas obrigatórias existem no DataFrame (ValueError se não)."""
     faltando = [c for c in colunas_obrigatorias if c not in df.columns]
     if faltando:
-        st.error(
+        raise ValueError(
             f"Aba '{nome_aba}' com colunas faltando: {', '.join(faltando)}. "
-            f"Colunas encontradas: {', '.join(df.columns)}"
+            f"Colunas encontradas: {', '.join(map(str, df.columns))}"
         )
-        st.stop()
 
 
 # --- Funções auxiliares para análise por período ---
 
-def get_os_periodo(os_df, data_inicio, data_fim):
-    """Filtra OS pelo período de fechamento."""
+def ordenar_por_fechamento(os_df):
+    """Ordena a OS por data_fechamento_OS (estável, NaT no fim).
+
+    Subconjuntos filtrados (máscaras, isin) preservam a ordem, e
+    get_os_periodo passa a usar busca binária sobre eles.
+    """
+    return os_df.sort_values('data_fechamento_OS', kind='stable', na_position='last')
+
+
+def _em_ordem_de_fechamento(datas):
+    """True se as datas (datetime64) estão em ordem crescente, NaT só no fim.
+
+    A ordem é conferida nos próprios dados (uma passada vetorizada, O(n)),
+    não em marcas como attrs: pandas copia attrs em sort_values, concat e
+    fatias, então a marca sobrevive a reordenações. Chamada uma vez por
+    versão do Dataset (construir_dataset → '_os_ordenada'), não por consulta.
+    """
+    if not np.issubdtype(datas.dtype, np.datetime64):
+        return False
+    validas = ~np.isnat(datas)
+    n = int(validas.sum())
+    if not validas[:n].all():
+        return False
+    return n < 2 or bool((datas[1:n] >= datas[:n - 1]).all())
+
+
+def get_os_periodo(os_df, data_inicio, data_fim, ordenada=False):
+    """Filtra OS pelo período de fechamento.
+
+    ordenada=True (OS do Dataset com data['_os_ordenada'], ou um filtro
+    por máscara dela, que preserva a ordem): as bordas do período saem de
+    busca binária, O(log n), e o retorno é uma fatia sem cópia. A ordem
+    não é conferida aqui. Sem a garantia, usa máscara booleana sobre todas
+    as linhas.
+    """
+    data_inicio = pd.to_datetime(data_inicio)
+    data_fim = pd.to_datetime(data_fim)
+
+    datas = os_df['data_fechamento_OS'].to_numpy()
+    if ordenada:
+        # NaT fica no fim da ordenação e também no fim da busca do numpy
+        ini = datas.searchsorted(data_inicio.to_datetime64(), side='left')
+        fim = datas.searchsorted(data_fim.to_datetime64(), side='right')
+        return os_df.iloc[ini:fim]
+
     return os_df[
-        (os_df['data_fechamento_OS'] >= pd.to_datetime(data_inicio)) &
-        (os_df['data_fechamento_OS'] <= pd.to_datetime(data_fim))
+        (os_df['data_fechamento_OS'] >= data_inicio) &
+        (os_df['data_fechamento_OS'] <= data_fim)
     ]
 
 
 def enriquecer_com_relatorio(patrimonios_series, relatorio):
     """Cruza lista de patrimônios com RELATORIO para obter NF, modelo, data NF.
 
+    Usa a chave PAT_ID já calculada no load_data: um isin vetorizado sobre
+    int64, sem copiar o RELATORIO nem montar chaves de texto por chamada.
+    Com a Series PAT_ID da OS a entrada já é a chave (sem conversão).
+
     Args:
-        patrimonios_series: Series ou set de id_patrimonio (str)
+        patrimonios_series: Series ou set de id_patrimonio (texto, número ou PAT_ID)
         relatorio: DataFrame do RELATORIO
 
     Returns:
-        DataFrame com colunas do RELATORIO filtrado pelos patrimônios
+        DataFrame com as linhas do RELATORIO desses patrimônios
+        (não alterar no lugar: compartilha os dados com o cache)
     """
-    pat_set = set(str(p) for p in patrimonios_series if pd.notna(p))
-    rel = relatorio.copy()
-    rel['PAT_STR'] = rel['PATRIMONIO'].astype(str).str.replace('.0', '', regex=False)
-    return rel[rel['PAT_STR'].isin(pat_set)]
+    if not isinstance(patrimonios_series, pd.Series):
+        patrimonios_series = pd.Series(list(patrimonios_series), dtype=object)
+    chaves = chave_id(patrimonios_series).to_numpy()
+    return relatorio[relatorio['PAT_ID'].isin(chaves[chaves != SEM_CHAVE])]
 
 
 def get_meses_disponiveis(os_df):
@@ -293,3 +675,218 @@ def periodo_do_mes(mes_period):
     data_inicio = mes_period.start_time
     data_fim = mes_period.end_time
     return data_inicio, data_fim
+
+
+# --- Cubo de ativações (instalações por mês × NF × modelo × classe de CICLO) ---
+
+def montar_cubo_ativacoes(os_df, relatorio):
+    """Materializa as ativações do RELATORIO por mês, uma vez no load_data.
+
+    Ativação = equipamento do RELATORIO com OS de instalação (INSTALAC*)
+    fechada no mês, contado uma vez por mês. Duas medidas:
+      - ATIVADOS: qualquer OS de instalação
+      - ATIVADOS_MODELO: só OS cujo descricao_produto é o modelo da NF
+        (equivale ao filtro de modelo aplicado também na OS)
+
+    Retorna dict:
+      - 'mensal': DataFrame indexado por (MES, NF, DESCRICAO, CLASSE_CICLO)
+        com as contagens e a menor DATA NF; CLASSE_CICLO vem da primeira
+        OS de instalação do mês (NOVO se CICLO == 1)
+      - 'acumulado': dict {medida: DataFrame MES × (NF, DESCRICAO)} com a
+        soma corrida das primeiras ativações (e o mínimo corrido da DATA NF)
+    """
+    inst = os_df[
+        os_df['ASSUNTO PADRONIZADO'].str.contains('INSTALAC', case=False, na=False)
+        & os_df['data_fechamento_OS'].notna()
+    ]
+    eventos = pd.DataFrame({
+        'PAT_ID': inst['PAT_ID'],
+        'MES': inst['data_fechamento_OS'].dt.to_period('M'),
+        'CICLO': inst['CICLO'],
+        'PRODUTO_OS': inst['descricao_produto'] if 'descricao_produto' in inst.columns else None,
+    })
+
+    # Uma linha do RELATORIO por equipamento/NF (mesma chave de enriquecer_com_relatorio)
+    rel = pd.DataFrame({
+        'LINHA': np.arange(len(relatorio)),
+        'PAT_ID': relatorio['PAT_ID'].to_numpy(),
+        'NF': relatorio['NF'].to_numpy(),
+        'DESCRICAO': relatorio['DESCRICAO'].to_numpy(),
+        'DATA NF': relatorio['DATA NF'].to_numpy(),
+    })
+
+    ev = eventos.merge(rel[rel['PAT_ID'] != SEM_CHAVE], on='PAT_ID', how='inner')
+    ev['MESMO_MODELO'] = ev['PRODUTO_OS'] == ev['DESCRICAO']
+    ev = ev.sort_values(['LINHA', 'MES', 'CICLO'])
+
+    # Um registro por (equipamento, mês); classe da primeira instalação do mês
+    por_mes = ev.groupby(['LINHA', 'MES'], sort=False).agg(
+        NF=('NF', 'first'),
+        DESCRICAO=('DESCRICAO', 'first'),
+        DATA_NF=('DATA NF', 'first'),
+        CICLO=('CICLO', 'first'),
+        MESMO_MODELO=('MESMO_MODELO', 'any'),
+    ).reset_index()
+    por_mes['CLASSE_CICLO'] = np.where(por_mes['CICLO'] == 1, 'NOVO', 'REUTILIZADO')
+    por_mes['DATA_NF_MODELO'] = por_mes['DATA_NF'].where(por_mes['MESMO_MODELO'])
+
+    mensal = por_mes.groupby(['MES', 'NF', 'DESCRICAO', 'CLASSE_CICLO']).agg(
+        ATIVADOS=('LINHA', 'size'),
+        ATIVADOS_MODELO=('MESMO_MODELO', 'sum'),
+        DATA_NF=('DATA_NF', 'min'),
+        DATA_NF_MODELO=('DATA_NF_MODELO', 'min'),
+    )
+
+    # Acumulado: mês da primeira ativação de cada equipamento, soma corrida
+    if len(por_mes) > 0:
+        meses = pd.period_range(por_mes['MES'].min(), por_mes['MES'].max(), freq='M')
+    else:
+        meses = pd.PeriodIndex([], freq='M')
+
+    def acumular(primeiras):
+        grade = primeiras.groupby(['MES', 'NF', 'DESCRICAO']).agg(
+            ATIVADOS=('LINHA', 'size'), DATA_NF=('DATA_NF', 'min'),
+        )
+        contagem = grade['ATIVADOS'].unstack(['NF', 'DESCRICAO']).reindex(meses)
+        datas = grade['DATA_NF'].unstack(['NF', 'DESCRICAO']).reindex(meses)
+        # cummin mantém NaT nos meses sem ativação: ffill propaga o mínimo
+        return contagem.fillna(0).cumsum().astype(int), datas.cummin().ffill()
+
+    primeiras = por_mes.drop_duplicates('LINHA', keep='first')
+    primeiras_modelo = por_mes[por_mes['MESMO_MODELO']].drop_duplicates('LINHA', keep='first')
+    ativados, datas = acumular(primeiras)
+    ativados_modelo, datas_modelo = acumular(primeiras_modelo)
+
+    return {
+        'mensal': mensal,
+        'acumulado': {
+            'ATIVADOS': ativados,
+            'DATA_NF': datas,
+            'ATIVADOS_MODELO': ativados_modelo,
+            'DATA_NF_MODELO': datas_modelo,
+        },
+    }
+
+
+def _medidas_cubo(modelo):
+    """Com filtro de modelo, contam só instalações com OS do mesmo modelo."""
+    if modelo != 'Todos':
+        return 'ATIVADOS_MODELO', 'DATA_NF_MODELO'
+    return 'ATIVADOS', 'DATA_NF'
+
+
+def _filtrar_pares(df, modelo, nf):
+    """Filtra DataFrame indexado por (NF, DESCRICAO) pelos filtros da página."""
+    if modelo != 'Todos':
+        df = df[df.index.get_level_values('DESCRICAO') == modelo]
+    if nf != 'Todos':
+        df = df[df.index.get_level_values('NF').astype(str) == str(nf)]
+    return df
+
+
+def ativacoes_no_mes(cubo, mes, modelo='Todos', nf='Todos'):
+    """Ativações do mês por (NF, DESCRICAO): colunas 'Data NF' e 'Ativados'."""
+    medida, col_data = _medidas_cubo(modelo)
+    try:
+        mes_df = cubo['mensal'].xs(mes, level='MES')
+    except KeyError:
+        mes_df = cubo['mensal'].iloc[0:0].droplevel('MES')
+
+    ativ = mes_df.groupby(level=['NF', 'DESCRICAO']).agg(
+        **{'Data NF': (col_data, 'min'), 'Ativados': (medida, 'sum')}
+    )
+    ativ = _filtrar_pares(ativ, modelo, nf)
+    return ativ[ativ['Ativados'] > 0]
+
+
+def ativacoes_acumuladas_ate(cubo, mes, modelo='Todos', nf='Todos'):
+    """Ativações acumuladas até o fim do mês por (NF, DESCRICAO)."""
+    medida, col_data = _medidas_cubo(modelo)
+    contagem = cubo['acumulado'][medida]
+    datas = cubo['acumulado'][col_data]
+
+    # Última linha do acumulado com MES <= mes
+    pos = contagem.index.searchsorted(mes, side='right') - 1
+    if pos < 0 or contagem.shape[1] == 0:
+        idx = pd.MultiIndex.from_arrays([[], []], names=['NF', 'DESCRICAO'])
+        return pd.DataFrame({'Data NF': [], 'Ativados': []}, index=idx)
+
+    ativ = pd.DataFrame({
+        'Data NF': datas.iloc[pos],
+        'Ativados': contagem.iloc[pos],
+    })
+    ativ = _filtrar_pares(ativ, modelo, nf)
+    return ativ[ativ['Ativados'] > 0].sort_index()
+
+
+# --- Índice invertido para busca de dados brutos (Auditoria) ---
+
+# Colunas de cliente, na ordem de preferência, em CONTRATOS
+COLUNAS_CLIENTE_CONTRATOS = ['ID_cliente', 'id_cliente', 'ID Cliente']
+
+
+def _indice_invertido(serie):
+    """{chave normalizada: posições (iloc) das linhas} para uma coluna."""
+    validos = serie.notna().to_numpy()
+    posicoes = np.flatnonzero(validos)
+    chaves = texto_id(serie[validos])
+    grupos = pd.Series(posicoes).groupby(chaves.to_numpy(), sort=False).indices
+    return {chave: posicoes[idx] for chave, idx in grupos.items()}
+
+
+def montar_indice_busca(relatorio, os_df, contratos, base_cruzada, notas, negativado):
+    """Índices invertidos por tipo de busca e aba, montados uma vez no load_data.
+
+    Estrutura: {tipo: {aba: [(coluna, {chave: posições})]}}. Cada aba pode
+    ter mais de uma coluna candidata (NEGATIVADO): vale a primeira com resultado.
+    """
+    def colunas(df, nomes):
+        return [(c, _indice_invertido(df[c])) for c in nomes if c in df.columns]
+
+    # NEGATIVADO não tem layout fixo: toda coluna que pareça ID/cliente
+    cols_neg = [
+        c for c in negativado.columns
+        if 'cliente' in str(c).lower() or 'id' in str(c).lower()
+    ]
+    # CONTRATOS: só a primeira coluna de cliente existente
+    cols_cli_contratos = [c for c in COLUNAS_CLIENTE_CONTRATOS if c in contratos.columns][:1]
+
+    return {
+        'patrimonio': {
+            'RELATORIO': colunas(relatorio, ['PATRIMONIO']),
+            'OS': colunas(os_df, ['id_patrimonio']),
+            'CONTRATOS': colunas(contratos, ['id_patrimonio_str']),
+            'BASE_CRUZADA': colunas(base_cruzada, ['id_patrimonio_str']),
+        },
+        'nf': {
+            'RELATORIO': colunas(relatorio, ['NF']),
+            'NOTAS': colunas(notas, ['Número NF']),
+        },
+        'cliente': {
+            'OS': colunas(os_df, ['ID_cliente']),
+            'CONTRATOS': colunas(contratos, cols_cli_contratos),
+            'NEGATIVADO': colunas(negativado, cols_neg),
+        },
+    }
+
+
+def buscar_indice(indice_busca, tipo, abas, valor):
+    """Busca valor nas abas via índice invertido.
+
+    Args:
+        indice_busca: índice de montar_indice_busca
+        tipo: 'patrimonio', 'nf' ou 'cliente'
+        abas: dict {nome da aba: DataFrame indexado}
+
+    Returns:
+        dict {aba: linhas encontradas}, só abas com resultado
+    """
+    chave = texto_id(valor)
+    resultados = {}
+    for aba, candidatas in indice_busca[tipo].items():
+        for _coluna, indice in candidatas:
+            posicoes = indice.get(chave)
+            if posicoes is not None:
+                resultados[aba] = abas[aba].iloc[posicoes]
+                break
+    return resultados
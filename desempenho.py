@@ -0,0 +1,368 @@
+"""
+MÓDULO DE DESEMPENHO — Instrumentação de tempo e memória
+
+Registra, por chamada das funções instrumentadas: tempo de parede,
+acerto ou falha de cache, linhas de entrada e pico de alocação.
+Chamadas são agrupadas em execuções (um rerun de página ou uma ingestão).
+
+- medido / medir: decorator e context manager para qualquer função ou trecho
+- cache_medido: st.cache_data / st.cache_resource que também mede
+  (hit quando a função original não executou)
+- execucao: agrupa as chamadas de um rerun ou de uma ingestão
+
+Os registros ficam em memória no processo (últimas MAX_CHAMADAS chamadas
+e MAX_EXECUCOES execuções). A ingestão roda em outro processo, então suas
+execuções vão para ARQUIVO_EXECUCOES (JSON Lines) e a página Desempenho
+lê de lá.
+
+O pico de alocação usa tracemalloc, que é opcional (tem custo): fica
+desligado até ativar_memoria(True) ou DESEMPENHO_MEMORIA=1. O tracemalloc
+é global ao processo; com sessões simultâneas o pico é aproximado.
+
+Não depende de streamlit (importado só dentro de cache_medido).
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import pandas as pd
+
+MAX_CHAMADAS = 5000
+MAX_EXECUCOES = 500
+# Acima deste tamanho o arquivo de execuções é reescrito com só as
+# últimas MAX_EXECUCOES linhas (as que ler_execucoes lê)
+MAX_BYTES_EXECUCOES = 4 * 1024 ** 2
+
+ARQUIVO_EXECUCOES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.desempenho', 'execucoes.jsonl'
+)
+
+_lock = threading.Lock()
+_chamadas = deque(maxlen=MAX_CHAMADAS)
+_execucoes = deque(maxlen=MAX_EXECUCOES)
+# Pilha de chamadas e execução corrente, por thread (uma sessão = uma thread)
+_local = threading.local()
+# Última versão dos dados vista por função de cache_medido(versao=...)
+# (no módulo: sobrevive aos reruns das páginas, que redecoram as funções)
+_versoes = {}
+
+
+# ============================================================
+# MEMÓRIA (tracemalloc opcional)
+# ============================================================
+
+def ativar_memoria(ativar=True):
+    """Liga/desliga o rastreio de pico de alocação (tracemalloc)."""
+    if ativar and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not ativar and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def memoria_ativa():
+    return tracemalloc.is_tracing()
+
+
+if os.environ.get('DESEMPENHO_MEMORIA') == '1':
+    ativar_memoria(True)
+
+
+# ============================================================
+# REGISTRO DE CHAMADAS
+# ============================================================
+
+def _pilha():
+    pilha = getattr(_local, 'pilha', None)
+    if pilha is None:
+        pilha = _local.pilha = []
+    return pilha
+
+
+def contar_linhas(*valores):
+    """Linhas de entrada: soma de len() dos DataFrames/Series recebidos.
+
+    Dicts de DataFrames (Dataset) contam todos os frames; sem nenhum
+    frame, None.
+    """
+    total, achou = 0, False
+    for valor in valores:
+        if isinstance(valor, (pd.DataFrame, pd.Series)):
+            total += len(valor)
+            achou = True
+        elif isinstance(valor, dict):
+            # dict.values: sem a cópia rasa do Dataset.__getitem__
+            for item in dict.values(valor):
+                if isinstance(item, pd.DataFrame):
+                    total += len(item)
+                    achou = True
+    return total if achou else None
+
+
+@contextlib.contextmanager
+def medir(nome, *entradas):
+    """Mede o trecho como uma chamada de `nome` (entradas: para contar linhas).
+
+    Pico de memória: com tracemalloc ativo, maior alocação durante o
+    trecho acima do que já estava alocado no início (inclui chamadas
+    aninhadas, que zeram o pico do tracemalloc).
+    """
+    memoria = tracemalloc.is_tracing()
+    chamada = {
+        'funcao': nome,
+        'inicio': time.time(),
+        'segundos': None,
+        'cache': None,
+        'linhas': contar_linhas(*entradas),
+        'pico_bytes': None,
+    }
+    quadro = {'chamada': chamada, 'pico_filhos': 0}
+    if memoria:
+        quadro['base'] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    pilha = _pilha()
+    pilha.append(quadro)
+    inicio = time.perf_counter()
+    try:
+        yield chamada
+    finally:
+        chamada['segundos'] = time.perf_counter() - inicio
+        pilha.pop()
+        if memoria and tracemalloc.is_tracing():
+            pico = max(tracemalloc.get_traced_memory()[1], quadro['pico_filhos'])
+            chamada['pico_bytes'] = max(0, pico - quadro['base'])
+            if pilha:
+                pilha[-1]['pico_filhos'] = max(pilha[-1]['pico_filhos'], pico)
+        _registrar(chamada)
+
+
+def medido(nome=None):
+    """Decorator: mede cada chamada da função (nome padrão: __name__)."""
+    def decorar(func):
+        rotulo = nome or func.__name__
+
+        @functools.wraps(func)
+        def chamar(*args, **kwargs):
+            with medir(rotulo, *args, *kwargs.values()):
+                return func(*args, **kwargs)
+        return chamar
+    return decorar
+
+
+def marcar_cache(hit):
+    """Marca a chamada medida corrente como hit/miss de cache."""
+    pilha = _pilha()
+    if pilha:
+        pilha[-1]['chamada']['cache'] = 'hit' if hit else 'miss'
+
+
+def cache_medido(recurso=False, versao=None, **opcoes):
+    """st.cache_data (ou st.cache_resource, com recurso=True) medido.
+
+    A função original só executa numa falha de cache; é ela que marca a
+    chamada como 'miss'. `__wrapped__` continua sendo a função original
+    (benchmarks medem o cálculo sem o cache) e `clear` limpa o cache.
+
+    versao: função dos mesmos argumentos que devolve a versão dos dados.
+    Quando a versão muda, o cache da função é limpo antes da chamada:
+    entradas de versões antigas não seguram os frames delas na memória.
+    """
+    import streamlit as st
+
+    decorador_cache = st.cache_resource if recurso else st.cache_data
+
+    def decorar(func):
+        @functools.wraps(func)
+        def calcular(*args, **kwargs):
+            marcar_cache(hit=False)
+            return func(*args, **kwargs)
+
+        em_cache = decorador_cache(**opcoes)(calcular)
+        chave = (func.__code__.co_filename, func.__qualname__)
+
+        @functools.wraps(func)
+        def chamar(*args, **kwargs):
+            if versao is not None:
+                atual = versao(*args, **kwargs)
+                with _lock:
+                    anterior = _versoes.get(chave, atual)
+                    _versoes[chave] = atual
+                if anterior != atual:
+                    em_cache.clear()
+            with medir(func.__name__, *args, *kwargs.values()) as chamada:
+                chamada['cache'] = 'hit'
+                return em_cache(*args, **kwargs)
+
+        chamar.clear = em_cache.clear
+        return chamar
+    return decorar
+
+
+def _registrar(chamada):
+    with _lock:
+        _chamadas.append(chamada)
+    atual = getattr(_local, 'execucao', None)
+    if atual is not None:
+        atual['chamadas'].append(chamada)
+
+
+# ============================================================
+# EXECUÇÕES (rerun de página / ingestão)
+# ============================================================
+
+@contextlib.contextmanager
+def execucao(nome, arquivo=None):
+    """Agrupa as chamadas medidas nesta thread numa execução `nome`.
+
+    Serve como decorator do main() das páginas. Com `arquivo`, a execução
+    também é acrescentada ao JSON Lines (ingestão, outro processo).
+    """
+    registro = {
+        'nome': nome,
+        'inicio': time.time(),
+        'segundos': None,
+        'chamadas': [],
+    }
+    anterior = getattr(_local, 'execucao', None)
+    _local.execucao = registro
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro['segundos'] = time.perf_counter() - inicio
+        _local.execucao = anterior
+        with _lock:
+            _execucoes.append(registro)
+        if arquivo:
+            gravar_execucao(registro, arquivo)
+
+
+def gravar_execucao(registro, arquivo=ARQUIVO_EXECUCOES):
+    """Acrescenta a execução ao arquivo JSON Lines (uma linha por execução).
+
+    Passando de MAX_BYTES_EXECUCOES, o arquivo é reescrito com as últimas
+    MAX_EXECUCOES linhas: não cresce sem limite a cada ingestão.
+    """
+    os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+    with open(arquivo, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        tamanho = f.tell()
+    if tamanho > MAX_BYTES_EXECUCOES:
+        _aparar_execucoes(arquivo)
+
+
+def _aparar_execucoes(arquivo, limite=MAX_EXECUCOES):
+    """Reescreve o arquivo só com as últimas `limite` linhas.
+
+    Grava num temporário e troca com os.replace: quem lê ao mesmo tempo
+    vê o arquivo antigo ou o novo, nunca um pela metade.
+    """
+    with open(arquivo, encoding='utf-8') as f:
+        linhas = deque(f, maxlen=limite)
+    temporario = arquivo + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.writelines(linhas)
+    os.replace(temporario, arquivo)
+
+
+def ler_execucoes(arquivo=ARQUIVO_EXECUCOES, limite=MAX_EXECUCOES):
+    """Últimas `limite` execuções gravadas no arquivo (lista de dicts)."""
+    try:
+        with open(arquivo, encoding='utf-8') as f:
+            linhas = deque(f, maxlen=limite)
+    except OSError:
+        return []
+    execucoes = []
+    for linha in linhas:
+        try:
+            execucoes.append(json.loads(linha))
+        except ValueError:
+            continue  # linha truncada (gravação interrompida)
+    return execucoes
+
+
+# ============================================================
+# CONSULTA
+# ============================================================
+
+def chamadas():
+    """Chamadas registradas no processo (DataFrame, uma linha por chamada)."""
+    with _lock:
+        registros = list(_chamadas)
+    return _tabela_chamadas(registros)
+
+
+def execucoes():
+    """Execuções registradas no processo (lista de dicts, mais antigas primeiro)."""
+    with _lock:
+        return list(_execucoes)
+
+
+def limpar():
+    """Descarta os registros em memória do processo."""
+    with _lock:
+        _chamadas.clear()
+        _execucoes.clear()
+
+
+def _tabela_chamadas(registros):
+    colunas = ['funcao', 'inicio', 'segundos', 'cache', 'linhas', 'pico_bytes']
+    df = pd.DataFrame(registros, columns=colunas)
+    df['inicio'] = pd.to_datetime(df['inicio'], unit='s')
+    return df
+
+
+def resumo_por_funcao(registros=None):
+    """Percentis de latência, taxa de hit, linhas e pico por função.
+
+    `registros`: lista de chamadas (padrão: as do processo). Ordenado pelo
+    p90, mais lentas primeiro.
+    """
+    df = chamadas() if registros is None else _tabela_chamadas(registros)
+    if df.empty:
+        return pd.DataFrame()
+
+    df['ms'] = df['segundos'] * 1000
+    df['hit'] = (df['cache'] == 'hit').where(df['cache'].notna())
+    grupos = df.groupby('funcao')
+    resumo = pd.DataFrame({
+        'chamadas': grupos.size(),
+        'p50 (ms)': grupos['ms'].quantile(0.50),
+        'p90 (ms)': grupos['ms'].quantile(0.90),
+        'p99 (ms)': grupos['ms'].quantile(0.99),
+        'max (ms)': grupos['ms'].max(),
+        'hit (%)': grupos['hit'].mean() * 100,
+        'linhas (média)': grupos['linhas'].mean(),
+        'pico (MB)': grupos['pico_bytes'].max() / 1024 ** 2,
+    })
+    return resumo.sort_values('p90 (ms)', ascending=False).reset_index()
+
+
+def tabela_execucoes(registros, limite=20):
+    """Execuções mais lentas: duração, chamadas e a chamada mais lenta."""
+    linhas = []
+    for registro in registros:
+        lenta = max(registro['chamadas'], key=lambda c: c['segundos'], default=None)
+        linhas.append({
+            'Execução': registro['nome'],
+            'Início': pd.to_datetime(registro['inicio'], unit='s'),
+            'Duração (ms)': registro['segundos'] * 1000,
+            'Chamadas': len(registro['chamadas']),
+            'Misses': sum(c['cache'] == 'miss' for c in registro['chamadas']),
+            'Mais lenta': lenta['funcao'] if lenta else '',
+            'Mais lenta (ms)': lenta['segundos'] * 1000 if lenta else None,
+        })
+    if not linhas:
+        return pd.DataFrame()
+    return (
+        pd.DataFrame(linhas)
+        .sort_values('Duração (ms)', ascending=False)
+        .head(limite)
+        .reset_index(drop=True)
+    )
@@ -0,0 +1,113 @@
+"""
+ÍNDICE DE OS — IDs de OS já integrados, para deduplicar sem ler a aba OS
+
+Arquivo ao lado do cache colunar (.cache_planilha/<fonte>.os_ids.npz)
+com as chaves int64 (chaves.chave_id) de 'ID _Ordem de Serviço',
+ordenadas e únicas, e a assinatura da fonte (planilha ou base SQLite)
+no momento da gravação.
+
+- A ingestão confere as OS do mês contra o índice (busca binária) antes
+  de ler a base, e grava o índice de novo depois de salvar.
+- Se a fonte mudou por fora (edição manual, nova importação), a
+  assinatura não confere e o índice é reconstruído lendo só a coluna de
+  ID da aba OS.
+
+Não depende de streamlit: usado por atualizar_mes.py.
+"""
+
+import os
+
+import numpy as np
+
+from chaves import SEM_CHAVE, chave_id
+from planilha import CACHE_DIRNAME, assinatura_arquivo, hash_arquivo
+
+COLUNA_ID = 'ID _Ordem de Serviço'
+SUFIXO = '.os_ids.npz'
+
+
+def caminho_indice(fonte):
+    """Arquivo do índice da fonte (nome completo: planilha e base não colidem)."""
+    pasta = os.path.dirname(os.path.abspath(fonte))
+    return os.path.join(pasta, CACHE_DIRNAME, os.path.basename(fonte) + SUFIXO)
+
+
+def chaves_os(df_os):
+    """IDs de OS como chaves int64 ordenadas e únicas (sem vazios)."""
+    chaves = chave_id(df_os[COLUNA_ID]).to_numpy()
+    return np.unique(chaves[chaves != SEM_CHAVE])
+
+
+def contem(ordenadas, chaves):
+    """Máscara de `chaves` presentes no array ordenado `ordenadas`."""
+    if len(ordenadas) == 0:
+        return np.zeros(len(chaves), dtype=bool)
+    posicoes = np.searchsorted(ordenadas, chaves).clip(max=len(ordenadas) - 1)
+    return ordenadas[posicoes] == chaves
+
+
+def ler_indice(fonte):
+    """Chaves do índice, ou None se ausente, corrompido ou desatualizado.
+
+    Como no cache colunar: tamanho + mtime iguais bastam; se só o mtime
+    mudou, o hash do conteúdo decide.
+    """
+    try:
+        with np.load(caminho_indice(fonte)) as arquivo:
+            chaves = arquivo['chaves']
+            tamanho, mtime_ns = (int(v) for v in arquivo['tamanho_mtime'])
+            sha256 = str(arquivo['sha256'])
+        info = os.stat(fonte)
+    except (OSError, ValueError, KeyError):
+        return None
+    if info.st_size != tamanho:
+        return None
+    if info.st_mtime_ns != mtime_ns and hash_arquivo(fonte) != sha256:
+        return None
+    return chaves
+
+
+def gravar_indice(fonte, chaves):
+    """Grava o índice (atômico: temporário + rename) com a assinatura atual.
+
+    Falhas de escrita são ignoradas: sem índice, a próxima ingestão o
+    reconstrói.
+    """
+    destino = caminho_indice(fonte)
+    assinatura = assinatura_arquivo(fonte)
+    tmp = f"{destino}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f,
+                chaves=np.asarray(chaves, dtype=np.int64),
+                tamanho_mtime=np.array([assinatura['tamanho'], assinatura['mtime_ns']], dtype=np.int64),
+                sha256=np.array(assinatura['sha256']),
+            )
+        os.replace(tmp, destino)
+    except OSError:
+        pass
+
+
+def carregar_indice(fonte, ler_os):
+    """Chaves das OS da fonte: do índice ou, se preciso, reconstruídas.
+
+    Args:
+        ler_os: função sem argumentos que devolve a aba OS, ao menos a
+            coluna COLUNA_ID (só chamada quando o índice está ausente ou
+            desatualizado)
+
+    Retorna (chaves, reconstruido).
+    """
+    chaves = ler_indice(fonte)
+    if chaves is not None:
+        return chaves, False
+    chaves = chaves_os(ler_os())
+    gravar_indice(fonte, chaves)
+    return chaves, True
+
+
+def atualizar_indice(fonte, chaves, novos):
+    """Acrescenta as OS novas ao índice, depois de gravadas na fonte."""
+    gravar_indice(fonte, np.union1d(chaves, chaves_os(novos)))
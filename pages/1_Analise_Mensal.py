@@ -5,6 +5,7 @@ Comparativo obrigatório: mês selecionado vs mês anterior
 """
 
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime
@@ -13,9 +14,11 @@ import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from dados import (
-    load_data, fmt, get_os_periodo, enriquecer_com_relatorio,
-    get_meses_disponiveis, periodo_do_mes,
+    load_data, fmt, get_os_periodo, get_meses_disponiveis, periodo_do_mes,
+    ativacoes_no_mes, ativacoes_acumuladas_ate, SEM_CHAVE, HASH_DATASET,
+    versao_dataset, pagina_instrumentada,
 )
+from desempenho import cache_medido, medido
 
 st.set_page_config(
     page_title="Analise Mensal - Equipamentos",
@@ -28,83 +31,108 @@ st.set_page_config(
 # CÁLCULOS POR PERÍODO (fonte: OS + RELATORIO para enriquecer)
 # ============================================================
 
-@st.cache_data
-def calcular_ativacoes(os_df, relatorio, data_inicio, data_fim):
-    """Conta instalações no período usando OS, enriquece com RELATORIO.
+def _tabela_ativacoes(ativ, totais_nf_modelo, col_ativados, col_taxa):
+    """Ativados por NF+modelo cruzados com o total comprado de cada par."""
+    if len(ativ) == 0:
+        return pd.DataFrame()
+
+    df = (
+        ativ.rename(columns={'Ativados': col_ativados})
+        .join(totais_nf_modelo, how='left')
+        .reset_index()
+        .rename(columns={'DESCRICAO': 'Modelo'})
+    )
+    total_nf = df['Comprados (Total NF)']
+    df[col_taxa] = (df[col_ativados] / total_nf).where(total_nf > 0, 0)
+    df = df[['NF', 'Modelo', 'Data NF', 'Comprados (Total NF)', col_ativados, col_taxa]]
+    return df.sort_values(col_ativados, ascending=False)
+
+
+@medido()
+def calcular_ativacoes(cubo, totais_nf_modelo, mes, modelo, nf):
+    """Conta instalações do mês (via OS), por NF+modelo do RELATORIO.
 
     Evita o 'efeito foto' do RELATORIO: OS preserva cada evento.
+    Consulta ao cubo de ativações montado no load_data.
     """
-    os_per = get_os_periodo(os_df, data_inicio, data_fim)
-    os_inst = os_per[
-        os_per['ASSUNTO PADRONIZADO'].str.contains('INSTALAC', case=False, na=False)
-    ]
-
-    patrimonios = os_inst['id_patrimonio'].dropna().unique()
-    rel_enriq = enriquecer_com_relatorio(patrimonios, relatorio)
-
-    tabela = []
-    if len(rel_enriq) > 0:
-        rel_total = relatorio.copy()
-        for (nf, modelo), grupo in rel_enriq.groupby(['NF', 'DESCRICAO']):
-            total_nf = len(rel_total[(rel_total['NF'] == nf) & (rel_total['DESCRICAO'] == modelo)])
-            ativados = len(grupo)
-            tabela.append({
-                'NF': nf,
-                'Modelo': modelo,
-                'Data NF': grupo['DATA NF'].min(),
-                'Comprados (Total NF)': total_nf,
-                'Ativados': ativados,
-                'Taxa': ativados / total_nf if total_nf > 0 else 0,
-            })
-
-    df = pd.DataFrame(tabela)
-    if len(df) > 0:
-        df = df.sort_values('Ativados', ascending=False)
+    ativ = ativacoes_no_mes(cubo, mes, modelo, nf)
+    df = _tabela_ativacoes(ativ, totais_nf_modelo, 'Ativados', 'Taxa')
 
     # Contagem de ativados COM NF (consistente com Taxa de Ativação)
     total_ativados_nf = int(df['Ativados'].sum()) if len(df) > 0 else 0
     return df, total_ativados_nf
 
 
-@st.cache_data
-def calcular_ativacoes_acumuladas(os_df, relatorio, data_fim):
-    """Ativações acumuladas: todas as instalações desde sempre até data_fim."""
-    os_acum = os_df[os_df['data_fechamento_OS'] <= pd.to_datetime(data_fim)]
-    os_inst = os_acum[
-        os_acum['ASSUNTO PADRONIZADO'].str.contains('INSTALAC', case=False, na=False)
-    ]
-    patrimonios = os_inst['id_patrimonio'].dropna().unique()
-    rel_enriq = enriquecer_com_relatorio(patrimonios, relatorio)
-
-    tabela = []
-    if len(rel_enriq) > 0:
-        rel_total = relatorio.copy()
-        for (nf, modelo), grupo in rel_enriq.groupby(['NF', 'DESCRICAO']):
-            total_nf = len(rel_total[(rel_total['NF'] == nf) & (rel_total['DESCRICAO'] == modelo)])
-            ativados = len(grupo)
-            tabela.append({
-                'NF': nf,
-                'Modelo': modelo,
-                'Data NF': grupo['DATA NF'].min(),
-                'Comprados (Total NF)': total_nf,
-                'Ativados Acumulado': ativados,
-                'Taxa Acumulada': ativados / total_nf if total_nf > 0 else 0,
-            })
-
-    df = pd.DataFrame(tabela)
-    if len(df) > 0:
-        df = df.sort_values('Ativados Acumulado', ascending=False)
-    return df
-
-
-@st.cache_data
-def calcular_manutencao(os_df, data_inicio, data_fim):
+@medido()
+def calcular_ativacoes_acumuladas(cubo, totais_nf_modelo, mes, modelo, nf):
+    """Ativações acumuladas: todas as instalações desde sempre até o fim do mês."""
+    ativ = ativacoes_acumuladas_ate(cubo, mes, modelo, nf)
+    return _tabela_ativacoes(
+        ativ, totais_nf_modelo, 'Ativados Acumulado', 'Taxa Acumulada'
+    )
+
+
+def _mascara_relatorio(relatorio, modelo, nf):
+    """Máscara booleana dos filtros de modelo/NF no RELATORIO (None = tudo)."""
+    mascara = None
+    if modelo != 'Todos':
+        mascara = (relatorio['DESCRICAO'] == modelo).to_numpy()
+    if nf != 'Todos':
+        # NF já vem como texto do load_data (texto_id): sem astype(str)
+        por_nf = (relatorio['NF'] == str(nf)).to_numpy()
+        mascara = por_nf if mascara is None else mascara & por_nf
+    return mascara
+
+
+def _mascara_os(os_df, rel_filtrado, modelo, nf):
+    """Máscara dos filtros na OS: com NF, só os patrimônios dessa NF."""
+    mascara = None
+    if modelo != 'Todos':
+        mascara = (os_df['descricao_produto'] == modelo).to_numpy()
+    if nf != 'Todos':
+        pat_nf = rel_filtrado['PAT_ID'].unique()
+        por_nf = np.isin(os_df['PAT_ID'].to_numpy(), pat_nf[pat_nf != SEM_CHAVE])
+        mascara = por_nf if mascara is None else mascara & por_nf
+    return mascara
+
+
+@cache_medido(
+    recurso=True, versao=versao_dataset,
+    hash_funcs=HASH_DATASET, max_entries=32,
+)
+def filtrar_dados(data, modelo, nf):
+    """RELATORIO e OS com os filtros de modelo/NF da página.
+
+    Memoizado por (versão do Dataset, modelo, NF) no cache_resource: voltar
+    a um filtro recente devolve os mesmos frames, sem recalcular nem
+    desserializar. Com 'Todos' os frames compartilhados voltam sem cópia.
+    Quando o Dataset muda de versão, as entradas da anterior são
+    descartadas (não seguram os frames antigos na memória).
+    A OS filtrada mantém a ordenação por fechamento (get_os_periodo segue
+    na busca binária com ordenada=data['_os_ordenada']). Os frames são compartilhados: somente leitura.
+    """
+    relatorio = data['relatorio']
+    os_df = data['os']
+
+    mascara = _mascara_relatorio(relatorio, modelo, nf)
+    if mascara is not None:
+        relatorio = relatorio[mascara]
+    mascara = _mascara_os(os_df, relatorio, modelo, nf)
+    if mascara is not None:
+        os_df = os_df[mascara]
+    return relatorio, os_df
+
+
+@cache_medido(versao=versao_dataset, hash_funcs=HASH_DATASET)
+def calcular_manutencao(data, modelo, nf, data_inicio, data_fim):
     """Manutenção: Novos vs Reutilizados por tipo.
 
     Usa CICLO da OS (não do RELATORIO) para evitar viés temporal.
     CICLO=1 na linha da OS = novo, CICLO>1 = reutilizado.
+    Chave de cache: versão do Dataset + filtros + período.
     """
-    os_per = get_os_periodo(os_df, data_inicio, data_fim)
+    _, os_filtrado = filtrar_dados(data, modelo, nf)
+    os_per = get_os_periodo(os_filtrado, data_inicio, data_fim, ordenada=data['_os_ordenada'])
 
     tipos = ['MANUTENCAO', 'MESH', 'UPGRADE']
     resultado = {}
@@ -123,12 +151,14 @@ def calcular_manutencao(os_df, data_inicio, data_fim):
     return resultado
 
 
-@st.cache_data
-def calcular_parque_rede(contratos, config_obs_map, os_df, data_fim):
+@cache_medido(versao=versao_dataset, hash_funcs=HASH_DATASET)
+def calcular_parque_rede(data):
     """Equipamentos na rede usando CONTRATOS + config.
 
     CONTRATOS tem TODOS os equipamentos (com e sem NF).
     """
+    contratos, os_df = data['contratos'], data['os']
+
     # Filtrar contratos ativos
     ativos = contratos[contratos['status_contrato'] == 'Ativo'].copy()
     total_ativos = len(ativos)
@@ -139,10 +169,8 @@ def calcular_parque_rede(contratos, config_obs_map, os_df, data_fim):
 
     # Média de chamados dos clientes com equipamento obsoleto
     # Cruzar patrimônios obsoletos ativos com OS
-    pat_obs = set(
-        ativos[ativos['OBSOLETO'] == 'Sim']['id_patrimonio_str'].dropna()
-    )
-    os_obs = os_df[os_df['id_patrimonio'].isin(pat_obs)]
+    pat_obs = ativos.loc[ativos['OBSOLETO'] == 'Sim', 'PAT_ID'].unique()
+    os_obs = os_df[os_df['PAT_ID'].isin(pat_obs[pat_obs != SEM_CHAVE])]
     # Contar OS por cliente (usando id do patrimônio como proxy)
     if len(os_obs) > 0 and 'ID_cliente' in os_obs.columns:
         media_chamados = os_obs.groupby('ID_cliente').size().mean()
@@ -201,6 +229,7 @@ def render_delta(valor_atual, valor_anterior, is_pct=False):
 # INTERFACE PRINCIPAL
 # ============================================================
 
+@pagina_instrumentada('Análise Mensal')
 def main():
     st.title("📅 Analise Mensal")
     st.markdown("**Detalhamento operacional por mês com comparativo**")
@@ -211,7 +240,6 @@ def main():
 
     os_df = data['os']
     relatorio = data['relatorio']
-    contratos = data['contratos']
 
     # ========================================
     # FILTROS
@@ -267,19 +295,8 @@ def main():
     ini_atual, fim_atual = periodo_do_mes(mes_selecionado)
     ini_anterior, fim_anterior = periodo_do_mes(mes_anterior)
 
-    # Aplicar filtros de modelo/NF no OS e RELATORIO
-    os_filtrado = os_df.copy()
-    rel_filtrado = relatorio.copy()
-
-    if modelo_filtro != 'Todos':
-        os_filtrado = os_filtrado[os_filtrado['descricao_produto'] == modelo_filtro]
-        rel_filtrado = rel_filtrado[rel_filtrado['DESCRICAO'] == modelo_filtro]
-
-    if nf_filtro != 'Todos':
-        # Filtrar RELATORIO pela NF, depois filtrar OS pelos patrimônios dessa NF
-        rel_filtrado = rel_filtrado[rel_filtrado['NF'].astype(str) == str(nf_filtro)]
-        pat_nf = set(rel_filtrado['PATRIMONIO'].astype(str))
-        os_filtrado = os_filtrado[os_filtrado['id_patrimonio'].isin(pat_nf)]
+    # Filtros de modelo/NF (memoizados por versão dos dados + filtro)
+    rel_filtrado, _ = filtrar_dados(data, modelo_filtro, nf_filtro)
 
     # ========================================
     # SEÇÃO 1: ATIVAÇÕES POR NF
@@ -287,18 +304,24 @@ def main():
 
     st.subheader("1. Ativacoes por Nota Fiscal")
 
-    # Período atual
+    cubo = data['cubo_ativacoes']
+    totais_nf_modelo = data['totais_nf_modelo']
+
+    # Período atual e anterior
     df_ativ_atual, total_inst_atual = calcular_ativacoes(
-        os_filtrado, rel_filtrado, ini_atual, fim_atual
+        cubo, totais_nf_modelo, mes_selecionado, modelo_filtro, nf_filtro
     )
-    # Período anterior
     df_ativ_ant, total_inst_ant = calcular_ativacoes(
-        os_filtrado, rel_filtrado, ini_anterior, fim_anterior
+        cubo, totais_nf_modelo, mes_anterior, modelo_filtro, nf_filtro
     )
 
     # Calcular acumulado (necessário para KPIs)
-    df_acum = calcular_ativacoes_acumuladas(os_filtrado, rel_filtrado, fim_atual)
-    df_acum_ant = calcular_ativacoes_acumuladas(os_filtrado, rel_filtrado, fim_anterior)
+    df_acum = calcular_ativacoes_acumuladas(
+        cubo, totais_nf_modelo, mes_selecionado, modelo_filtro, nf_filtro
+    )
+    df_acum_ant = calcular_ativacoes_acumuladas(
+        cubo, totais_nf_modelo, mes_anterior, modelo_filtro, nf_filtro
+    )
 
     total_com_nf = len(rel_filtrado)
     total_acum = int(df_acum['Ativados Acumulado'].sum()) if len(df_acum) > 0 else 0
@@ -368,8 +391,8 @@ def main():
     st.subheader("2. Manutencao: Novos vs Reutilizados")
     st.caption("Fonte: OS do periodo. CICLO=1 na OS = Novo | CICLO>1 = Reutilizado")
 
-    manut_atual = calcular_manutencao(os_filtrado, ini_atual, fim_atual)
-    manut_ant = calcular_manutencao(os_filtrado, ini_anterior, fim_anterior)
+    manut_atual = calcular_manutencao(data, modelo_filtro, nf_filtro, ini_atual, fim_atual)
+    manut_ant = calcular_manutencao(data, modelo_filtro, nf_filtro, ini_anterior, fim_anterior)
 
     # Cards por tipo
     col_m1, col_m2, col_m3 = st.columns(3)
@@ -432,7 +455,7 @@ def main():
     st.subheader("3. Equipamentos na Rede")
     st.caption("Fonte: CONTRATOS + config (parque total, incluindo equipamentos sem NF)")
 
-    parque = calcular_parque_rede(contratos, data['obs_map'], os_df, fim_atual)
+    parque = calcular_parque_rede(data)
 
     c1, c2, c3, c4 = st.columns(4)
     with c1:
@@ -477,11 +500,15 @@ def main():
     st.subheader("5. Controle de Retiradas")
 
     # Dados parciais disponíveis: OS de retirada + NEGATIVADO
-    os_retirada_atual = get_os_periodo(os_df, ini_atual, fim_atual)
+    os_retirada_atual = get_os_periodo(
+        os_df, ini_atual, fim_atual, ordenada=data['_os_ordenada'],
+    )
     os_retirada_atual = os_retirada_atual[
         os_retirada_atual['ASSUNTO PADRONIZADO'].str.contains('RETIRADA', case=False, na=False)
     ]
-    os_retirada_ant = get_os_periodo(os_df, ini_anterior, fim_anterior)
+    os_retirada_ant = get_os_periodo(
+        os_df, ini_anterior, fim_anterior, ordenada=data['_os_ordenada'],
+    )
     os_retirada_ant = os_retirada_ant[
         os_retirada_ant['ASSUNTO PADRONIZADO'].str.contains('RETIRADA', case=False, na=False)
     ]
@@ -10,12 +10,17 @@ Seções:
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from dados import load_data, fmt
+from dados import (
+    load_data, fmt, buscar_indice, SEM_CHAVE, HASH_DATASET, versao_dataset,
+    pagina_instrumentada,
+)
+from desempenho import cache_medido
 
 st.set_page_config(
     page_title="Auditoria - Equipamentos",
@@ -28,22 +33,30 @@ st.set_page_config(
 # CÁLCULOS DE AUDITORIA
 # ============================================================
 
-@st.cache_data
-def calcular_integridade(os_df, relatorio, contratos, config, limpeza):
+@cache_medido(versao=versao_dataset, hash_funcs=HASH_DATASET)
+def calcular_integridade(data):
     """Verifica integridade dos dados entre as abas."""
+    os_df, relatorio, contratos = data['os'], data['relatorio'], data['contratos']
+    config, limpeza = data['config'], data['_limpeza']
+
     # 1. OS sem patrimônio (valor real, contado ANTES da remoção no load_data)
     os_sem_pat = limpeza.get('os_sem_patrimonio', 0)
 
     # 2. Patrimônios no RELATORIO sem nenhuma OS
-    pat_rel = set(relatorio['PATRIMONIO'].dropna().astype(str))
-    pat_os = set(os_df['id_patrimonio'].dropna().astype(str))
-    pat_sem_os = pat_rel - pat_os
-    pat_os_sem_rel = pat_os - pat_rel
+    # (cruzamento pelas chaves int64 PAT_ID; texto só para exibir)
+    rel_pat = relatorio[relatorio['PAT_ID'] != SEM_CHAVE]
+    chaves_rel = rel_pat['PAT_ID'].unique()
+    chaves_os = os_df['PAT_ID'].unique()
+    pat_rel = set(rel_pat['PATRIMONIO'])
+    pat_os = set(os_df['id_patrimonio'])
+    pat_sem_os = set(rel_pat.loc[~rel_pat['PAT_ID'].isin(chaves_os), 'PATRIMONIO'])
+    pat_os_sem_rel = set(os_df.loc[~os_df['PAT_ID'].isin(chaves_rel), 'id_patrimonio'])
 
     # 3. Patrimônios no CONTRATOS sem NF (não estão no RELATORIO)
-    if 'id_patrimonio_str' in contratos.columns:
-        pat_contratos = set(contratos['id_patrimonio_str'].dropna())
-        pat_sem_nf = pat_contratos - pat_rel
+    if 'PAT_ID' in contratos.columns:
+        con_pat = contratos[contratos['PAT_ID'] != SEM_CHAVE]
+        pat_contratos = set(con_pat['id_patrimonio_str'])
+        pat_sem_nf = set(con_pat.loc[~con_pat['PAT_ID'].isin(chaves_rel), 'id_patrimonio_str'])
     else:
         pat_contratos = set()
         pat_sem_nf = set()
@@ -84,9 +97,10 @@ def calcular_integridade(os_df, relatorio, contratos, config, limpeza):
     }
 
 
-@st.cache_data
-def calcular_qualidade_ingestao(os_df, limpeza):
+@cache_medido(versao=versao_dataset, hash_funcs=HASH_DATASET)
+def calcular_qualidade_ingestao(data):
     """Analisa qualidade da ingestão de OS."""
+    os_df, limpeza = data['os'], data['_limpeza']
     datas = os_df['data_fechamento_OS'].dropna()
 
     if datas.empty:
@@ -117,25 +131,29 @@ def calcular_qualidade_ingestao(os_df, limpeza):
     }
 
 
-@st.cache_data
-def calcular_cruzamentos(relatorio, contratos, os_df):
+@cache_medido(versao=versao_dataset, hash_funcs=HASH_DATASET)
+def calcular_cruzamentos(data):
     """Cruza RELATORIO vs CONTRATOS para encontrar divergências."""
+    relatorio, contratos = data['relatorio'], data['contratos']
     resultados = {}
 
     # RELATORIO vs CONTRATOS — patrimônios ativos sem NF
-    if 'id_patrimonio_str' in contratos.columns:
+    if 'PAT_ID' in contratos.columns:
         ativos = contratos[contratos['status_contrato'] == 'Ativo']
-        pat_ativos = set(ativos['id_patrimonio_str'].dropna())
-        pat_rel = set(relatorio['PATRIMONIO'].dropna().astype(str))
+        pat_ativos = np.unique(ativos['PAT_ID'].to_numpy())
+        pat_ativos = pat_ativos[pat_ativos != SEM_CHAVE]
+        pat_rel = np.unique(relatorio['PAT_ID'].to_numpy())
+        pat_rel = pat_rel[pat_rel != SEM_CHAVE]
 
         # Ativos no CONTRATOS sem registro no RELATORIO
-        ativos_sem_rel = pat_ativos - pat_rel
+        ativos_sem_rel = np.setdiff1d(pat_ativos, pat_rel, assume_unique=True)
+        cobertos = np.intersect1d(pat_ativos, pat_rel, assume_unique=True)
         resultados['ativos_sem_relatorio'] = len(ativos_sem_rel)
         resultados['total_ativos'] = len(pat_ativos)
-        resultados['cobertura_relatorio'] = len(pat_ativos & pat_rel) / len(pat_ativos) * 100 if len(pat_ativos) > 0 else 0
+        resultados['cobertura_relatorio'] = len(cobertos) / len(pat_ativos) * 100 if len(pat_ativos) > 0 else 0
 
         # Patrimônios no RELATORIO que não estão ativos no CONTRATOS
-        rel_sem_ativo = pat_rel - pat_ativos
+        rel_sem_ativo = np.setdiff1d(pat_rel, pat_ativos, assume_unique=True)
         # Podem estar negativados ou cancelados
         resultados['rel_sem_contrato_ativo'] = len(rel_sem_ativo)
     else:
@@ -155,7 +173,7 @@ def calcular_cruzamentos(relatorio, contratos, os_df):
     return resultados
 
 
-@st.cache_data
+@cache_medido(versao=versao_dataset, hash_funcs=HASH_DATASET)
 def calcular_contadores(data):
     """Contadores gerais de todas as abas."""
     contadores = []
@@ -173,18 +191,31 @@ def calcular_contadores(data):
         'RETIRADA': data['retirada'],
     }
 
+    # Tempo de leitura e memória de cada aba no último carregamento
+    tempos = data.get('_leitura', {}).get('tempos', {})
+    memoria = data.get('_memoria', {})
+
+    def mb(nome, chave):
+        return round(memoria.get(nome, {}).get(chave, 0) / 1024 ** 2, 2)
+
     for nome, df in abas.items():
         if df is not None and not df.empty:
             contadores.append({
                 'Aba': nome,
                 'Linhas': len(df),
                 'Colunas': len(df.columns),
+                'Leitura (s)': round(tempos.get(nome, 0), 3),
+                'Memoria (MB)': mb(nome, 'depois'),
+                'Sem category (MB)': mb(nome, 'antes'),
             })
         else:
             contadores.append({
                 'Aba': nome,
                 'Linhas': 0,
                 'Colunas': 0,
+                'Leitura (s)': round(tempos.get(nome, 0), 3),
+                'Memoria (MB)': 0.0,
+                'Sem category (MB)': 0.0,
             })
 
     return pd.DataFrame(contadores)
@@ -194,92 +225,36 @@ def calcular_contadores(data):
 # DADOS BRUTOS — BUSCA
 # ============================================================
 
-def buscar_patrimonio(patrimonio, data):
-    """Busca informações de um patrimônio em todas as abas."""
-    pat_str = str(patrimonio).strip()
-    resultados = {}
+def _abas_busca(data):
+    """Abas consultadas na busca de dados brutos."""
+    return {
+        'RELATORIO': data['relatorio'],
+        'OS': data['os'],
+        'CONTRATOS': data['contratos'],
+        'BASE_CRUZADA': data['base_cruzada'],
+        'NOTAS': data['notas'],
+        'NEGATIVADO': data['negativado'],
+    }
 
-    # RELATORIO
-    rel = data['relatorio']
-    rel_match = rel[rel['PATRIMONIO'].astype(str) == pat_str]
-    if len(rel_match) > 0:
-        resultados['RELATORIO'] = rel_match
-
-    # OS
-    os_df = data['os']
-    os_match = os_df[os_df['id_patrimonio'].astype(str) == pat_str]
-    if len(os_match) > 0:
-        resultados['OS'] = os_match.sort_values('data_fechamento_OS', ascending=False)
-
-    # CONTRATOS
-    contratos = data['contratos']
-    if 'id_patrimonio_str' in contratos.columns:
-        c_match = contratos[contratos['id_patrimonio_str'] == pat_str]
-        if len(c_match) > 0:
-            resultados['CONTRATOS'] = c_match
-
-    # BASE_CRUZADA
-    bc = data['base_cruzada']
-    if not bc.empty and 'id_patrimonio_str' in bc.columns:
-        bc_match = bc[bc['id_patrimonio_str'] == pat_str]
-        if len(bc_match) > 0:
-            resultados['BASE_CRUZADA'] = bc_match
 
+def buscar_patrimonio(patrimonio, data):
+    """Busca informações de um patrimônio em todas as abas."""
+    resultados = buscar_indice(data['indice_busca'], 'patrimonio', _abas_busca(data), patrimonio)
+    if 'OS' in resultados:
+        resultados['OS'] = resultados['OS'].sort_values('data_fechamento_OS', ascending=False)
     return resultados
 
 
 def buscar_nf(nf, data):
     """Busca informações de uma NF em todas as abas."""
-    nf_str = str(nf).strip()
-    resultados = {}
-
-    # RELATORIO
-    rel = data['relatorio']
-    rel_match = rel[rel['NF'].astype(str) == nf_str]
-    if len(rel_match) > 0:
-        resultados['RELATORIO'] = rel_match
-
-    # NOTAS
-    notas = data['notas']
-    if 'Número NF' in notas.columns:
-        n_match = notas[notas['Número NF'].astype(str) == nf_str]
-        if len(n_match) > 0:
-            resultados['NOTAS'] = n_match
-
-    return resultados
+    return buscar_indice(data['indice_busca'], 'nf', _abas_busca(data), nf)
 
 
 def buscar_cliente(cliente_id, data):
     """Busca informações de um cliente em todas as abas."""
-    cli_str = str(cliente_id).strip()
-    resultados = {}
-
-    # OS
-    os_df = data['os']
-    if 'ID_cliente' in os_df.columns:
-        os_match = os_df[os_df['ID_cliente'].astype(str) == cli_str]
-        if len(os_match) > 0:
-            resultados['OS'] = os_match.sort_values('data_fechamento_OS', ascending=False)
-
-    # CONTRATOS
-    contratos = data['contratos']
-    for col in ['ID_cliente', 'id_cliente', 'ID Cliente']:
-        if col in contratos.columns:
-            c_match = contratos[contratos[col].astype(str) == cli_str]
-            if len(c_match) > 0:
-                resultados['CONTRATOS'] = c_match
-            break
-
-    # NEGATIVADO
-    neg = data['negativado']
-    if not neg.empty:
-        for col in neg.columns:
-            if 'cliente' in col.lower() or 'id' in col.lower():
-                n_match = neg[neg[col].astype(str) == cli_str]
-                if len(n_match) > 0:
-                    resultados['NEGATIVADO'] = n_match
-                    break
-
+    resultados = buscar_indice(data['indice_busca'], 'cliente', _abas_busca(data), cliente_id)
+    if 'OS' in resultados:
+        resultados['OS'] = resultados['OS'].sort_values('data_fechamento_OS', ascending=False)
     return resultados
 
 
@@ -287,6 +262,7 @@ def buscar_cliente(cliente_id, data):
 # INTERFACE PRINCIPAL
 # ============================================================
 
+@pagina_instrumentada('Auditoria')
 def main():
     st.title("🔍 Auditoria de Dados")
     st.markdown("**Validacao, cruzamentos e consulta de dados brutos**")
@@ -295,11 +271,7 @@ def main():
     with st.spinner('Carregando dados...'):
         data = load_data()
 
-    os_df = data['os']
     relatorio = data['relatorio']
-    contratos = data['contratos']
-    config = data['config']
-    limpeza = data.get('_limpeza', {})
 
     # Tabs para organizar as seções
     tab_integ, tab_ingest, tab_cruz, tab_cont, tab_brutos = st.tabs([
@@ -314,7 +286,7 @@ def main():
         st.subheader("A. Integridade dos Dados")
         st.caption("Verifica consistencia entre as abas da planilha e impacto nas analises")
 
-        integ = calcular_integridade(os_df, relatorio, contratos, config, limpeza)
+        integ = calcular_integridade(data)
 
         # Resumo visual
         c1, c2, c3 = st.columns(3)
@@ -418,7 +390,7 @@ def main():
         st.subheader("B. Qualidade da Ingestao")
         st.caption("Analisa cobertura temporal, limpeza aplicada e duplicados na aba OS")
 
-        qual = calcular_qualidade_ingestao(os_df, limpeza)
+        qual = calcular_qualidade_ingestao(data)
 
         # Pipeline de limpeza
         st.markdown("**Pipeline de Limpeza Aplicado**")
@@ -496,7 +468,7 @@ def main():
         st.subheader("C. Cruzamentos e Divergencias")
         st.caption("Compara RELATORIO vs CONTRATOS e identifica inconsistencias")
 
-        cruz = calcular_cruzamentos(relatorio, contratos, os_df)
+        cruz = calcular_cruzamentos(data)
 
         c1, c2, c3 = st.columns(3)
         with c1:
@@ -528,6 +500,16 @@ def main():
         contadores = calcular_contadores(data)
         st.dataframe(contadores, use_container_width=True)
 
+        leitura = data.get('_leitura', {})
+        if leitura:
+            origem = {
+                'cache': 'cache colunar', 'sqlite': 'base SQLite',
+            }.get(leitura['origem'], 'planilha Excel')
+            st.caption(
+                f"Ultimo carregamento: {origem} em {leitura['total']:.2f}s "
+                f"| versao dos dados: {getattr(data, 'versao', '-')}"
+            )
+
         st.markdown("---")
 
         # Detalhes extras
@@ -0,0 +1,121 @@
+"""
+DESEMPENHO — Tempo e memória das páginas e da ingestão
+Página interna (fora do menu; acesso pela URL /Desempenho).
+Seções:
+  A. Latência por função (percentis, taxa de cache, linhas, pico de memória)
+  B. Reruns mais lentos das páginas
+  C. Ingestões recentes (atualizar_mes.py)
+"""
+
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import desempenho
+
+st.set_page_config(
+    page_title="Desempenho - Equipamentos",
+    page_icon="⏱️",
+    layout="wide",
+)
+
+FORMATO = {
+    'p50 (ms)': '{:.1f}', 'p90 (ms)': '{:.1f}', 'p99 (ms)': '{:.1f}', 'max (ms)': '{:.1f}',
+    'hit (%)': '{:.0f}', 'linhas (média)': '{:,.0f}', 'pico (MB)': '{:.1f}',
+    'Duração (ms)': '{:,.0f}', 'Mais lenta (ms)': '{:,.0f}',
+}
+
+
+def _tabela(df):
+    formato = {col: fmt for col, fmt in FORMATO.items() if col in df.columns}
+    st.dataframe(df.style.format(formato, na_rep='-'), use_container_width=True, hide_index=True)
+
+
+def main():
+    st.title("⏱️ Desempenho")
+    st.markdown("**Onde cada rerun e cada ingestão gasta tempo e memória**")
+
+    c1, c2 = st.columns([3, 1])
+    with c1:
+        memoria = st.toggle(
+            "Medir pico de memória (tracemalloc)",
+            value=desempenho.memoria_ativa(),
+            help="Tem custo em todas as chamadas; vale para o processo inteiro.",
+        )
+        if memoria != desempenho.memoria_ativa():
+            desempenho.ativar_memoria(memoria)
+    with c2:
+        if st.button("Limpar registros"):
+            desempenho.limpar()
+
+    st.markdown("---")
+
+    # ========================================
+    # A. LATÊNCIA POR FUNÇÃO
+    # ========================================
+
+    st.subheader("A. Latência por função")
+    resumo = desempenho.resumo_por_funcao()
+    if resumo.empty:
+        st.info("Nenhuma chamada registrada ainda neste processo. Navegue pelas outras páginas.")
+    else:
+        st.caption(
+            f"{len(desempenho.chamadas())} chamadas registradas neste processo "
+            f"(últimas {desempenho.MAX_CHAMADAS}). hit = resultado servido pelo cache."
+        )
+        _tabela(resumo)
+
+    # ========================================
+    # B. RERUNS MAIS LENTOS
+    # ========================================
+
+    st.subheader("B. Reruns mais lentos")
+    reruns = desempenho.tabela_execucoes(desempenho.execucoes())
+    if reruns.empty:
+        st.info("Nenhum rerun de página registrado ainda.")
+    else:
+        _tabela(reruns)
+
+    # ========================================
+    # C. INGESTÕES RECENTES
+    # ========================================
+
+    st.subheader("C. Ingestões recentes")
+    ingestoes = desempenho.ler_execucoes()
+    if not ingestoes:
+        st.info("Nenhuma execução do atualizar_mes.py registrada.")
+    else:
+        ultima = ingestoes[-1]
+        st.caption(
+            f"{len(ingestoes)} execuções registradas. Última em "
+            f"{datetime.fromtimestamp(ultima['inicio']):%d/%m/%Y %H:%M:%S} "
+            f"({ultima['segundos']:.1f}s):"
+        )
+        etapas = pd.DataFrame(ultima['chamadas'])
+        if not etapas.empty:
+            etapas['ms'] = etapas['segundos'] * 1000
+            etapas['pico (MB)'] = etapas['pico_bytes'] / 1024 ** 2
+            st.dataframe(
+                etapas[['funcao', 'ms', 'linhas', 'pico (MB)']].style.format(
+                    {'ms': '{:,.0f}', 'linhas': '{:,.0f}', 'pico (MB)': '{:.1f}'}, na_rep='-',
+                ),
+                use_container_width=True, hide_index=True,
+            )
+        st.markdown("**Por etapa (todas as execuções)**")
+        _tabela(desempenho.resumo_por_funcao(
+            [c for execucao in ingestoes for c in execucao['chamadas']]
+        ))
+
+    st.markdown("---")
+    st.markdown(f"""
+    <div style='text-align: center; color: #666; font-size: 0.9em;'>
+        Gerado em: {datetime.now():%d/%m/%Y %H:%M:%S} | PID {os.getpid()}
+    </div>
+    """, unsafe_allow_html=True)
+
+
+if __name__ == "__main__":
+    main()
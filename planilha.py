@@ -0,0 +1,779 @@
+"""
+MÓDULO DE PLANILHA — Leitura das abas do arquivo Excel com cache colunar
+
+O parse do .xlsx via openpyxl é o passo mais lento do carregamento.
+Cada aba lida é gravada em Parquet numa pasta de cache ao lado da planilha,
+identificada pela assinatura do arquivo (tamanho, mtime e hash do conteúdo).
+Enquanto a planilha não mudar, as abas são lidas do cache colunar.
+Quando muda, as abas pequenas são lidas no processo atual e as grandes
+em paralelo, em processos separados (cada um reabre o arquivo).
+
+A escrita (ingestão mensal) regrava só as abas alteradas, em streaming
+sobre o XML do .xlsx; as demais abas, estilos e configurações do arquivo
+são copiados como estão.
+
+Não depende de streamlit: usado por dados.py e atualizar_mes.py.
+"""
+
+import functools
+import hashlib
+import json
+import math
+import multiprocessing
+import operator
+import os
+import posixpath
+import re
+import shutil
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time as dt_time, timedelta
+from xml.sax.saxutils import escape
+
+import openpyxl
+import pandas as pd
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, to_excel
+
+
+# Abas lidas da planilha e opções de leitura de cada uma
+ABAS_OBRIGATORIAS = {
+    'NOTAS': {},
+    'OS': {},
+    'RELATORIO': {},
+    'CONTRATOS': {},
+    'config': {},
+}
+
+# Abas opcionais (podem não existir ou estar vazias)
+ABAS_OPCIONAIS = {
+    'OBSOLETOS': {},
+    'REAPROVEITADOS': {},
+    'NEGATIVADO': {},
+    'BASE_CRUZADA': {'header': None},  # aba sem header
+    'RETIRADA': {},
+}
+
+# Abas grandes: lidas em processos separados, em paralelo com as demais
+ABAS_GRANDES = ('OS', 'CONTRATOS', 'NOTAS')
+
+# Abaixo deste tamanho o custo de subir processos (e de cada um reabrir
+# a planilha e parsear as shared strings) não compensa
+PARALELO_MIN_BYTES = 5 * 1024 * 1024
+
+# Linhas convertidas por vez na escrita de DataFrames (memória constante)
+BLOCO_ESCRITA = 50_000
+
+# Incrementar quando o formato do cache mudar (invalida caches antigos)
+VERSAO_CACHE = 1
+CACHE_DIRNAME = '.cache_planilha'
+MANIFESTO = 'manifesto.json'
+
+
+# ============================================================
+# ASSINATURA DO ARQUIVO
+# ============================================================
+
+def hash_arquivo(caminho, bloco=1 << 20):
+    """SHA-256 do conteúdo do arquivo (lido em blocos)."""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for parte in iter(lambda: f.read(bloco), b''):
+            h.update(parte)
+    return h.hexdigest()
+
+
+def assinatura_arquivo(caminho):
+    """Retorna (tamanho, mtime_ns, sha256) do arquivo."""
+    info = os.stat(caminho)
+    return {
+        'tamanho': info.st_size,
+        'mtime_ns': info.st_mtime_ns,
+        'sha256': hash_arquivo(caminho),
+    }
+
+
+def dir_cache(caminho):
+    """Pasta de cache colunar da fonte, ao lado do arquivo.
+
+    Nome completo do arquivo: a planilha e a base SQLite de mesmo nome
+    têm pastas separadas.
+    """
+    nome = os.path.basename(caminho)
+    return os.path.join(os.path.dirname(os.path.abspath(caminho)), CACHE_DIRNAME, nome)
+
+
+# ============================================================
+# CACHE COLUNAR
+# ============================================================
+
+def _ler_manifesto(pasta):
+    try:
+        with open(os.path.join(pasta, MANIFESTO), encoding='utf-8') as f:
+            manifesto = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifesto.get('versao') != VERSAO_CACHE:
+        return None
+    return manifesto
+
+
+def _gravar_manifesto(pasta, manifesto):
+    """Grava o manifesto de forma atômica (arquivo temporário + rename)."""
+    destino = os.path.join(pasta, MANIFESTO)
+    tmp = f"{destino}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, destino)
+
+
+def _cache_valido(caminho, manifesto):
+    """Confere a assinatura do manifesto com o arquivo atual.
+
+    Tamanho + mtime iguais bastam. Se só o mtime mudou (cópia, redeploy,
+    checkout), o hash do conteúdo decide.
+    """
+    info = os.stat(caminho)
+    assinatura = manifesto['assinatura']
+    if info.st_size != assinatura['tamanho']:
+        return False
+    if info.st_mtime_ns == assinatura['mtime_ns']:
+        return True
+    if hash_arquivo(caminho) != assinatura['sha256']:
+        return False
+    # Mesmo conteúdo com novo mtime: atualizar manifesto para o próximo acesso
+    assinatura['mtime_ns'] = info.st_mtime_ns
+    try:
+        _gravar_manifesto(dir_cache(caminho), manifesto)
+    except OSError:
+        pass
+    return True
+
+
+def ler_cache(caminho, nomes=None, colunas=None):
+    """Lê as abas do cache colunar (todas ou só as de `nomes`).
+
+    Args:
+        colunas: {aba: [colunas]} para ler só parte de uma aba
+
+    Retorna (abas, tempos) ou None se o cache estiver ausente ou desatualizado
+    (ou sem alguma das colunas pedidas).
+    """
+    colunas = colunas or {}
+    pasta = dir_cache(caminho)
+    manifesto = _ler_manifesto(pasta)
+    if manifesto is None or not _cache_valido(caminho, manifesto):
+        return None
+
+    if nomes is not None and not set(nomes) <= set(manifesto['abas']):
+        return None
+
+    abas, tempos = {}, {}
+    try:
+        for nome, arquivo in manifesto['abas'].items():
+            if nomes is not None and nome not in nomes:
+                continue
+            inicio = time.perf_counter()
+            projecao = colunas.get(nome)
+            if arquivo is None:
+                abas[nome] = pd.DataFrame()
+            elif arquivo.endswith('.parquet'):
+                abas[nome] = pd.read_parquet(os.path.join(pasta, arquivo), columns=projecao)
+            else:
+                df = pd.read_pickle(os.path.join(pasta, arquivo))
+                abas[nome] = df if projecao is None else df[list(projecao)]
+            tempos[nome] = time.perf_counter() - inicio
+    except Exception:
+        return None
+    return abas, tempos
+
+
+def gravar_cache(caminho, abas, assinatura):
+    """Grava as abas no cache colunar (Parquet; pickle se o Arrow recusar).
+
+    Abas vazias/ausentes ficam registradas no manifesto sem arquivo.
+    Falhas de escrita (ex.: disco somente leitura) são ignoradas.
+    """
+    pasta = dir_cache(caminho)
+    prefixo = assinatura['sha256'][:16]
+    arquivos = {}
+    try:
+        os.makedirs(pasta, exist_ok=True)
+        for nome, df in abas.items():
+            if df is None or df.empty:
+                arquivos[nome] = None
+                continue
+            arquivo = f"{prefixo}_{nome}.parquet"
+            try:
+                # Parquet converte nomes de coluna para string (ex.: header=None)
+                if not all(isinstance(c, str) for c in df.columns):
+                    raise TypeError('nomes de coluna não-string')
+                df.to_parquet(os.path.join(pasta, arquivo), index=False)
+            except Exception:
+                # Colunas com tipos mistos que o Arrow não representa
+                arquivo = f"{prefixo}_{nome}.pkl"
+                df.to_pickle(os.path.join(pasta, arquivo))
+            arquivos[nome] = arquivo
+
+        _gravar_manifesto(pasta, {
+            'versao': VERSAO_CACHE,
+            'arquivo': os.path.basename(caminho),
+            'assinatura': assinatura,
+            'abas': arquivos,
+        })
+    except OSError:
+        return
+
+    # Remover arquivos de versões anteriores da planilha
+    validos = {a for a in arquivos.values() if a} | {MANIFESTO}
+    for arquivo in os.listdir(pasta):
+        if arquivo not in validos and not arquivo.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(pasta, arquivo))
+            except OSError:
+                pass
+
+
+# ============================================================
+# LEITURA
+# ============================================================
+
+def _ler_aba(caminho, nome, opcoes):
+    """Lê uma aba abrindo a planilha (executado num processo separado).
+
+    Cada processo reabre o .xlsx por conta própria: descompacta e parseia
+    de novo workbook e shared strings antes de chegar à aba.
+    """
+    inicio = time.perf_counter()
+    df = pd.read_excel(caminho, sheet_name=nome, **opcoes)
+    return df, time.perf_counter() - inicio
+
+
+def _parse_aba(xls, nome, opcoes, obrigatoria):
+    """Lê uma aba do ExcelFile já aberto. Aba opcional ilegível vem vazia."""
+    try:
+        return xls.parse(nome, **opcoes)
+    except Exception:
+        if obrigatoria:
+            raise
+        return pd.DataFrame()
+
+
+def _opcoes_leitura(opcoes, projecao):
+    """Opções do read_excel com a projeção de colunas (usecols por nome).
+
+    O filtro é um partial de operator.contains (e não uma lambda) para
+    poder ir aos processos da leitura paralela.
+    """
+    if projecao is None:
+        return opcoes
+    return {**opcoes, 'usecols': functools.partial(operator.contains, frozenset(projecao))}
+
+
+def _ler_excel(caminho, paralelo=None, nomes=None, colunas=None):
+    """Lê as abas conhecidas (todas ou só as de `nomes`) direto do Excel.
+
+    O processo atual abre a planilha uma vez (nomes das abas e shared
+    strings) e lê as abas pequenas; abas opcionais ausentes não são lidas.
+    As abas grandes vão para processos separados, e cada um reabre o
+    arquivo com read_excel: o parse das shared strings se repete por
+    processo. Esse custo fixo é o motivo de PARALELO_MIN_BYTES (abaixo
+    dele, tudo é lido no processo atual). `colunas` ({aba: [colunas]})
+    vira usecols: colunas ausentes são ignoradas.
+
+    Retorna (abas, tempos) com o tempo de leitura de cada aba em segundos.
+    """
+    if paralelo is None:
+        paralelo = (
+            (os.cpu_count() or 1) > 1
+            and os.path.getsize(caminho) >= PARALELO_MIN_BYTES
+        )
+
+    abas, tempos = {}, {}
+    with pd.ExcelFile(caminho) as xls:
+        existentes = set(xls.sheet_names)
+        conhecidas = {**ABAS_OBRIGATORIAS, **ABAS_OPCIONAIS}
+        if nomes is None:
+            nomes = list(conhecidas)
+
+        faltando = [nome for nome in ABAS_OBRIGATORIAS if nome in nomes and nome not in existentes]
+        if faltando:
+            raise ValueError(f"Abas obrigatórias não encontradas: {', '.join(faltando)}")
+
+        a_ler = {
+            nome: (_opcoes_leitura(conhecidas[nome], (colunas or {}).get(nome)),
+                   nome in ABAS_OBRIGATORIAS)
+            for nome in nomes
+            if nome in existentes
+        }
+        grandes = [nome for nome in ABAS_GRANDES if nome in a_ler] if paralelo else []
+
+        futuros = {}
+        pool = None
+        if grandes:
+            try:
+                # spawn: o processo do streamlit tem threads (fork não é seguro)
+                pool = ProcessPoolExecutor(
+                    max_workers=len(grandes),
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+                futuros = {
+                    nome: pool.submit(_ler_aba, caminho, nome, a_ler[nome][0])
+                    for nome in grandes
+                }
+            except (OSError, RuntimeError):
+                futuros = {}
+
+        try:
+            for nome, (opcoes, obrigatoria) in a_ler.items():
+                if nome in futuros:
+                    continue
+                inicio = time.perf_counter()
+                abas[nome] = _parse_aba(xls, nome, opcoes, obrigatoria)
+                tempos[nome] = time.perf_counter() - inicio
+
+            for nome, futuro in futuros.items():
+                abas[nome], tempos[nome] = futuro.result()
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    # Ordem fixa das abas (independe de qual terminou primeiro);
+    # opcionais ausentes vêm vazias
+    return {nome: abas.get(nome, pd.DataFrame()) for nome in nomes}, tempos
+
+
+def ler_abas(caminho, usar_cache=True, nomes=None, colunas=None):
+    """Lê as abas conhecidas da planilha (todas ou só as de `nomes`).
+
+    Usa o cache colunar quando a planilha não mudou; caso contrário lê
+    o Excel e atualiza o cache (só numa leitura completa, para o cache
+    sempre ter todas as abas). Abas opcionais ausentes vêm vazias.
+    `colunas` ({aba: [colunas]}) lê só parte das abas indicadas.
+
+    Retorna (abas, leitura): dict {aba: DataFrame bruto} e metadados da
+    leitura ({'origem': 'cache' | 'excel', 'tempos': {aba: segundos}, 'total'}).
+    """
+    inicio = time.perf_counter()
+    if usar_cache:
+        resultado = ler_cache(caminho, nomes, colunas)
+        if resultado is not None:
+            abas, tempos = resultado
+            return abas, {
+                'origem': 'cache',
+                'tempos': tempos,
+                'total': time.perf_counter() - inicio,
+            }
+
+    # Assinatura calculada antes da leitura: se o arquivo mudar durante
+    # o parse, o próximo acesso detecta a diferença e relê
+    gravar = usar_cache and nomes is None and not colunas
+    assinatura = assinatura_arquivo(caminho) if gravar else None
+    abas, tempos = _ler_excel(caminho, nomes=nomes, colunas=colunas)
+    if gravar:
+        gravar_cache(caminho, abas, assinatura)
+    return abas, {
+        'origem': 'excel',
+        'tempos': tempos,
+        'total': time.perf_counter() - inicio,
+    }
+
+
+# ============================================================
+# ESCRITA EM STREAMING
+# ============================================================
+
+def linhas_dataframe(df, header=True, bloco=BLOCO_ESCRITA):
+    """Linhas do DataFrame prontas para o openpyxl, geradas em blocos.
+
+    NaN/NaT viram None de forma vetorizada (astype(object) + where) e
+    valores numpy viram tipos Python no tolist().
+    """
+    if header:
+        yield list(df.columns)
+    for inicio in range(0, len(df), bloco):
+        parte = df.iloc[inicio:inicio + bloco].astype(object)
+        yield from parte.where(parte.notna(), None).to_numpy().tolist()
+
+
+def gravar_planilha(caminho, abas):
+    """Grava as abas ({aba: DataFrame}) numa planilha nova, em streaming.
+
+    Abas lidas sem header (ex.: BASE_CRUZADA) são gravadas sem header.
+    Grava num arquivo temporário e troca de forma atômica.
+    """
+    conhecidas = {**ABAS_OBRIGATORIAS, **ABAS_OPCIONAIS}
+    wb = openpyxl.Workbook(write_only=True)
+    for nome, df in abas.items():
+        ws = wb.create_sheet(nome)
+        header = conhecidas.get(nome, {}).get('header', 0) is not None
+        for linha in linhas_dataframe(df, header=header):
+            ws.append(linha)
+
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    wb.save(tmp)
+    os.replace(tmp, caminho)
+
+
+# ============================================================
+# REESCRITA PRESERVANDO AS ABAS (o .xlsx é um zip de partes XML)
+# ============================================================
+
+_NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+# Bytes lidos por vez das partes XML das abas reescritas
+BLOCO_XML = 1 << 20
+
+# Formato de data/hora embutido do Excel (exibido conforme a localidade)
+NUMFMT_DATA = 22
+
+_RE_SHEETDATA = re.compile(rb'<((?:\w+:)?)sheetData\b[^>]*?(/?)>')
+_RE_DIMENSION = re.compile(rb'<((?:\w+:)?)dimension\b[^>]*/>')
+_RE_AUTOFILTRO = re.compile(rb'(<(?:\w+:)?autoFilter\b[^>]*?\bref="[A-Z]+\d+:[A-Z]+)(\d+)"')
+_RE_LINHA = re.compile(rb'\s*(<(?:\w+:)?row\b([^>]*?)(?:/>|>.*?</(?:\w+:)?row>))', re.S)
+_RE_NUMERO = re.compile(rb'\br="(\d+)"')
+_RE_VALOR = re.compile(rb'<(?:\w+:)?(?:v|is|f)\b')
+_RE_CELLXFS = re.compile(rb'(<((?:\w+:)?)cellXfs\b[^>]*?)(?:\s+count="\d+")?([^>]*>)(.*?)(</(?:\w+:)?cellXfs>)', re.S)
+_RE_ESTILO_HEADER = re.compile(rb'<(?:\w+:)?c\b[^>]*?\br="([A-Z]+)1"[^>]*?\bs="(\d+)"')
+_RE_CALCPR = re.compile(rb'(<(?:\w+:)?calcPr\b[^>]*?)(\s*/?>)')
+_RE_XF = re.compile(rb'<(?:\w+:)?xf\b[^>]*?(?:/>|>.*?</(?:\w+:)?xf>)', re.S)
+
+
+def _calculo_ao_abrir(m):
+    """calcPr com fullCalcOnLoad="1" (fórmulas recalculadas ao abrir)."""
+    tag = re.sub(rb'\s+fullCalcOnLoad="[^"]*"', b'', m.group(1))
+    return tag + b' fullCalcOnLoad="1"' + m.group(2)
+
+
+def _relacionamentos(zin, parte):
+    """{Id: (Type, parte de destino)} do .rels da parte."""
+    pasta, nome = posixpath.split(parte)
+    rels = ET.fromstring(zin.read(posixpath.join(pasta, '_rels', nome + '.rels')))
+    destinos = {}
+    for rel in rels:
+        alvo = rel.get('Target')
+        if rel.get('TargetMode') != 'External':
+            alvo = alvo.lstrip('/') if alvo.startswith('/') else posixpath.normpath(posixpath.join(pasta, alvo))
+        destinos[rel.get('Id')] = (rel.get('Type'), alvo)
+    return destinos
+
+
+def _estrutura(zin):
+    """Partes do pacote: workbook, {aba: parte}, styles, calcChain e epoch."""
+    pacote = _relacionamentos(zin, '')
+    parte_wb = next(alvo for tipo, alvo in pacote.values() if tipo.endswith('/officeDocument'))
+    rels = _relacionamentos(zin, parte_wb)
+    wb = ET.fromstring(zin.read(parte_wb))
+    abas = {
+        aba.get('name'): rels[aba.get(f'{{{_NS_REL}}}id')][1]
+        for aba in wb.iter(f'{{{_NS_MAIN}}}sheet')
+    }
+    por_tipo = {tipo.rsplit('/', 1)[-1]: alvo for tipo, alvo in rels.values()}
+    propriedades = wb.find(f'{{{_NS_MAIN}}}workbookPr')
+    mac = propriedades is not None and propriedades.get('date1904') in ('1', 'true')
+    return {
+        'workbook': parte_wb,
+        'workbook_rels': posixpath.join(posixpath.dirname(parte_wb), '_rels',
+                                        posixpath.basename(parte_wb) + '.rels'),
+        'abas': abas,
+        'styles': por_tipo.get('styles'),
+        'calc_chain': por_tipo.get('calcChain'),
+        'epoca': CALENDAR_MAC_1904 if mac else CALENDAR_WINDOWS_1900,
+    }
+
+
+def _estilo_data(styles):
+    """Índice de um xf de data/hora no cellXfs, acrescentando-o se preciso.
+
+    Reaproveita o xf já acrescentado em ingestões anteriores (o styles.xml
+    não cresce a cada mês). Retorna (styles.xml, índice).
+    """
+    m = _RE_CELLXFS.search(styles)
+    if m is None:
+        raise ValueError("styles.xml sem cellXfs")
+    prefixo = m.group(2)
+    xfs = _RE_XF.findall(m.group(4))
+    for i, xf in enumerate(xfs):
+        if (f'numFmtId="{NUMFMT_DATA}"'.encode() in xf and b'fontId="0"' in xf
+                and b'fillId="0"' in xf and b'borderId="0"' in xf):
+            return styles, i
+    xf = (f'<{prefixo.decode()}xf numFmtId="{NUMFMT_DATA}" fontId="0" fillId="0" '
+          f'borderId="0" xfId="0" applyNumberFormat="1"/>').encode()
+    bloco = (m.group(1) + f' count="{len(xfs) + 1}"'.encode() + m.group(3)
+             + m.group(4) + xf + m.group(5))
+    return styles[:m.start()] + bloco + styles[m.end():], len(xfs)
+
+
+def _celula_xml(ref, valor, estilo_data, epoca, estilo=None):
+    """Célula no XML da planilha (texto inline, sem mexer no sharedStrings)."""
+    s = f' s="{estilo}"' if estilo else ''
+    if isinstance(valor, bool):
+        return f'<c r="{ref}"{s} t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        if isinstance(valor, float) and not math.isfinite(valor):
+            return ''
+        return f'<c r="{ref}"{s}><v>{valor!r}</v></c>'
+    if isinstance(valor, (datetime, date, dt_time, timedelta)):
+        if isinstance(valor, datetime) and valor.tzinfo is not None:
+            valor = valor.replace(tzinfo=None)
+        return f'<c r="{ref}" s="{estilo_data}"><v>{to_excel(valor, epoca)!r}</v></c>'
+    texto = ILLEGAL_CHARACTERS_RE.sub('', str(valor))
+    return f'<c r="{ref}"{s} t="inlineStr"><is><t xml:space="preserve">{escape(texto)}</t></is></c>'
+
+
+def _linhas_xml(linhas, primeira, prefixo, estilo_data, epoca, estilos_primeira=None):
+    """Linhas (listas de valores) como elementos <row>, em blocos de bytes.
+
+    estilos_primeira: {coluna (letra): índice de estilo} da primeira linha
+    (o header substituído mantém a formatação do anterior).
+    """
+    letras = []
+    pedaco = []
+    estilos = estilos_primeira or {}
+    for numero, linha in enumerate(linhas, start=primeira):
+        while len(letras) < len(linha):
+            letras.append(get_column_letter(len(letras) + 1))
+        celulas = ''.join(
+            _celula_xml(f'{letras[j]}{numero}', valor, estilo_data, epoca, estilos.get(letras[j]))
+            for j, valor in enumerate(linha) if valor is not None
+        )
+        estilos = {}
+        pedaco.append(f'<row r="{numero}">{celulas}</row>')
+        if len(pedaco) >= 1000:
+            yield _com_prefixo(''.join(pedaco), prefixo)
+            pedaco = []
+    if pedaco:
+        yield _com_prefixo(''.join(pedaco), prefixo)
+
+
+def _com_prefixo(xml, prefixo):
+    xml = xml.encode('utf-8')
+    if prefixo:
+        xml = re.sub(rb'<(/?)(row|c|v|is|t)\b', rb'<\1' + prefixo + rb'\2', xml)
+    return xml
+
+
+def _reescrever_aba(blocos, escrever, df, anexar, estilo_data, epoca):
+    """Regrava a parte XML de uma aba: só o sheetData muda.
+
+    Tudo fora do sheetData (larguras de coluna, painéis congelados,
+    autofiltro, formatação condicional...) é copiado como está; o
+    autofiltro é estendido até a nova última linha.
+
+    anexar=False: as linhas antigas são descartadas e o DataFrame vira o
+    conteúdo (header + linhas). anexar=True: as linhas antigas são
+    copiadas byte a byte e as do DataFrame entram após a última linha com
+    valor (linhas vazias no fim da aba, só formatação, são descartadas).
+
+    Retorna (linhas existentes copiadas, segundos da passagem pelas linhas
+    existentes, segundos da escrita das linhas do DataFrame).
+    """
+    inicio_copia = time.perf_counter()
+    copiadas = 0
+    buffer = b''
+    for bloco in blocos:
+        buffer += bloco
+        inicio = _RE_SHEETDATA.search(buffer)
+        if inicio:
+            break
+    else:
+        raise ValueError("aba sem sheetData")
+
+    prefixo, vazio = inicio.group(1), inicio.group(2) == b'/'
+    fim_dados = b'</' + prefixo + b'sheetData>'
+    prologo = buffer[:inicio.start()]
+    resto = buffer[inicio.end():]
+
+    ultima = 0
+    estilos_header = None
+    if anexar:
+        # Sem a nova última linha ainda; dimension é opcional
+        prologo = _RE_DIMENSION.sub(b'', prologo)
+        escrever(prologo + b'<' + prefixo + b'sheetData>')
+        pendentes, numero = [], 0
+        while not vazio:
+            saida, pos = [], 0
+            while True:
+                m = _RE_LINHA.match(resto, pos)
+                if m is None:
+                    break
+                linha = m.group(1)
+                r = _RE_NUMERO.search(m.group(2))
+                numero = int(r.group(1)) if r else numero + 1
+                if _RE_VALOR.search(linha):
+                    saida.extend(pendentes)
+                    saida.append(linha)
+                    pendentes = []
+                    ultima = numero
+                else:
+                    pendentes.append(linha)
+                pos = m.end()
+            escrever(b''.join(saida))
+            copiadas += len(saida)
+            resto = resto[pos:]
+            if resto.lstrip().startswith(fim_dados):
+                resto = resto.lstrip()[len(fim_dados):]
+                break
+            bloco = next(blocos, None)
+            if bloco is None:
+                raise ValueError("sheetData sem fechamento")
+            resto += bloco
+        linhas = linhas_dataframe(df, header=False)
+    else:
+        n_colunas = max(len(df.columns), 1)
+        ultima_prevista = len(df) + 1
+        prologo = _RE_DIMENSION.sub(
+            lambda m: b'<' + m.group(1) + f'dimension ref="A1:{get_column_letter(n_colunas)}{ultima_prevista}"/>'.encode(),
+            prologo,
+        )
+        escrever(prologo + b'<' + prefixo + b'sheetData>')
+        primeira_linha = _RE_LINHA.match(resto) if not vazio else None
+        numero = _RE_NUMERO.search(primeira_linha.group(2)) if primeira_linha else None
+        if primeira_linha and (numero is None or numero.group(1) == b'1'):
+            estilos_header = {
+                coluna.decode(): int(estilo)
+                for coluna, estilo in _RE_ESTILO_HEADER.findall(primeira_linha.group(1))
+            }
+        while not vazio:
+            pos = resto.find(fim_dados)
+            if pos >= 0:
+                resto = resto[pos + len(fim_dados):]
+                break
+            bloco = next(blocos, None)
+            if bloco is None:
+                raise ValueError("sheetData sem fechamento")
+            resto = resto[-len(fim_dados):] + bloco
+        linhas = linhas_dataframe(df)
+
+    inicio_escrita = time.perf_counter()
+    primeira = ultima + 1
+    for pedaco in _linhas_xml(linhas, primeira, prefixo, estilo_data, epoca, estilos_header):
+        escrever(pedaco)
+    nova_ultima = ultima + len(df) + (0 if anexar else 1)
+    escrever(fim_dados)
+
+    # Epílogo (pequeno: elementos após o sheetData)
+    epilogo = resto + b''.join(blocos)
+    epilogo = _RE_AUTOFILTRO.sub(
+        lambda m: m.group(1) + str(
+            max(int(m.group(2)), nova_ultima) if anexar else nova_ultima
+        ).encode() + b'"',
+        epilogo,
+    )
+    escrever(epilogo)
+    fim = time.perf_counter()
+    return copiadas, inicio_escrita - inicio_copia, fim - inicio_escrita
+
+
+def _blocos_parte(zin, parte):
+    with zin.open(parte) as f:
+        while True:
+            bloco = f.read(BLOCO_XML)
+            if not bloco:
+                return
+            yield bloco
+
+
+def reescrever_planilha(caminho, substituir=None, anexar=None):
+    """Regrava só as abas alteradas, preservando o resto do arquivo.
+
+    Args:
+        substituir: {aba: DataFrame} conteúdo novo da aba (header + linhas)
+        anexar: {aba: DataFrame} linhas acrescentadas após a última linha
+            da aba existente, com as colunas alinhadas pelo header da aba
+
+    O .xlsx é copiado parte a parte (zip): as abas não alteradas, estilos,
+    nomes definidos e abas ocultas saem byte a byte, sem passar pelo
+    openpyxl. Nas abas alteradas só o sheetData é regravado, em streaming;
+    larguras de coluna, painéis congelados e autofiltro continuam. Os
+    valores novos saem como texto inline e datas com um estilo de data
+    próprio. O calcChain é removido (o Excel o refaz) e o cálculo completo
+    ao abrir é ligado, para fórmulas que leem as abas alteradas.
+
+    As abas precisam existir. Grava num arquivo temporário e troca de
+    forma atômica.
+
+    Returns:
+        dict {aba: {'escritas': linhas do DataFrame, 'escrita': segundos,
+        'copiadas': linhas existentes mantidas, 'copia': segundos}}. Em
+        'copia' entra a passagem pelas linhas existentes (copiadas ao
+        anexar; ao substituir, só descartadas, com 'copiadas' 0).
+    """
+    substituir = substituir or {}
+    anexar = anexar or {}
+
+    headers = {}
+    if anexar:
+        origem = openpyxl.load_workbook(caminho, read_only=True)
+        try:
+            for nome in anexar:
+                linha = next(origem[nome].iter_rows(max_row=1, values_only=True), ())
+                headers[nome] = list(linha)
+        finally:
+            origem.close()
+
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    estatisticas = {}
+    with zipfile.ZipFile(caminho) as zin:
+        estrutura = _estrutura(zin)
+        faltando = [n for n in [*substituir, *anexar] if n not in estrutura['abas']]
+        if faltando:
+            raise ValueError(f"Abas não encontradas na planilha: {', '.join(faltando)}")
+        partes = {estrutura['abas'][n]: (n, substituir[n], False) for n in substituir}
+        partes.update({estrutura['abas'][n]: (n, anexar[n], True) for n in anexar})
+
+        styles, estilo_data = _estilo_data(zin.read(estrutura['styles']))
+        alteradas = {estrutura['styles']: styles}
+        for parte in (estrutura['workbook'], estrutura['workbook_rels'], '[Content_Types].xml'):
+            alteradas[parte] = zin.read(parte)
+        if estrutura['calc_chain']:
+            alteradas[estrutura['workbook_rels']] = re.sub(
+                rb'<(?:\w+:)?Relationship\b[^>]*?Target="[^"]*calcChain\.xml"[^>]*/>', b'',
+                alteradas[estrutura['workbook_rels']],
+            )
+            alteradas['[Content_Types].xml'] = re.sub(
+                rb'<(?:\w+:)?Override\b[^>]*?PartName="/' + re.escape(estrutura['calc_chain'].encode())
+                + rb'"[^>]*/>', b'', alteradas['[Content_Types].xml'],
+            )
+        alteradas[estrutura['workbook']] = _RE_CALCPR.sub(
+            _calculo_ao_abrir, alteradas[estrutura['workbook']], count=1,
+        )
+
+        try:
+            with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) as zout:
+                for info in zin.infolist():
+                    nome_parte = info.filename
+                    if nome_parte == estrutura['calc_chain']:
+                        continue
+                    novo = zipfile.ZipInfo(nome_parte, date_time=info.date_time)
+                    novo.compress_type = zipfile.ZIP_DEFLATED
+                    if nome_parte in alteradas:
+                        zout.writestr(novo, alteradas[nome_parte])
+                        continue
+                    with zout.open(novo, 'w', force_zip64=info.file_size > 1 << 30) as destino:
+                        if nome_parte not in partes:
+                            with zin.open(info) as fonte:
+                                shutil.copyfileobj(fonte, destino, BLOCO_XML)
+                            continue
+                        aba, df, so_anexar = partes[nome_parte]
+                        if so_anexar:
+                            df = df.reindex(columns=headers[aba])
+                        copiadas, copia, escrita = _reescrever_aba(
+                            _blocos_parte(zin, info), destino.write, df, so_anexar,
+                            estilo_data, estrutura['epoca'],
+                        )
+                        estatisticas[aba] = {
+                            'escritas': len(df), 'escrita': escrita,
+                            'copiadas': copiadas, 'copia': copia,
+                        }
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    os.replace(tmp, caminho)
+    return estatisticas